@@ -38,6 +38,7 @@ CREATE TABLE IF NOT EXISTS version_stats (
     version_number VARCHAR(255),
     downloads INTEGER NOT NULL CHECK (downloads >= 0),
     date_published TIMESTAMP,
+    valid_to DATE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(date, platform, version_name)
@@ -66,6 +67,7 @@ CREATE TABLE IF NOT EXISTS modpack_stats (
     modpack_slug VARCHAR(255) NOT NULL,
     downloads INTEGER NOT NULL CHECK (downloads >= 0),
     followers INTEGER CHECK (followers >= 0),
+    valid_to DATE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(date, platform, modpack_slug)
@@ -84,6 +86,125 @@ COMMENT ON TABLE modpack_stats IS 'Statistiques des modpacks utilisant Create Nu
 COMMENT ON COLUMN modpack_stats.modpack_slug IS 'Identifiant unique du modpack';
 COMMENT ON COLUMN modpack_stats.downloads IS 'Nombre total de téléchargements du modpack';
 
+-- Historique creux (DB_SPARSE_HISTORY) : une ligne vaut de date à valid_to inclus
+COMMENT ON COLUMN version_stats.valid_to IS 'Dernier jour où la valeur a été observée (NULL = date)';
+COMMENT ON COLUMN modpack_stats.valid_to IS 'Dernier jour où la valeur a été observée (NULL = date)';
+
+-- Séries journalières reconstruites (une ligne par jour observé, quel que soit le mode)
+CREATE OR REPLACE VIEW version_stats_dense AS
+SELECT s.date + n AS date, s.platform, s.version_name, s.version_number, s.downloads, s.date_published
+FROM version_stats s
+CROSS JOIN LATERAL generate_series(0, COALESCE(s.valid_to, s.date) - s.date) n;
+
+CREATE OR REPLACE VIEW modpack_stats_dense AS
+SELECT s.date + n AS date, s.platform, s.modpack_name, s.modpack_slug, s.downloads, s.followers
+FROM modpack_stats s
+CROSS JOIN LATERAL generate_series(0, COALESCE(s.valid_to, s.date) - s.date) n;
+
+-- Dernières valeurs connues par version (maintenue par les saves, remplace DISTINCT ON)
+CREATE TABLE IF NOT EXISTS version_latest (
+    platform VARCHAR(20) NOT NULL,
+    version_name VARCHAR(255) NOT NULL,
+    version_number VARCHAR(255),
+    downloads INTEGER NOT NULL CHECK (downloads >= 0),
+    date_published TIMESTAMP,
+    date DATE NOT NULL,
+    PRIMARY KEY (platform, version_name)
+);
+
+COMMENT ON TABLE version_latest IS 'Dernière ligne de version_stats par version';
+
+-- Dernières valeurs connues par modpack
+CREATE TABLE IF NOT EXISTS modpack_latest (
+    platform VARCHAR(20) NOT NULL,
+    modpack_slug VARCHAR(255) NOT NULL,
+    modpack_name VARCHAR(255) NOT NULL,
+    downloads INTEGER NOT NULL CHECK (downloads >= 0),
+    followers INTEGER CHECK (followers >= 0),
+    date DATE NOT NULL,
+    PRIMARY KEY (platform, modpack_slug)
+);
+
+COMMENT ON TABLE modpack_latest IS 'Dernière ligne de modpack_stats par modpack';
+
+-- Première observation de chaque modpack (calcul "Since Added")
+CREATE TABLE IF NOT EXISTS modpack_first_seen (
+    platform VARCHAR(20) NOT NULL,
+    modpack_slug VARCHAR(255) NOT NULL,
+    first_date DATE NOT NULL,
+    first_downloads INTEGER NOT NULL CHECK (first_downloads >= 0),
+    PRIMARY KEY (platform, modpack_slug)
+);
+
+COMMENT ON TABLE modpack_first_seen IS 'Date et téléchargements de la première observation de chaque modpack';
+
+-- Agrégats hebdomadaires/mensuels (resolution = 'week' ou 'month')
+-- Dernière valeur de la période, min/max et croissance (dernière - première valeur)
+CREATE TABLE IF NOT EXISTS daily_stats_rollup (
+    resolution VARCHAR(10) NOT NULL,
+    platform VARCHAR(20) NOT NULL,
+    period_start DATE NOT NULL,
+    last_date DATE NOT NULL,
+    total_downloads INTEGER NOT NULL,
+    followers INTEGER,
+    versions_count INTEGER,
+    min_value INTEGER NOT NULL,
+    max_value INTEGER NOT NULL,
+    delta INTEGER NOT NULL,
+    PRIMARY KEY (resolution, platform, period_start)
+);
+
+CREATE TABLE IF NOT EXISTS version_stats_rollup (
+    resolution VARCHAR(10) NOT NULL,
+    platform VARCHAR(20) NOT NULL,
+    version_name VARCHAR(255) NOT NULL,
+    period_start DATE NOT NULL,
+    last_date DATE NOT NULL,
+    downloads INTEGER NOT NULL,
+    min_value INTEGER NOT NULL,
+    max_value INTEGER NOT NULL,
+    delta INTEGER NOT NULL,
+    PRIMARY KEY (resolution, platform, version_name, period_start)
+);
+
+CREATE TABLE IF NOT EXISTS modpack_stats_rollup (
+    resolution VARCHAR(10) NOT NULL,
+    platform VARCHAR(20) NOT NULL,
+    modpack_slug VARCHAR(255) NOT NULL,
+    period_start DATE NOT NULL,
+    last_date DATE NOT NULL,
+    downloads INTEGER NOT NULL,
+    modpack_name VARCHAR(255),
+    min_value INTEGER NOT NULL,
+    max_value INTEGER NOT NULL,
+    delta INTEGER NOT NULL,
+    PRIMARY KEY (resolution, platform, modpack_slug, period_start)
+);
+
+COMMENT ON TABLE daily_stats_rollup IS 'Agrégats hebdo/mensuels de daily_stats (rafraîchis après chaque collecte)';
+COMMENT ON TABLE version_stats_rollup IS 'Agrégats hebdo/mensuels de version_stats';
+COMMENT ON TABLE modpack_stats_rollup IS 'Agrégats hebdo/mensuels de modpack_stats';
+
+-- Versions des données (incrémentées après chaque collecte, clés du cache de lecture)
+CREATE TABLE IF NOT EXISTS data_versions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE data_versions IS 'Version de chaque table, incrémentée quand une collecte la modifie';
+
+-- Version du schéma : doit suivre SCHEMA_VERSION (src/core/database.py). StatsDatabase
+-- ne rejoue son DDL qu'au démarrage sur une base en retard.
+CREATE TABLE IF NOT EXISTS schema_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO schema_version (id, version) VALUES (TRUE, 7)
+ON CONFLICT (id) DO NOTHING;
+
 -- Fonction pour mettre à jour automatiquement updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -121,4 +242,11 @@ BEGIN
     RAISE NOTICE '  - daily_stats';
     RAISE NOTICE '  - version_stats';
     RAISE NOTICE '  - modpack_stats';
+    RAISE NOTICE '  - version_latest';
+    RAISE NOTICE '  - modpack_latest';
+    RAISE NOTICE '  - modpack_first_seen';
+    RAISE NOTICE '  - daily/version/modpack_stats_rollup';
+    RAISE NOTICE '  - version/modpack_stats_dense (vues)';
+    RAISE NOTICE '  - data_versions';
+    RAISE NOTICE '  - schema_version';
 END $$;
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de la couche base de données
+Mesure les performances des chemins d'écriture et de lecture de StatsDatabase
+Toutes les écritures sont annulées (ROLLBACK) : la base n'est pas modifiée
+(sauf --seed-days, réservé aux bases SQLite jetables : --url sqlite://)
+"""
+import sys
+import time
+import argparse
+import statistics
+import tracemalloc
+from pathlib import Path
+from datetime import date, timedelta
+
+# Ajouter le répertoire parent au path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+
+from src.core.database import open_database
+from src.config import DATABASE_URL, DB_BATCH_SIZE
+
+# Date fictive pour ne jamais entrer en conflit avec des données réelles
+BENCH_DATE = date(1970, 1, 1)
+
+
+def make_modpack_rows(count):
+    """Génère des lignes modpack synthétiques"""
+    return [
+        (BENCH_DATE, 'curseforge', f"Bench Modpack {i}", f"bench-modpack-{i}", i * 10, i)
+        for i in range(count)
+    ]
+
+
+def make_history_rows(platform, days, count=100):
+    """Historique modpack synthétique : count modpacks sur les days derniers jours"""
+    today = date.today()
+    for day in range(days):
+        for i in range(count):
+            yield (today - timedelta(days=day), platform, f"Seed Modpack {i}", f"seed-modpack-{i}",
+                   (days - day) * (i + 1), i)
+
+
+def bench_row_loop(db, rows):
+    """Ancien chemin : les mêmes upserts (historique, *_latest, first_seen), une ligne à la fois"""
+    start = time.perf_counter()
+    for row in rows:
+        db._upsert_modpack_rows(db.cursor, [row])
+    elapsed = time.perf_counter() - start
+    db.conn.rollback()
+    return elapsed
+
+
+def bench_batched(db, rows):
+    """Nouveau chemin : INSERT multi-lignes par lots"""
+    start = time.perf_counter()
+    db._upsert_modpack_rows(db.cursor, rows)
+    elapsed = time.perf_counter() - start
+    db.conn.rollback()
+    return elapsed
+
+
+def bench_history_tuples(db, platform, days):
+    """Ancien chemin des onglets historiques : tuples -> DataFrame -> to_datetime"""
+    history = db.get_modpack_stats_history(platform, days=days, resolution='day')
+    df = pd.DataFrame(history, columns=['date', 'modpack_name', 'downloads'])
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def bench_history_frame(db, platform, days):
+    """Nouveau chemin : COPY CSV -> DataFrame typé"""
+    return db.get_modpack_stats_history_frame(platform, days=days, resolution='day')
+
+
+def bench_keyset_pages(db, platform, limit):
+    """Latence de chaque page de get_modpack_stats_history_page, de la première à la dernière"""
+    samples = []
+    token = None
+    while True:
+        start = time.perf_counter()
+        _, token = db.get_modpack_stats_history_page(platform, limit=limit, page_token=token)
+        samples.append(time.perf_counter() - start)
+        if token is None:
+            return samples
+
+
+def bench_offset_page(db, platform, limit, offset):
+    """Ancien chemin : même page lue par LIMIT/OFFSET (toutes les lignes précédentes sont relues)"""
+    mark = '?' if db.db_url.startswith('sqlite:') else '%s'
+    start = time.perf_counter()
+    db._fetchall(f"""
+        SELECT date, modpack_name, downloads
+        FROM modpack_stats
+        WHERE platform = {mark} AND modpack_slug IS NOT NULL
+        ORDER BY date DESC, modpack_slug DESC
+        LIMIT {mark} OFFSET {mark}
+    """, (platform, limit, offset))
+    return time.perf_counter() - start
+
+
+def measure_allocations(func, *args):
+    """
+    Temps, pic mémoire et blocs Python laissés par func(*args), mesurés par rapport à
+    l'état avant l'appel (les blocs libérés en cours de route ne comptent que dans le pic).
+    Le temps vient d'un premier appel sans tracemalloc, qui ralentit chaque allocation.
+    """
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    result = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    blocks = sum(
+        stat.count_diff
+        for stat in after.filter_traces(ignored).compare_to(before.filter_traces(ignored), 'filename')
+    )
+    return result, elapsed, peak - baseline, blocks
+
+
+def report_allocations(label, elapsed, peak, blocks):
+    print(f"   {label:<28} {elapsed * 1000:>9.1f} ms   peak +{peak / 1024 / 1024:>6.1f} MiB   "
+          f"{blocks:>+10,} blocks kept")
+
+
+def bench_latency(databases, operation, iterations, cleanup=None):
+    """
+    Latences de operation(db) pour chaque base de databases ({label: db}) : un appel de
+    chauffe chacune (PREPARE), puis des appels alternés. cleanup(db) n'est pas chronométré.
+    """
+    samples = {label: [] for label in databases}
+    for db in databases.values():
+        operation(db)
+        if cleanup:
+            cleanup(db)
+    for _ in range(iterations):
+        for label, db in databases.items():
+            start = time.perf_counter()
+            operation(db)
+            samples[label].append(time.perf_counter() - start)
+            if cleanup:
+                cleanup(db)
+    return samples
+
+
+def report_latency(label, samples, baseline=None):
+    cuts = statistics.quantiles(samples, n=100)
+    line = f"   {label:<28} p50 {cuts[49] * 1000:>8.3f} ms   p99 {cuts[98] * 1000:>8.3f} ms"
+    if baseline:
+        base = statistics.quantiles(baseline, n=100)
+        line += f"   (p50 x{base[49] / cuts[49]:.2f}, p99 x{base[98] / cuts[98]:.2f})"
+    print(line)
+
+
+def report(label, rows_count, elapsed):
+    print(f"   {label:<28} {elapsed * 1000:>9.1f} ms   {rows_count / elapsed:>12,.0f} rows/s")
+
+
+def main():
+    """Point d'entrée principal"""
+    parser = argparse.ArgumentParser(description="StatsDatabase benchmarks")
+    parser.add_argument('--rows', type=int, default=2000, help="Nombre de lignes par essai")
+    parser.add_argument('--batch-size', type=int, default=DB_BATCH_SIZE, help="Taille des lots")
+    parser.add_argument('--repeat', type=int, default=3, help="Nombre d'essais (meilleur temps retenu)")
+    parser.add_argument('--platform', default='curseforge', help="Plateforme des lectures d'historique")
+    parser.add_argument('--days', type=int, default=None, help="Période lue (défaut : tout l'historique)")
+    parser.add_argument('--url', default=DATABASE_URL,
+                        help="Base à mesurer (défaut : DATABASE_URL ; sqlite:// = en mémoire, sans serveur)")
+    parser.add_argument('--seed-days', type=int, default=0,
+                        help="Jours d'historique synthétique à charger avant les lectures (SQLite uniquement)")
+    parser.add_argument('--iterations', type=int, default=200,
+                        help="Appels par requête pour les latences p50/p99")
+    parser.add_argument('--write-rows', type=int, default=100,
+                        help="Lignes par écriture pour les latences (taille d'une collecte)")
+    parser.add_argument('--page-size', type=int, default=100,
+                        help="Lignes par page pour les lectures paginées (keyset vs OFFSET)")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("  Create Nuclear Stats - Database Benchmarks")
+    print("=" * 60)
+    
+    if args.seed_days and not args.url.startswith('sqlite:'):
+        print("\n✗ --seed-days writes data: use it with a disposable SQLite database (--url sqlite://)")
+        return 1
+    
+    # PREPARE ne concerne que PostgreSQL : sqlite3 garde déjà ses requêtes compilées
+    # (prepare y est ignoré, la comparaison ne mesurerait que du bruit)
+    compare_prepared = not args.url.startswith('sqlite:')
+    databases = {}
+    try:
+        db = open_database(args.url, batch_size=args.batch_size)
+        if compare_prepared:
+            databases = {
+                'unprepared': open_database(args.url, batch_size=args.batch_size, prepare=False),
+                'prepared': open_database(args.url, batch_size=args.batch_size, prepare=True),
+            }
+    except Exception as e:
+        print(f"\n✗ Database connection failed: {e}")
+        return 1
+    
+    try:
+        if args.seed_days:
+            counts = db.bulk_load_modpack_stats(make_history_rows(args.platform, args.seed_days), args.platform)
+            print(f"\n🌱 Seeded {counts['written']:,} modpack history rows ({type(db).__name__})")
+        
+        rows = make_modpack_rows(args.rows)
+        
+        print(f"\n📊 Modpack upserts ({args.rows} rows, batch size {args.batch_size})")
+        loop_time = min(bench_row_loop(db, rows) for _ in range(args.repeat))
+        batched_time = min(bench_batched(db, rows) for _ in range(args.repeat))
+        
+        report("Row-by-row loop", args.rows, loop_time)
+        report("Batched upsert", args.rows, batched_time)
+        print(f"\n✓ Speedup: x{loop_time / batched_time:.1f}")
+        
+        # Requêtes chaudes du dashboard et écriture d'une collecte, avec et sans PREPARE
+        if compare_prepared:
+            write_rows = make_modpack_rows(args.write_rows)
+            operations = [
+                ("get_daily_stats_history", lambda d: d.get_daily_stats_history(args.platform, days=30), None),
+                ("get_version_stats_history", lambda d: d.get_version_stats_history(args.platform, days=30), None),
+                ("get_all_modpacks_latest", lambda d: d.get_all_modpacks_latest(args.platform), None),
+                (f"modpack upsert ({args.write_rows} rows)",
+                 lambda d: d._upsert_modpack_rows(d.cursor, write_rows), lambda d: d.conn.rollback()),
+            ]
+            print(f"\n📊 Statement latency ({args.iterations} calls each, unprepared vs prepared)")
+            for label, operation, cleanup in operations:
+                samples = bench_latency(databases, operation, args.iterations, cleanup)
+                print(f"   {label}")
+                report_latency("  Unprepared", samples['unprepared'])
+                report_latency("  Prepared", samples['prepared'], samples['unprepared'])
+        else:
+            print("\n📊 Statement latency: skipped on SQLite (no PREPARE, sqlite3 caches statements)")
+        
+        # Lecture seule sur les données existantes
+        print(f"\n📊 Modpack history read ({args.platform}, days={args.days or 'all'})")
+        df, tuples_time, tuples_peak, tuples_blocks = measure_allocations(
+            bench_history_tuples, db, args.platform, args.days
+        )
+        if df.empty:
+            print("   ⚠ No modpack history to read")
+            return 0
+        del df
+        df, frame_time, frame_peak, frame_blocks = measure_allocations(
+            bench_history_frame, db, args.platform, args.days
+        )
+        print(f"   {len(df):,} rows")
+        report_allocations("Tuples + pd.DataFrame", tuples_time, tuples_peak, tuples_blocks)
+        report_allocations("Typed DataFrame getter", frame_time, frame_peak, frame_blocks)
+        print(f"\n✓ Peak memory: x{tuples_peak / frame_peak:.1f} lower")
+        
+        # Pages à curseur : le coût d'une page ne dépend pas de sa profondeur
+        pages = bench_keyset_pages(db, args.platform, args.page_size)
+        last_offset = (len(pages) - 1) * args.page_size
+        print(f"\n📊 Modpack history pages ({len(pages):,} pages of {args.page_size} rows)")
+        print(f"   {'Keyset, first page':<28} {pages[0] * 1000:>9.1f} ms")
+        print(f"   {'Keyset, last page':<28} {pages[-1] * 1000:>9.1f} ms")
+        print(f"   {'OFFSET, first page':<28} {bench_offset_page(db, args.platform, args.page_size, 0) * 1000:>9.1f} ms")
+        print(f"   {'OFFSET, last page':<28} "
+              f"{bench_offset_page(db, args.platform, args.page_size, last_offset) * 1000:>9.1f} ms")
+        return 0
+    
+    finally:
+        db.close()
+        for database in databases.values():
+            database.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ Migre les données historiques stockées dans les fichiers
 import sys
 import csv
 import json
+import argparse
 from pathlib import Path
 from datetime import datetime
 
@@ -16,11 +17,76 @@ from src.core.database import StatsDatabase
 from src.config import DATABASE_URL, MODPACKS_CSV_PATH, MODPACKS_JSON_PATH
 
 
+def iter_csv_rows(csv_file: Path):
+    """
+    Lit le CSV ligne à ligne pour COPY : (date, platform, name, slug, downloads, followers)
+    Les colonnes optionnelles date/platform/followers permettent les imports historiques
+    """
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            yield (
+                row.get('date') or None,
+                row.get('platform') or None,
+                row.get('name') or row.get('title', ''),
+                row['slug'],
+                int(row['downloads']) if row.get('downloads') else 0,
+                int(row['followers']) if row.get('followers') else 0
+            )
+
+
+def iter_json_records(json_file: Path, chunk_size: int = 1 << 16):
+    """
+    Décode un tableau JSON (ou du JSON Lines) objet par objet, sans charger le fichier entier
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    
+    with open(json_file, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            pos = 0
+            
+            while True:
+                # Séparateurs de premier niveau entre deux objets
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                try:
+                    record, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if not chunk:
+                        raise
+                    break  # Objet incomplet : lire la suite
+                yield record
+            
+            buffer = buffer[pos:]
+            if not chunk:
+                break
+
+
+def iter_json_rows(json_file: Path):
+    """Convertit les objets JSON en lignes pour COPY"""
+    for record in iter_json_records(json_file):
+        if not record.get('slug'):
+            continue
+        yield (
+            record.get('date'),
+            record.get('platform'),
+            record.get('title', record.get('name', '')),
+            record['slug'],
+            record.get('downloads', 0),
+            record.get('follows', record.get('followers', 0))
+        )
+
+
 class DataImporter:
     """Importateur de données vers PostgreSQL"""
     
-    def __init__(self, db_url: str = None):
+    def __init__(self, db_url: str = None, bulk: bool = False):
         self.db_url = db_url or DATABASE_URL
+        self.bulk = bulk
         self.db = None
     
     def connect_database(self) -> bool:
@@ -43,6 +109,9 @@ class DataImporter:
         
         print(f"\n📊 Importing modpacks from CSV: {csv_file}")
         
+        if self.bulk:
+            return self._bulk_import(iter_csv_rows(csv_file), "CSV")
+        
         try:
             modpacks_data = []
             
@@ -58,8 +127,9 @@ class DataImporter:
             
             if modpacks_data:
                 # Sauvegarder dans la base de données
-                self.db.save_modpack_stats("curseforge", modpacks_data)
-                print(f"✓ Imported {len(modpacks_data)} modpacks from CSV")
+                counts = self.db.save_modpack_stats("curseforge", modpacks_data)
+                print(f"✓ Imported {len(modpacks_data)} modpacks from CSV "
+                      f"({counts['written']} written, {counts['unchanged']} unchanged)")
                 return True
             else:
                 print("⚠ No data found in CSV")
@@ -81,14 +151,18 @@ class DataImporter:
         
         print(f"\n📊 Importing modpacks from JSON: {json_file}")
         
+        if self.bulk:
+            return self._bulk_import(iter_json_rows(json_file), "JSON")
+        
         try:
             with open(json_file, 'r', encoding='utf-8') as f:
                 modpacks_data = json.load(f)
             
             if modpacks_data:
                 # Sauvegarder dans la base de données
-                self.db.save_modpack_stats("curseforge", modpacks_data)
-                print(f"✓ Imported {len(modpacks_data)} modpacks from JSON")
+                counts = self.db.save_modpack_stats("curseforge", modpacks_data)
+                print(f"✓ Imported {len(modpacks_data)} modpacks from JSON "
+                      f"({counts['written']} written, {counts['unchanged']} unchanged)")
                 return True
             else:
                 print("⚠ No data found in JSON")
@@ -100,6 +174,27 @@ class DataImporter:
             traceback.print_exc()
             return False
     
+    def _bulk_import(self, rows, source: str) -> bool:
+        """Import en flux via COPY + fusion ensembliste"""
+        try:
+            start = datetime.now()
+            counts = self.db.bulk_load_modpack_stats(rows, "curseforge")
+            elapsed = (datetime.now() - start).total_seconds()
+            
+            if counts['written'] or counts['unchanged']:
+                print(f"✓ Bulk-imported {counts['written']:,} rows from {source} in {elapsed:.1f}s "
+                      f"({counts['unchanged']:,} unchanged)")
+                return True
+            else:
+                print(f"⚠ No data found in {source}")
+                return False
+                
+        except Exception as e:
+            print(f"✗ Error bulk-importing {source}: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+    
     def verify_import(self) -> bool:
         """Vérifie les données importées"""
         print(f"\n🔍 Verifying imported data...")
@@ -119,24 +214,31 @@ class DataImporter:
             print(f"✗ Error verifying data: {e}")
             return False
     
-    def run(self) -> int:
+    def run(self, csv_path: str = None, json_path: str = None) -> int:
         """Exécute l'import complet"""
         print("=" * 60)
         print("  Create Nuclear Stats - Data Import to PostgreSQL")
         print("=" * 60)
         print(f"Started at: {datetime.now()}")
+        print(f"Mode: {'bulk (COPY)' if self.bulk else 'row upserts'}")
         
         if not self.connect_database():
             return 1
         
         try:
             # Essayer d'importer depuis CSV d'abord
-            csv_ok = self.import_modpacks_from_csv()
+            csv_ok = self.import_modpacks_from_csv(csv_path)
             
             # Si le CSV échoue, essayer JSON
             json_ok = False
             if not csv_ok:
-                json_ok = self.import_modpacks_from_json()
+                json_ok = self.import_modpacks_from_json(json_path)
+            
+            # Les données importées peuvent couvrir n'importe quelle période
+            if csv_ok or json_ok:
+                self.db.refresh_all_rollups(sources=['modpack'])
+                print("✓ Modpack rollups rebuilt")
+                self.db.bump_data_versions(run_id=f"import-{datetime.now():%Y%m%d%H%M%S}")
             
             # Vérifier les données importées
             verify_ok = self.verify_import()
@@ -165,8 +267,15 @@ class DataImporter:
 
 def main():
     """Point d'entrée principal"""
-    importer = DataImporter()
-    return importer.run()
+    parser = argparse.ArgumentParser(description="Import CSV/JSON modpack data into PostgreSQL")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Stream rows through COPY into a staging table (large/historical imports)")
+    parser.add_argument('--csv', dest='csv_path', help="CSV file (default: MODPACKS_CSV_PATH)")
+    parser.add_argument('--json', dest='json_path', help="JSON array or JSON Lines file (default: MODPACKS_JSON_PATH)")
+    args = parser.parse_args()
+    
+    importer = DataImporter(bulk=args.bulk)
+    return importer.run(args.csv_path, args.json_path)
 
 
 if __name__ == "__main__":
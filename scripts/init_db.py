@@ -29,7 +29,7 @@ def main():
         
         print("\n📋 Creating tables...")
         db.create_tables()
-        print("✓ Tables created/verified")
+        print(f"✓ Tables created/verified (schema version {db.get_schema_version()})")
         
         # Vérifier les tables
         print("\n🔍 Verifying tables...")
@@ -11,8 +11,10 @@ from datetime import datetime
 # Ajouter le répertoire parent au path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.core.database import StatsDatabase
-from src.config import DATABASE_URL
+from src.core.database import (
+    StatsDatabase, PARTITIONED_TABLES, PARTITION_MONTHS_AHEAD, SPARSE_SOURCES, SCHEMA_VERSION
+)
+from src.config import DATABASE_URL, DB_SPARSE_HISTORY
 
 
 class Migration:
@@ -147,10 +149,324 @@ class AddIndexes(Migration):
             print(f"    ✓ Removed index {idx_name}")
 
 
+class AddLatestSnapshotTables(Migration):
+    """
+    Migration: Tables des dernières valeurs (version_latest, modpack_latest)
+    Version: 2024-01-03
+    """
+    
+    def up(self):
+        """Créer et remplir les tables depuis l'historique"""
+        print("  Backfilling latest snapshot tables...")
+        
+        # Les tables sont créées par StatsDatabase.ensure_schema() à la connexion
+        self.db._backfill_latest_tables(self.cursor)
+        
+        for table in ['version_latest', 'modpack_latest']:
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            print(f"    ✓ {table}: {self.cursor.fetchone()[0]} rows")
+    
+    def down(self):
+        """Supprimer les tables"""
+        print("  Removing latest snapshot tables...")
+        
+        for table in ['version_latest', 'modpack_latest']:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            print(f"    ✓ Removed {table}")
+
+
+class AddModpackFirstSeen(Migration):
+    """
+    Migration: Table de première observation des modpacks (modpack_first_seen)
+    Version: 2024-01-04
+    """
+    
+    def up(self):
+        """Remplir la table depuis l'historique"""
+        print("  Backfilling modpack_first_seen...")
+        
+        # La table est créée par StatsDatabase.ensure_schema() à la connexion
+        self.db._backfill_first_seen(self.cursor)
+        
+        self.cursor.execute("SELECT COUNT(*) FROM modpack_first_seen")
+        print(f"    ✓ modpack_first_seen: {self.cursor.fetchone()[0]} rows")
+    
+    def down(self):
+        """Supprimer la table"""
+        print("  Removing modpack_first_seen...")
+        self.cursor.execute("DROP TABLE IF EXISTS modpack_first_seen")
+        print("    ✓ Removed modpack_first_seen")
+
+
+class AddHistoryRollups(Migration):
+    """
+    Migration: Agrégats hebdomadaires/mensuels de l'historique
+    Version: 2024-01-05
+    """
+    
+    tables = ['daily_stats_rollup', 'version_stats_rollup', 'modpack_stats_rollup']
+    
+    def up(self):
+        """Calculer les agrégats sur tout l'historique"""
+        print("  Building history rollups...")
+        
+        # Les tables sont créées par StatsDatabase.ensure_schema() à la connexion
+        self.db._refresh_rollups(self.cursor, since=None, sources=['daily', 'version', 'modpack'])
+        
+        for table in self.tables:
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            print(f"    ✓ {table}: {self.cursor.fetchone()[0]} rows")
+    
+    def down(self):
+        """Supprimer les tables d'agrégats"""
+        print("  Removing history rollups...")
+        
+        for table in self.tables:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            print(f"    ✓ Removed {table}")
+
+
+class PartitionHistoryTables(Migration):
+    """
+    Migration: Partitionnement mensuel (RANGE sur date) de version_stats et modpack_stats
+    Version: 2024-01-06
+    """
+    
+    def _columns(self, table):
+        self.cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = %s ORDER BY ordinal_position
+        """, (table,))
+        return [row[0] for row in self.cursor.fetchall()]
+    
+    def _indexes(self, table):
+        """Index de la table qui ne portent pas une contrainte"""
+        self.cursor.execute("""
+            SELECT i.indexname, i.indexdef FROM pg_indexes i
+            WHERE i.tablename = %s
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+        """, (table,))
+        return self.cursor.fetchall()
+    
+    def _constraints(self, table, new):
+        """Couples (nom canonique, contrainte de la nouvelle table renommée en `table`)"""
+        self.cursor.execute("""
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u')
+        """, (table,))
+        return [
+            (name.replace(new, table, 1), name)
+            for (name,) in self.cursor.fetchall() if name.startswith(new)
+        ]
+    
+    def _partition(self, table, key):
+        """Copie en ligne mois par mois, puis bascule sous verrou court"""
+        new = f"{table}_partitioned"
+        
+        if self.db._is_partitioned(self.cursor, table):
+            print(f"    ⊘ {table} already partitioned")
+            return
+        
+        # Reprise propre d'une exécution interrompue
+        self.cursor.execute(f"DROP TABLE IF EXISTS {new} CASCADE")
+        
+        self.cursor.execute(f"""
+            CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+            PARTITION BY RANGE (date)
+        """)
+        self.cursor.execute(f"ALTER TABLE {new} ADD PRIMARY KEY (id, date)")
+        self.cursor.execute(f"ALTER TABLE {new} ADD UNIQUE (date, platform, {key})")
+        
+        # Mêmes index que l'ancienne table (hors contraintes), sous un nom temporaire
+        indexes = self._indexes(table)
+        for name, definition in indexes:
+            self.cursor.execute(
+                definition.replace(f" INDEX {name} ON ", f" INDEX {name}_partitioned ON ", 1)
+                          .replace(f" ON public.{table} ", f" ON {new} ", 1)
+            )
+        self.cursor.execute(f"CREATE TABLE {new}_default PARTITION OF {new} DEFAULT")
+        
+        self.cursor.execute(f"SELECT MIN(date), clock_timestamp() FROM {table}")
+        first_date, copy_started = self.cursor.fetchone()
+        today = datetime.now().date()
+        last_month = today
+        for _ in range(PARTITION_MONTHS_AHEAD):
+            last_month = self.db._next_month(last_month)
+        
+        self.db._ensure_partitions(self.cursor, new, first_date or today, last_month)
+        self.conn.commit()
+        
+        # Copie par mois, un commit par lot : l'ancienne table reste lisible et modifiable
+        columns = self._columns(table)
+        column_list = ', '.join(columns)
+        month = (first_date or today).replace(day=1)
+        while first_date and month <= today:
+            upper = self.db._next_month(month)
+            self.cursor.execute(f"""
+                INSERT INTO {new} ({column_list})
+                SELECT {column_list} FROM {table} WHERE date >= %s AND date < %s
+            """, (month, upper))
+            self.conn.commit()
+            print(f"    ✓ {table}: copied {month:%Y-%m} ({self.cursor.rowcount} rows)")
+            month = upper
+        
+        # Bascule : on bloque les écritures (pas les lectures) le temps du rattrapage
+        self.cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        
+        changed = ["date >= %(month)s", "created_at >= %(started)s"]
+        if 'updated_at' in columns:
+            changed.append("updated_at >= %(started)s")
+        if 'valid_to' in columns:
+            changed.append("valid_to >= %(month)s")
+        updates = ', '.join(
+            f"{column} = EXCLUDED.{column}"
+            for column in columns if column not in ('id', 'date', 'platform', key)
+        )
+        self.cursor.execute(f"""
+            INSERT INTO {new} ({column_list})
+            SELECT {column_list} FROM {table} WHERE {' OR '.join(changed)}
+            ON CONFLICT (date, platform, {key}) DO UPDATE SET {updates}
+        """, {'month': today.replace(day=1), 'started': copy_started})
+        print(f"    ✓ {table}: {self.cursor.rowcount} rows re-synced")
+        
+        # La séquence de id doit survivre à la suppression future de l'ancienne table
+        self.cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+        sequence = self.cursor.fetchone()[0]
+        if sequence:
+            self.cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {new}.id")
+        
+        self.cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+        self.cursor.execute(f"ALTER TABLE {new} RENAME TO {table}")
+        self.cursor.execute(f"ALTER TABLE {new}_default RENAME TO {table}_default")
+        self.cursor.execute(f"""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s) AND c.relname LIKE %s
+        """, (table, f"{new}_p%"))
+        for (partition,) in self.cursor.fetchall():
+            self.cursor.execute(
+                f"ALTER TABLE {partition} RENAME TO {table}{partition[len(new):]}"
+            )
+        
+        # Les noms d'index attendus par create_tables() passent sur la nouvelle table
+        for name, _ in indexes:
+            self.cursor.execute(f"ALTER INDEX {name} RENAME TO {name}_unpartitioned")
+            self.cursor.execute(f"ALTER INDEX {name}_partitioned RENAME TO {name}")
+        for old_name, new_name in self._constraints(table, new):
+            self.cursor.execute(f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {old_name} TO {old_name}_unpartitioned")
+            self.cursor.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {new_name} TO {old_name}")
+        
+        self.cursor.execute("SELECT to_regprocedure('update_updated_at_column()') IS NOT NULL")
+        if 'updated_at' in columns and self.cursor.fetchone()[0]:
+            self.cursor.execute(f"""
+                CREATE TRIGGER update_{table}_updated_at
+                BEFORE UPDATE ON {table}
+                FOR EACH ROW
+                EXECUTE FUNCTION update_updated_at_column()
+            """)
+        
+        # Les vues suivent la table renommée : on les recrée sur la nouvelle
+        self.cursor.execute(f"DROP VIEW IF EXISTS {table}_dense")
+        self.db._create_dense_views(self.cursor)
+        
+        print(f"    ✓ {table} partitioned (old data kept in {table}_unpartitioned)")
+    
+    def up(self):
+        """Partitionner les tables d'historique"""
+        print("  Partitioning history tables...")
+        
+        for table, key in PARTITIONED_TABLES.items():
+            self._partition(table, key)
+    
+    def down(self):
+        """Revenir aux tables non partitionnées (données récentes recopiées)"""
+        print("  Restoring unpartitioned history tables...")
+        
+        for table, key in PARTITIONED_TABLES.items():
+            self.cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{table}_unpartitioned",))
+            if not self.cursor.fetchone()[0]:
+                print(f"    ⊘ {table}_unpartitioned not found, skipping")
+                continue
+            
+            columns = self._columns(table)
+            column_list = ', '.join(columns)
+            updates = ', '.join(
+                f"{column} = EXCLUDED.{column}"
+                for column in columns if column not in ('id', 'date', 'platform', key)
+            )
+            self.cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            self.cursor.execute(f"""
+                INSERT INTO {table}_unpartitioned ({column_list})
+                SELECT {column_list} FROM {table}
+                ON CONFLICT (date, platform, {key}) DO UPDATE SET {updates}
+            """)
+            
+            self.cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+            sequence = self.cursor.fetchone()[0]
+            if sequence:
+                self.cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}_unpartitioned.id")
+            
+            self.cursor.execute(f"DROP TABLE {table} CASCADE")
+            self.cursor.execute("""
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = to_regclass(%s) AND conname LIKE '%%\\_unpartitioned'
+            """, (f"{table}_unpartitioned",))
+            for (name,) in self.cursor.fetchall():
+                self.cursor.execute(
+                    f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {name} TO {name[:-len('_unpartitioned')]}"
+                )
+            for name, _ in self._indexes(f"{table}_unpartitioned"):
+                if name.endswith('_unpartitioned'):
+                    self.cursor.execute(
+                        f"ALTER INDEX {name} RENAME TO {name[:-len('_unpartitioned')]}"
+                    )
+            self.cursor.execute(f"ALTER TABLE {table}_unpartitioned RENAME TO {table}")
+            self.db._create_dense_views(self.cursor)
+            print(f"    ✓ {table} restored")
+
+
+class AddSparseHistory(Migration):
+    """
+    Migration: Historique creux (une ligne par changement, colonne valid_to + vues *_dense)
+    Version: 2024-01-07
+    """
+    
+    def up(self):
+        """Compacter l'historique existant si DB_SPARSE_HISTORY est activé"""
+        print("  Enabling change-only history...")
+        
+        # valid_to et les vues sont créées par StatsDatabase.ensure_schema() à la connexion
+        if not DB_SPARSE_HISTORY:
+            print("    ⊘ DB_SPARSE_HISTORY disabled, history left dense")
+            return
+        
+        removed = self.db._compact_history(self.cursor, SPARSE_SOURCES)
+        print(f"    ✓ {removed} redundant rows removed")
+    
+    def down(self):
+        """Redévelopper les intervalles en lignes journalières"""
+        print("  Expanding change-only history...")
+        
+        for spec in SPARSE_SOURCES.values():
+            columns = ', '.join(spec['columns'])
+            self.cursor.execute(f"""
+                INSERT INTO {spec['table']} ({columns})
+                SELECT {columns} FROM {spec['dense']}
+                ON CONFLICT (date, platform, {spec['key']}) DO NOTHING
+            """)
+            inserted = self.cursor.rowcount
+            self.cursor.execute(f"UPDATE {spec['table']} SET valid_to = NULL WHERE valid_to IS NOT NULL")
+            print(f"    ✓ {spec['table']}: {inserted} daily rows restored")
+
+
 # Liste des migrations dans l'ordre
 MIGRATIONS = [
     AddUpdatedAtColumns,
     AddIndexes,
+    AddLatestSnapshotTables,
+    AddModpackFirstSeen,
+    AddHistoryRollups,
+    PartitionHistoryTables,
+    AddSparseHistory,
 ]
 
 
@@ -216,6 +532,8 @@ def rollback_migration(db, migration_class):
             "DELETE FROM schema_migrations WHERE migration_name = %s",
             (migration_name,)
         )
+        # Le schéma ne correspond plus à SCHEMA_VERSION : DDL rejoué à la prochaine connexion
+        db.cursor.execute("DELETE FROM schema_version")
         db.conn.commit()
         
         print(f"✓ Migration {migration_name} rolled back successfully")
@@ -259,6 +577,7 @@ def main():
             print(f"   Total migrations: {len(MIGRATIONS)}")
             print(f"   Applied: {len(applied)}")
             print(f"   Pending: {len(MIGRATIONS) - len(applied)}")
+            print(f"   Schema version: {db.get_schema_version()}/{SCHEMA_VERSION}")
             
             print(f"\n📝 Details:")
             for migration_class in MIGRATIONS:
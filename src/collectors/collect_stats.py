@@ -5,13 +5,14 @@ Utilise les classes modulaires pour une meilleure organisation
 """
 import sys
 import time
+import uuid
 from datetime import datetime
 from pathlib import Path
 
 # Ajouter le répertoire racine au path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from src.core.database import StatsDatabase
+from src.core.database import open_database
 from src.core.api_clients import ModrinthClient, CurseForgeClient
 from src.core.scraper import CurseForgeScraper
 from src.core.modpack_manager import ModpackManager
@@ -28,12 +29,32 @@ class StatsCollector:
         self.curseforge = CurseForgeClient()
         self.scraper = CurseForgeScraper()
         self.modpack_manager = ModpackManager()
+        # Lignes réellement écrites vs identiques à la collecte précédente du jour
+        self.row_counts = {'written': 0, 'unchanged': 0}
+        # Identifiant du run, transmis aux dashboards avec le NOTIFY de fin de collecte
+        self.run_id = uuid.uuid4().hex[:12]
+        # Écritures en attente (source, libellé, save), jouées dans une seule transaction
+        self.staged_writes = []
+        # Modpacks à écrire dans le CSV une fois la transaction validée
+        self.pending_csv = None
+    
+    def _stage(self, source: str, label: str, write):
+        """Met une écriture en attente jusqu'à write_staged()"""
+        self.staged_writes.append((source, label, write))
+    
+    def _count_rows(self, counts: dict) -> dict:
+        """Cumule les compteurs renvoyés par les saves"""
+        for key in self.row_counts:
+            self.row_counts[key] += counts[key]
+        return counts
     
     def connect_database(self) -> bool:
         """Connexion à la base de données"""
         try:
-            self.db = StatsDatabase(self.db_url)
+            self.db = open_database(self.db_url)
             print("✓ Connected to database")
+            # Partitions du mois courant et des suivants (sans effet si non partitionné)
+            self.db.ensure_partitions()
             return True
         except Exception as e:
             print(f"✗ Database connection failed: {e}")
@@ -49,15 +70,15 @@ class StatsCollector:
                 print("✗ Failed to fetch Modrinth stats")
                 return False
             
-            # Sauvegarder les stats quotidiennes
-            self.db.save_daily_stats(
+            # Stats quotidiennes
+            self._stage("modrinth", "Modrinth daily stats", lambda: self.db.save_daily_stats(
                 platform="modrinth",
                 total_downloads=stats['total_downloads'],
                 followers=stats['followers'],
                 versions_count=stats['versions_count']
-            )
+            ))
             
-            # Sauvegarder les stats par version
+            # Stats par version
             versions_data = [{
                 'name': v['name'],
                 'version_number': v['version_number'],
@@ -66,7 +87,8 @@ class StatsCollector:
                 'game_versions': v['game_versions']
             } for v in stats['versions']]
             
-            self.db.save_version_stats("modrinth", versions_data)
+            self._stage("modrinth", "Modrinth versions",
+                        lambda: self.db.save_version_stats("modrinth", versions_data))
             
             print(f"✓ Modrinth: {stats['total_downloads']:,} downloads, {stats['versions_count']} versions")
             return True
@@ -89,15 +111,15 @@ class StatsCollector:
                 print("✗ Failed to fetch CurseForge stats")
                 return False
             
-            # Sauvegarder les stats quotidiennes
-            self.db.save_daily_stats(
+            # Stats quotidiennes
+            self._stage("curseforge", "CurseForge daily stats", lambda: self.db.save_daily_stats(
                 platform="curseforge",
                 total_downloads=stats['total_downloads'],
                 followers=stats['followers'],
                 versions_count=stats['versions_count']
-            )
+            ))
             
-            # Sauvegarder les stats par version
+            # Stats par version
             versions_data = [{
                 'name': f['displayName'],
                 'version_number': f['fileName'],
@@ -106,7 +128,8 @@ class StatsCollector:
                 'game_versions': f.get('gameVersions', [])
             } for f in stats['files']]
             
-            self.db.save_version_stats("curseforge", versions_data)
+            self._stage("curseforge", "CurseForge files",
+                        lambda: self.db.save_version_stats("curseforge", versions_data))
             
             print(f"✓ CurseForge: {stats['total_downloads']:,} downloads, {stats['versions_count']} files")
             return True
@@ -178,22 +201,12 @@ class StatsCollector:
                 if (i + 1) % BATCH_SIZE == 0:
                     time.sleep(API_DELAY)
             
-            # 4. Sauvegarder
+            # 4. Sauvegarder : base dans la transaction de la collecte, CSV après son commit
             if enriched:
-                # Sauvegarder en CSV
-                success = self.modpack_manager.save_to_csv(enriched)
-                
-                # Sauvegarder en base de données
-                try:
-                    self.db.save_modpack_stats("curseforge", enriched)
-                    print(f"  ✓ Saved {len(enriched)} modpacks to database")
-                except Exception as e:
-                    print(f"  ✗ Failed to save modpacks to database: {e}")
-                
-                if success:
-                    stats = self.modpack_manager.get_stats()
-                    print(f"✓ Modpacks: {stats['total']} saved, {stats['total_downloads']:,} total downloads")
-                    return True
+                self._stage("modpacks", "Modpacks", lambda: self.db.save_modpack_stats("curseforge", enriched))
+                self.pending_csv = enriched
+                print(f"✓ Modpacks: {len(enriched)} fetched")
+                return True
             
             print("✗ No modpacks updated")
             return False
@@ -202,28 +215,105 @@ class StatsCollector:
             print(f"✗ Error updating modpacks: {e}")
             return False
     
+    def write_staged(self):
+        """
+        Joue les écritures en attente (à appeler dans db.transaction())
+        
+        Une écriture en échec lève son exception : la transaction annule tout le run.
+        """
+        print(f"[{datetime.now()}] Writing {len(self.staged_writes)} staged saves...")
+        staged, self.staged_writes = self.staged_writes, []
+        for source, label, write in staged:
+            try:
+                counts = self._count_rows(write())
+            except Exception as e:
+                print(f"  ✗ {label}: {e}")
+                raise
+            print(f"  ✓ {label}: {counts['written']} written, {counts['unchanged']} unchanged")
+    
+    def write_modpacks_csv(self) -> bool:
+        """Écrit le CSV des modpacks enregistrés par la transaction validée"""
+        enriched, self.pending_csv = self.pending_csv, None
+        if not self.modpack_manager.save_to_csv(enriched):
+            print("✗ Failed to write modpacks CSV")
+            return False
+        stats = self.modpack_manager.get_stats()
+        print(f"✓ Modpacks: {stats['total']} saved, {stats['total_downloads']:,} total downloads")
+        return True
+    
+    def refresh_rollups(self):
+        """Rafraîchit les agrégats hebdomadaires/mensuels de la période courante (erreur : le run est annulé)"""
+        self.db.refresh_rollups()
+        print("✓ Rollups refreshed")
+    
+    def publish_versions(self):
+        """Publie les tables modifiées (NOTIFY au commit : les dashboards invalident leur cache)"""
+        versions = self.db.bump_data_versions(run_id=self.run_id)
+        print(f"✓ Data versions bumped: {', '.join(sorted(versions)) or 'nothing changed'}")
+    
+    def report_queries(self):
+        """Affiche les latences par méthode de la base et les requêtes lentes du run"""
+        query_stats = self.db.query_stats
+        summary = query_stats.summary()
+        if not summary:
+            return
+        print("Queries:")
+        for row in summary:
+            print(f"  {row['method']:<28} {row['calls']:>4} calls   p50 {row['p50_ms']:>7.1f} ms   "
+                  f"p99 {row['p99_ms']:>7.1f} ms   {row['rows']:>7,} rows")
+        for entry in query_stats.slow_queries():
+            print(f"  ⚠ Slow query in {entry['method']}: {entry['duration_ms']:.0f} ms "
+                  f"(> {query_stats.slow_ms:.0f} ms)")
+            if entry['plan']:
+                print("    " + entry['plan'].replace("\n", "\n    "))
+    
     def run(self) -> int:
         """Exécute la collecte complète"""
         print("=" * 60)
         print("  Create Nuclear Stats Collection")
         print("=" * 60)
         print(f"Started at: {datetime.now()}")
+        print(f"Run ID: {self.run_id}")
         
         if not self.connect_database():
             return 1
         
         try:
-            # Collecter les stats
+            # Collecter les stats (appels API, écritures mises en attente)
             modrinth_ok = self.collect_modrinth_stats()
             curseforge_ok = self.collect_curseforge_stats()
             modpacks_ok = self.update_modpacks()
             
+            # Toutes les écritures du run dans une seule transaction : un commit, tout ou rien
+            committed = True
+            try:
+                with self.db.transaction():
+                    self.write_staged()
+                    self.refresh_rollups()
+                    self.publish_versions()
+            except Exception as e:
+                print(f"✗ Transaction rolled back, nothing written: {e}")
+                self.row_counts = {'written': 0, 'unchanged': 0}
+                committed = False
+            
+            modrinth_ok = modrinth_ok and committed
+            curseforge_ok = curseforge_ok and committed
+            modpacks_ok = modpacks_ok and committed
+            rollups_ok = committed
+            
+            # Le CSV ne décrit que des modpacks déjà enregistrés en base
+            if modpacks_ok:
+                modpacks_ok = self.write_modpacks_csv()
+            
             # Résumé
             print("\n" + "=" * 60)
             print("Summary:")
             print(f"  Modrinth:   {'✓' if modrinth_ok else '✗'}")
             print(f"  CurseForge: {'✓' if curseforge_ok else '✗'}")
             print(f"  Modpacks:   {'✓' if modpacks_ok else '✗'}")
+            print(f"  Rollups:    {'✓' if rollups_ok else '✗'}")
+            print(f"  Rows:       {self.row_counts['written']} written, {self.row_counts['unchanged']} unchanged")
+            self.report_queries()
             print(f"Completed at: {datetime.now()}")
             print("=" * 60)
             
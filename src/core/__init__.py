@@ -4,13 +4,14 @@ Core modules for Create Nuclear Stats
 Contains database, API clients, scrapers, and modpack management
 """
 
-from .database import StatsDatabase
+from .database import StatsDatabase, open_database
 from .api_clients import ModrinthClient, CurseForgeClient
 from .scraper import CurseForgeScraper
 from .modpack_manager import ModpackManager
 
 __all__ = [
     'StatsDatabase',
+    'open_database',
     'ModrinthClient',
     'CurseForgeClient',
     'CurseForgeScraper',
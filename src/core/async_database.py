@@ -0,0 +1,454 @@
+"""
+Accès asynchrone à la base de statistiques (asyncpg)
+Mêmes getters/savers que StatsDatabase, sur un pool de connexions natif : les écritures
+d'une collecte s'exécutent dans la même boucle d'événements que les appels aux API
+"""
+import asyncio
+import io
+import json
+import os
+from datetime import datetime, timezone
+
+import asyncpg
+
+from src.core.database import (
+    ROLLUP_SOURCES, ROLLUP_RESOLUTIONS, HISTORY_RESOLUTIONS, HISTORY_FRAME_DTYPES, SERIES_FRAME_DTYPES,
+    SCHEMA_VERSION, WRITE_TABLES, UNNEST_TYPES, UPSERT_SQL, BUMP_VERSIONS_SQL, StatsDatabase,
+    numbered_query, unnest_rows, row_columns, first_seen_row, sparse_upsert_sql, rollup_upsert_sql,
+    frame_from_csv, pick_resolution, daily_history_query, version_history_query, modpack_history_query,
+    daily_series_query, entity_series_query, series_frames, top_movers_query, history_page_query,
+    latest_page_query, keyset_page, download_growth_query, latest_query, initial_downloads_query,
+    history_days_query, first_seen_map, version_rows, modpack_rows
+)
+from src.config import (
+    DB_BATCH_SIZE, DB_POOL_SIZE, DB_POOL_MIN_SIZE, DB_SPARSE_HISTORY, DB_STREAM_ITERSIZE,
+    DB_NOTIFY_CHANNEL
+)
+
+# Erreurs signalant une connexion perdue (une lecture est rejouée une fois)
+CONNECTION_ERRORS = (asyncpg.PostgresConnectionError, asyncpg.InterfaceError, ConnectionError)
+
+
+def _rowcount(status):
+    """Row count of a command status ("INSERT 0 3", "UPDATE 2"...)"""
+    return int(status.split()[-1])
+
+
+class AsyncStatsDatabase:
+    """
+    asyncio counterpart of StatsDatabase (PostgreSQL only)
+    
+    Usage:
+        async with AsyncStatsDatabase() as db:
+            await db.save_version_stats('modrinth', versions)
+    
+    Queries run on an asyncpg pool; asyncpg prepares each statement once per connection
+    and reuses it (statement cache), so repeated getters/savers skip parsing and planning.
+    Every call holds a connection only for its own transaction: saves and reads can be
+    awaited concurrently with HTTP requests (asyncio.gather, tasks).
+    Schema creation, partitions, compaction and bulk loads stay on StatsDatabase.
+    """
+    
+    def __init__(self, db_url=None, batch_size=None, pool_size=None, sparse=None):
+        """
+        Configure the pool (opened by connect() or `async with`)
+        
+        pool_size: maximum number of connections (default: DB_POOL_SIZE).
+        sparse: as in StatsDatabase; must match how the history tables are written.
+        """
+        if db_url is None:
+            db_url = os.environ.get('DATABASE_URL', 'postgresql://localhost/createnuclear_stats')
+        
+        self.db_url = db_url
+        self.batch_size = batch_size or DB_BATCH_SIZE
+        self.pool_size = pool_size or DB_POOL_SIZE
+        self.sparse = DB_SPARSE_HISTORY if sparse is None else sparse
+        self.stream_itersize = DB_STREAM_ITERSIZE
+        self._touched = set()
+        self.pool = None
+    
+    async def connect(self):
+        """Open the pool and bring the schema up to date if needed"""
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                self.db_url, min_size=min(DB_POOL_MIN_SIZE, self.pool_size), max_size=self.pool_size
+            )
+            await self.ensure_schema()
+        return self
+    
+    async def close(self):
+        """Close the pool (waits for the queries in flight)"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+    
+    async def __aenter__(self):
+        return await self.connect()
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def _run(self, operation, read=False):
+        """
+        Run await operation(connection) in its own transaction
+        
+        read: operation only reads, it is retried once on a dropped connection. Writes are
+        not retried (see StatsDatabase._run): a drop after the server committed would
+        replay them, and bump_data_versions would bump the versions twice.
+        """
+        for attempt in range(2):
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        return await operation(conn)
+            except CONNECTION_ERRORS:
+                if attempt or not read:
+                    raise
+    
+    async def _fetchall(self, query, params=None):
+        """Execute a read query (psycopg2 placeholders) and return all rows as tuples"""
+        query, args = numbered_query(query, params)
+        rows = await self._run(lambda conn: conn.fetch(query, *args), read=True)
+        return [tuple(row) for row in rows]
+    
+    async def _stream(self, query, params=None, chunk_size=None):
+        """
+        Yield the rows of query in lists of chunk_size rows (default DB_STREAM_ITERSIZE)
+        
+        Rows are read through a server-side cursor; the connection is held until the
+        generator is exhausted or closed.
+        """
+        chunk_size = chunk_size or self.stream_itersize
+        query, args = numbered_query(query, params)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor(query, *args)
+                while True:
+                    rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        break
+                    yield [tuple(row) for row in rows]
+    
+    async def _fetch_frame(self, query, params, dtypes):
+        """Run query and return a typed DataFrame, exported with COPY (see StatsDatabase._fetch_frame)"""
+        query, args = numbered_query(query, params)
+        
+        async def operation(conn):
+            buffer = io.BytesIO()
+            await conn.copy_from_query(query, *args, output=buffer, format='csv')
+            return buffer
+        
+        return frame_from_csv(await self._run(operation, read=True), dtypes)
+    
+    async def _upsert_unnest(self, conn, query, rows, result='status'):
+        """
+        Run a statement reading unnest_rows() over rows, batch_size rows per execution
+        
+        Each batch is sent as one array per column: a single prepared statement whatever
+        the batch length. Returns the sum over batches of the affected row count
+        (result='status'), of the returned row count ('rows') or of the returned value ('value').
+        """
+        count = 0
+        for start in range(0, len(rows), self.batch_size):
+            statement, args = numbered_query(query, row_columns(rows[start:start + self.batch_size]))
+            if result == 'value':
+                count += await conn.fetchval(statement, *args)
+            elif result == 'rows':
+                count += len(await conn.fetch(statement, *args))
+            else:
+                count += _rowcount(await conn.execute(statement, *args))
+        return count
+    
+    async def health_check(self):
+        """Return True if the database answers a trivial query"""
+        try:
+            return await self._fetchall("SELECT 1") == [(1,)]
+        except Exception:
+            return False
+    
+    async def get_schema_version(self):
+        """Schema version recorded in the database (0 if never initialized)"""
+        try:
+            rows = await self._fetchall("SELECT version FROM schema_version")
+        except asyncpg.UndefinedTableError:
+            return 0
+        return rows[0][0] if rows else 0
+    
+    async def ensure_schema(self):
+        """
+        Bring a database behind SCHEMA_VERSION up to date (DDL run by StatsDatabase
+        in a worker thread). Returns True if the schema was (re)created.
+        """
+        if await self.get_schema_version() >= SCHEMA_VERSION:
+            return False
+        
+        def upgrade():
+            StatsDatabase(self.db_url, sparse=self.sparse).close()
+        
+        await asyncio.to_thread(upgrade)
+        return True
+    
+    async def _pick_resolution(self, source, platform, days):
+        """Choose day/week/month so a chart gets a few hundred points at most (see StatsDatabase)"""
+        if days is None:
+            platforms = [platform] if isinstance(platform, str) else list(platform)
+            rows = await self._fetchall(*history_days_query(source, platforms))
+            days = rows[0][0] or 0
+        return pick_resolution(days)
+    
+    async def _resolution(self, source, platform, days, resolution):
+        """Resolution of a history read: as given, or picked from the range for 'auto'"""
+        if resolution == 'auto':
+            return await self._pick_resolution(source, platform, days)
+        if resolution not in HISTORY_RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        return resolution
+    
+    def _track(self, kind, counts):
+        """Remember the tables changed by a write (published by bump_data_versions)"""
+        if counts['written']:
+            self._touched.update(WRITE_TABLES[kind])
+        return counts
+    
+    async def refresh_rollups(self, since=None, sources=None):
+        """Refresh weekly/monthly rollups incrementally (see StatsDatabase.refresh_rollups)"""
+        since = since or datetime.now(timezone.utc).date()
+        await self._refresh_rollups(since, sources or ROLLUP_SOURCES)
+    
+    async def refresh_all_rollups(self, sources=None):
+        """Rebuild rollups from the whole history (after imports/backfills)"""
+        await self._refresh_rollups(None, sources or ROLLUP_SOURCES)
+    
+    async def _refresh_rollups(self, since, sources):
+        async def operation(conn):
+            changed_tables = set()
+            for source in sources:
+                query = rollup_upsert_sql(source, since, self.sparse)
+                for resolution in ROLLUP_RESOLUTIONS:
+                    statement, args = numbered_query(query, {'resolution': resolution, 'since': since})
+                    if _rowcount(await conn.execute(statement, *args)):
+                        changed_tables.add(ROLLUP_SOURCES[source]['rollup'])
+            return changed_tables
+        
+        self._touched |= await self._run(operation)
+    
+    async def get_data_versions(self):
+        """Current {table: version} map"""
+        return dict(await self._fetchall("SELECT table_name, version FROM data_versions"))
+    
+    async def bump_data_versions(self, tables=None, run_id=None):
+        """
+        Publish new data (see StatsDatabase.bump_data_versions): increment the version
+        of `tables` (default: the tables written since the last bump) and NOTIFY them.
+        Returns the new {table: version} of the bumped tables.
+        """
+        tables = sorted(set(tables) if tables is not None else self._touched)
+        if not tables:
+            return {}
+        
+        async def operation(conn):
+            query, args = numbered_query(BUMP_VERSIONS_SQL, (tables,))
+            versions = dict(tuple(row) for row in await conn.fetch(query, *args))
+            await conn.execute(
+                "SELECT pg_notify($1, $2)",
+                DB_NOTIFY_CHANNEL, json.dumps({'run_id': run_id, 'versions': versions})
+            )
+            return versions
+        
+        versions = await self._run(operation)
+        self._touched.difference_update(tables)
+        return versions
+    
+    async def save_daily_stats(self, platform, total_downloads, followers, versions_count):
+        """Save daily global statistics (returns {'written', 'unchanged'} row counts)"""
+        today = datetime.now(timezone.utc).date()
+        
+        async def operation(conn):
+            status = await conn.execute("""
+                INSERT INTO daily_stats (date, platform, total_downloads, followers, versions_count)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (date, platform)
+                DO UPDATE SET
+                    total_downloads = EXCLUDED.total_downloads,
+                    followers = EXCLUDED.followers,
+                    versions_count = EXCLUDED.versions_count
+                WHERE (daily_stats.total_downloads, daily_stats.followers, daily_stats.versions_count)
+                    IS DISTINCT FROM (EXCLUDED.total_downloads, EXCLUDED.followers, EXCLUDED.versions_count)
+            """, today, platform, total_downloads, followers, versions_count)
+            written = _rowcount(status)
+            return {'written': written, 'unchanged': 1 - written}
+        return self._track('daily', await self._run(operation))
+    
+    async def _upsert_history(self, conn, source, table, rows):
+        """Write history rows (sparse intervals or one row per day); returns the rows written"""
+        source_rows = unnest_rows(UNNEST_TYPES[source])
+        if self.sparse:
+            return await self._upsert_unnest(conn, sparse_upsert_sql(source, source_rows), rows, 'value')
+        return await self._upsert_unnest(conn, UPSERT_SQL[table].format(rows=source_rows), rows, 'rows')
+    
+    async def _upsert_version_rows(self, conn, rows):
+        """Upsert version rows (history + latest snapshot), as StatsDatabase._upsert_version_rows"""
+        rows = StatsDatabase._dedupe_rows(rows, 2)
+        if not rows:
+            return {'written': 0, 'unchanged': 0}
+        written = await self._upsert_history(conn, 'version', 'version_stats', rows)
+        await self._upsert_unnest(
+            conn, UPSERT_SQL['version_latest'].format(rows=unnest_rows(UNNEST_TYPES['version'])), rows
+        )
+        return {'written': written, 'unchanged': len(rows) - written}
+    
+    async def _upsert_modpack_rows(self, conn, rows):
+        """Upsert modpack rows (history + latest snapshot + first seen), as StatsDatabase._upsert_modpack_rows"""
+        rows = StatsDatabase._dedupe_rows(rows, 3)
+        if not rows:
+            return {'written': 0, 'unchanged': 0}
+        written = await self._upsert_history(conn, 'modpack', 'modpack_stats', rows)
+        await self._upsert_unnest(
+            conn, UPSERT_SQL['modpack_latest'].format(rows=unnest_rows(UNNEST_TYPES['modpack'])), rows
+        )
+        await self._upsert_unnest(
+            conn, UPSERT_SQL['modpack_first_seen'].format(rows=unnest_rows(UNNEST_TYPES['first_seen'])),
+            [first_seen_row(row) for row in rows]
+        )
+        return {'written': written, 'unchanged': len(rows) - written}
+    
+    async def save_version_stats(self, platform, versions_data):
+        """Save version statistics for today (returns {'written', 'unchanged'} row counts)"""
+        rows = version_rows(platform, versions_data, datetime.now(timezone.utc).date())
+        return self._track('version', await self._run(lambda conn: self._upsert_version_rows(conn, rows)))
+    
+    async def save_modpack_stats(self, platform, modpacks_data):
+        """Save modpack statistics for today (returns {'written', 'unchanged'} row counts)"""
+        rows = modpack_rows(platform, modpacks_data, datetime.now(timezone.utc).date())
+        return self._track('modpack', await self._run(lambda conn: self._upsert_modpack_rows(conn, rows)))
+    
+    async def get_daily_stats_history(self, platform, days=30, resolution='day'):
+        """Get historical daily statistics (see StatsDatabase.get_daily_stats_history)"""
+        return await self._fetchall(*await self._daily_history_query(platform, days, resolution))
+    
+    async def iter_daily_stats_history(self, platform, days=30, resolution='day', chunk_size=None):
+        """Same rows as get_daily_stats_history, yielded in chunks (see _stream)"""
+        query, params = await self._daily_history_query(platform, days, resolution)
+        async for rows in self._stream(query, params, chunk_size):
+            yield rows
+    
+    async def get_daily_stats_history_frame(self, platform, days=30, resolution='day'):
+        """Same rows as get_daily_stats_history, as a DataFrame typed by HISTORY_FRAME_DTYPES['daily']"""
+        query, params = await self._daily_history_query(platform, days, resolution)
+        return await self._fetch_frame(query, params, HISTORY_FRAME_DTYPES['daily'])
+    
+    async def _daily_history_query(self, platform, days, resolution):
+        resolution = await self._resolution('daily', platform, days, resolution)
+        return daily_history_query(platform, days, resolution)
+    
+    async def get_daily_stats_history_frames(self, platforms, days=30, resolution='day'):
+        """get_daily_stats_history_frame for several platforms in one query (see StatsDatabase)"""
+        platforms = list(platforms)
+        if not platforms:
+            return {}
+        resolution = await self._resolution('daily', platforms, days, resolution)
+        query, params = daily_series_query(platforms, days, resolution)
+        return series_frames(await self._fetch_frame(query, params, SERIES_FRAME_DTYPES['daily']), platforms, 'daily')
+    
+    async def get_daily_stats_history_page(self, platform, limit=100, page_token=None):
+        """One page of the daily history, newest first (see StatsDatabase.get_daily_stats_history_page)"""
+        query, params = history_page_query('daily', platform, None, limit, page_token)
+        return keyset_page('daily', await self._fetchall(query, params), limit)
+    
+    async def get_version_stats_history(self, platform, version_name=None, days=30, resolution='day'):
+        """Get historical version statistics (resolution as in get_daily_stats_history)"""
+        return await self._fetchall(*await self._version_history_query(platform, version_name, days, resolution))
+    
+    async def iter_version_stats_history(self, platform, version_name=None, days=30, resolution='day',
+                                         chunk_size=None):
+        """Same rows as get_version_stats_history, yielded in chunks (see _stream)"""
+        query, params = await self._version_history_query(platform, version_name, days, resolution)
+        async for rows in self._stream(query, params, chunk_size):
+            yield rows
+    
+    async def get_version_stats_history_frame(self, platform, version_name=None, days=30, resolution='day'):
+        """Same rows as get_version_stats_history, as a DataFrame typed by HISTORY_FRAME_DTYPES['version']"""
+        query, params = await self._version_history_query(platform, version_name, days, resolution)
+        return await self._fetch_frame(query, params, HISTORY_FRAME_DTYPES['version'])
+    
+    async def _version_history_query(self, platform, version_name, days, resolution):
+        resolution = await self._resolution('version', platform, days, resolution)
+        return version_history_query(platform, version_name, days, resolution, self.sparse)
+    
+    async def get_version_stats_history_frames(self, platform, version_names, days=30, resolution='day'):
+        """get_version_stats_history_frame for several versions in one query (see StatsDatabase)"""
+        return await self._entity_frames('version', platform, version_names, days, resolution)
+    
+    async def get_version_stats_history_page(self, platform, version_name=None, limit=100, page_token=None):
+        """One page of the version history (see StatsDatabase.get_version_stats_history_page)"""
+        query, params = history_page_query('version', platform, version_name, limit, page_token, self.sparse)
+        return keyset_page('version', await self._fetchall(query, params), limit)
+    
+    async def _entity_frames(self, source, platform, keys, days, resolution):
+        keys = list(keys)
+        if not keys:
+            return {}
+        resolution = await self._resolution(source, platform, days, resolution)
+        query, params = entity_series_query(source, platform, keys, days, resolution, self.sparse)
+        return series_frames(await self._fetch_frame(query, params, SERIES_FRAME_DTYPES[source]), keys, source)
+    
+    async def get_download_growth(self, platform, days=7):
+        """Calculate download growth over period"""
+        return await self._fetchall(*download_growth_query(platform, days))
+    
+    async def get_top_movers(self, platform, window_days=7, limit=10, source='modpack'):
+        """Leaderboard by download growth over window_days days (see StatsDatabase.get_top_movers)"""
+        return await self._fetchall(*top_movers_query(source, platform, window_days, limit))
+    
+    async def get_all_versions_latest(self, platform):
+        """Get latest stats for all versions"""
+        return await self._fetchall(*latest_query('version', platform))
+    
+    async def get_versions_latest_page(self, platform, limit=100, page_token=None):
+        """One page of get_all_versions_latest, by version_name: (rows, next_page_token)"""
+        query, params = latest_page_query('version', platform, limit, page_token)
+        return keyset_page('version_latest', await self._fetchall(query, params), limit)
+    
+    async def get_modpacks_initial_downloads(self, platform, slugs=None):
+        """Get initial download count for modpacks (first recorded date), optionally restricted to slugs"""
+        return first_seen_map(await self._fetchall(*initial_downloads_query(
+            platform, None if slugs is None else list(slugs)
+        )))
+    
+    async def get_modpack_stats_history(self, platform, modpack_slug=None, days=30, resolution='day'):
+        """Get historical modpack statistics (resolution as in get_daily_stats_history)"""
+        return await self._fetchall(*await self._modpack_history_query(platform, modpack_slug, days, resolution))
+    
+    async def iter_modpack_stats_history(self, platform, modpack_slug=None, days=30, resolution='day',
+                                         chunk_size=None):
+        """Same rows as get_modpack_stats_history, yielded in chunks (see _stream)"""
+        query, params = await self._modpack_history_query(platform, modpack_slug, days, resolution)
+        async for rows in self._stream(query, params, chunk_size):
+            yield rows
+    
+    async def get_modpack_stats_history_frame(self, platform, modpack_slug=None, days=30, resolution='day'):
+        """Same rows as get_modpack_stats_history, as a DataFrame typed by HISTORY_FRAME_DTYPES['modpack']"""
+        query, params = await self._modpack_history_query(platform, modpack_slug, days, resolution)
+        return await self._fetch_frame(query, params, HISTORY_FRAME_DTYPES['modpack'])
+    
+    async def _modpack_history_query(self, platform, modpack_slug, days, resolution):
+        resolution = await self._resolution('modpack', platform, days, resolution)
+        return modpack_history_query(platform, modpack_slug, days, resolution, self.sparse)
+    
+    async def get_modpack_stats_history_frames(self, platform, modpack_slugs, days=30, resolution='day'):
+        """get_modpack_stats_history_frame for several modpacks in one query (see StatsDatabase)"""
+        return await self._entity_frames('modpack', platform, modpack_slugs, days, resolution)
+    
+    async def get_modpack_stats_history_page(self, platform, modpack_slug=None, limit=100, page_token=None):
+        """One page of the modpack history (see StatsDatabase.get_modpack_stats_history_page)"""
+        query, params = history_page_query('modpack', platform, modpack_slug, limit, page_token, self.sparse)
+        return keyset_page('modpack', await self._fetchall(query, params), limit)
+    
+    async def get_all_modpacks_latest(self, platform):
+        """Get latest stats for all modpacks"""
+        return await self._fetchall(*latest_query('modpack', platform))
+    
+    async def get_modpacks_latest_page(self, platform, limit=100, page_token=None):
+        """One page of get_all_modpacks_latest, by modpack_slug: (rows, next_page_token)"""
+        query, params = latest_page_query('modpack', platform, limit, page_token)
+        return keyset_page('modpack_latest', await self._fetchall(query, params), limit)
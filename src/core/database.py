@@ -1,24 +1,1901 @@
+import pandas as pd
 import psycopg2
+import psycopg2.extensions
+import psycopg2.errors
 from psycopg2 import sql
-from datetime import datetime, timezone
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
+from functools import wraps
+from datetime import date, datetime, timezone, timedelta
+import base64
+import csv
+import io
+import itertools
+import json
+import re
+import select
+import threading
+import time
 import os
 
-class StatsDatabase:
-    def __init__(self, db_url=None):
-        """Initialize database connection"""
+from src.core.query_cache import QueryCache
+from src.core.query_stats import QueryStats, result_rows, result_bytes
+from src.config import (
+    DB_BATCH_SIZE, DB_POOL_MIN_SIZE, DB_HEALTHCHECK_INTERVAL, DB_SPARSE_HISTORY,
+    DB_STREAM_ITERSIZE, DB_CACHE_VERSION_CHECK, DB_NOTIFY_CHANNEL, DB_PREPARED_STATEMENTS,
+    DB_SLOW_QUERY_MS, DB_SLOW_QUERY_EXPLAIN, DB_SLOW_QUERY_EXPLAIN_ANALYZE, DATABASE_READ_URLS, DB_REPLICA_LSN_CHECK,
+    HISTORY_DAILY_MAX_DAYS, HISTORY_WEEKLY_MAX_DAYS
+)
+
+# Erreurs signalant une connexion inutilisable (à jeter puis recréer)
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# Tables d'historique partitionnables par mois (scripts/migrate.py: PartitionHistoryTables)
+PARTITIONED_TABLES = {
+    'version_stats': 'version_name',
+    'modpack_stats': 'modpack_slug',
+}
+PARTITION_MONTHS_AHEAD = 2
+
+# Historique creux : une ligne par valeur distincte, valable du champ date à valid_to
+# inclus (NULL = le jour même) ; la vue *_dense redonne une ligne par jour observé.
+# columns suit l'ordre des tuples passés à _upsert_*_rows.
+SPARSE_SOURCES = {
+    'version': {
+        'table': 'version_stats', 'dense': 'version_stats_dense', 'key': 'version_name',
+        'columns': ['date', 'platform', 'version_name', 'version_number', 'downloads', 'date_published'],
+        'values': ['version_number', 'downloads', 'date_published'],
+    },
+    'modpack': {
+        'table': 'modpack_stats', 'dense': 'modpack_stats_dense', 'key': 'modpack_slug',
+        'columns': ['date', 'platform', 'modpack_name', 'modpack_slug', 'downloads', 'followers'],
+        'values': ['modpack_name', 'downloads', 'followers'],
+    },
+}
+
+# Agrégats d'historique : source -> table brute, table d'agrégats, clé d'entité,
+# compteur agrégé et colonnes recopiées depuis la dernière ligne de la période
+ROLLUP_RESOLUTIONS = ('week', 'month')
+HISTORY_RESOLUTIONS = ('day',) + ROLLUP_RESOLUTIONS
+ROLLUP_SOURCES = {
+    'daily': {
+        'table': 'daily_stats', 'rollup': 'daily_stats_rollup',
+        'keys': [], 'value': 'total_downloads', 'extra': ['followers', 'versions_count'],
+    },
+    'version': {
+        'table': 'version_stats', 'dense': 'version_stats_dense', 'rollup': 'version_stats_rollup',
+        'keys': ['version_name'], 'value': 'downloads', 'extra': [],
+    },
+    'modpack': {
+        'table': 'modpack_stats', 'dense': 'modpack_stats_dense', 'rollup': 'modpack_stats_rollup',
+        'keys': ['modpack_slug'], 'value': 'downloads', 'extra': ['modpack_name'],
+    },
+}
+
+
+# Colonnes typées des historiques en DataFrame (la première colonne est toujours la date)
+HISTORY_FRAME_DTYPES = {
+    'daily': {
+        'date': 'datetime64[ns]', 'total_downloads': 'int64',
+        'followers': 'Int64', 'versions_count': 'Int64',
+    },
+    'version': {'date': 'datetime64[ns]', 'version_name': 'object', 'downloads': 'int64'},
+    'modpack': {'date': 'datetime64[ns]', 'modpack_name': 'object', 'downloads': 'int64'},
+}
+
+# Getters groupés (*_history_frames) : colonne `series` (plateforme, version ou slug)
+# devant les colonnes de la série, retirée par series_frames()
+SERIES_FRAME_DTYPES = {
+    source: {'series': 'object', **dtypes} for source, dtypes in HISTORY_FRAME_DTYPES.items()
+}
+
+
+# Version du schéma créé par _create_tables (table schema_version) : à incrémenter à
+# chaque changement de DDL, en même temps que docker/postgres/init/02-create-tables.sql.
+#   1 tables d'historique    2 *_latest    3 modpack_first_seen    4 agrégats
+#   5 valid_to + vues *_dense    6 data_versions    7 index (plateforme, entité, date)
+SCHEMA_VERSION = 7
+
+# Verrou consultatif pris pendant la mise à jour du schéma (un seul process à la fois)
+SCHEMA_LOCK_ID = 0x53544154
+
+# Tables modifiées par chaque type d'écriture (voir bump_data_versions)
+WRITE_TABLES = {
+    'daily': ['daily_stats'],
+    'version': ['version_stats', 'version_latest'],
+    'modpack': ['modpack_stats', 'modpack_latest', 'modpack_first_seen'],
+}
+
+
+# Types PostgreSQL des tableaux passés à unnest(), dans l'ordre des tuples des saves
+UNNEST_TYPES = {
+    'version': ['date', 'text', 'text', 'text', 'int', 'timestamp'],
+    'modpack': ['date', 'text', 'text', 'text', 'int', 'int'],
+    'first_seen': ['date', 'text', 'text', 'int'],
+}
+
+# Upserts des saves, {rows} = source des lignes (unnest_rows : un tableau par colonne,
+# donc un texte de requête fixe, préparable). Les lignes identiques ne sont pas réécrites.
+UPSERT_SQL = {
+    'version_stats': """
+        INSERT INTO version_stats 
+        (date, platform, version_name, version_number, downloads, date_published)
+        {rows}
+        ON CONFLICT (date, platform, version_name)
+        DO UPDATE SET 
+            downloads = EXCLUDED.downloads
+        WHERE version_stats.downloads IS DISTINCT FROM EXCLUDED.downloads
+        RETURNING 1
+    """,
+    'version_latest': """
+        INSERT INTO version_latest 
+        (date, platform, version_name, version_number, downloads, date_published)
+        {rows}
+        ON CONFLICT (platform, version_name)
+        DO UPDATE SET 
+            version_number = EXCLUDED.version_number,
+            downloads = EXCLUDED.downloads,
+            date_published = EXCLUDED.date_published,
+            date = EXCLUDED.date
+        WHERE version_latest.date <= EXCLUDED.date
+          AND (version_latest.date, version_latest.version_number,
+               version_latest.downloads, version_latest.date_published)
+              IS DISTINCT FROM (EXCLUDED.date, EXCLUDED.version_number,
+                                EXCLUDED.downloads, EXCLUDED.date_published)
+    """,
+    'modpack_stats': """
+        INSERT INTO modpack_stats 
+        (date, platform, modpack_name, modpack_slug, downloads, followers)
+        {rows}
+        ON CONFLICT (date, platform, modpack_slug)
+        DO UPDATE SET 
+            downloads = EXCLUDED.downloads,
+            followers = EXCLUDED.followers
+        WHERE (modpack_stats.downloads, modpack_stats.followers)
+            IS DISTINCT FROM (EXCLUDED.downloads, EXCLUDED.followers)
+        RETURNING 1
+    """,
+    'modpack_latest': """
+        INSERT INTO modpack_latest 
+        (date, platform, modpack_name, modpack_slug, downloads, followers)
+        {rows}
+        ON CONFLICT (platform, modpack_slug)
+        DO UPDATE SET 
+            modpack_name = EXCLUDED.modpack_name,
+            downloads = EXCLUDED.downloads,
+            followers = EXCLUDED.followers,
+            date = EXCLUDED.date
+        WHERE modpack_latest.date <= EXCLUDED.date
+          AND (modpack_latest.date, modpack_latest.modpack_name,
+               modpack_latest.downloads, modpack_latest.followers)
+              IS DISTINCT FROM (EXCLUDED.date, EXCLUDED.modpack_name,
+                                EXCLUDED.downloads, EXCLUDED.followers)
+    """,
+    # Même date que la première observation : la valeur du jour peut encore évoluer
+    'modpack_first_seen': """
+        INSERT INTO modpack_first_seen 
+        (first_date, platform, modpack_slug, first_downloads)
+        {rows}
+        ON CONFLICT (platform, modpack_slug)
+        DO UPDATE SET 
+            first_date = EXCLUDED.first_date,
+            first_downloads = EXCLUDED.first_downloads
+        WHERE EXCLUDED.first_date <= modpack_first_seen.first_date
+          AND (modpack_first_seen.first_date, modpack_first_seen.first_downloads)
+              IS DISTINCT FROM (EXCLUDED.first_date, EXCLUDED.first_downloads)
+    """,
+}
+
+# Publication des versions de données (voir bump_data_versions)
+BUMP_VERSIONS_SQL = """
+    INSERT INTO data_versions (table_name, version)
+    SELECT table_name, 1 FROM unnest(%s::text[]) AS t (table_name)
+    ON CONFLICT (table_name) DO UPDATE SET
+        version = data_versions.version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING table_name, version
+"""
+
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+# Instructions acceptées par PREPARE (les autres, EXPLAIN, SHOW..., sont exécutées telles quelles)
+_PREPARABLE = re.compile(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE|VALUES)\b", re.IGNORECASE)
+
+# Liste IN (%s, %s...) : son texte change avec sa longueur, elle n'est jamais préparée
+# (passer un tableau, « = ANY(%s) », garde un seul texte)
+_IN_LIST = re.compile(r"\bIN\s*\(\s*%(\(\w+\))?s\s*,", re.IGNORECASE)
+
+# Requêtes préparées par connexion au plus : au-delà, un texte nouveau est exécuté tel quel
+MAX_PREPARED_STATEMENTS = 200
+
+# Lectures pures : EXPLAIN ANALYZE peut les rejouer (DB_SLOW_QUERY_EXPLAIN_ANALYZE)
+_READ_ONLY = re.compile(r"\s*(SELECT|WITH)\b(?!.*\b(INSERT|UPDATE|DELETE)\b)", re.IGNORECASE | re.DOTALL)
+
+
+def numbered_query(query, params=None):
+    """
+    Rewrite a psycopg2 query (%s or %(name)s placeholders) with $1, $2... placeholders
+    (PREPARE, asyncpg). Returns (query, args); a named parameter used several times
+    maps to a single $n.
+    """
+    args = []
+    names = {}
+    
+    def replace(match):
+        token = match.group(0)
+        if token == '%%':
+            return '%'
+        if match.group(1) is None:
+            args.append(params[len(args)])
+            return f"${len(args)}"
+        name = match.group(1)
+        if name not in names:
+            args.append(params[name])
+            names[name] = len(args)
+        return f"${names[name]}"
+    
+    return _PLACEHOLDER.sub(replace, query), args
+
+
+def unnest_rows(types):
+    """Row source of UPSERT_SQL / sparse_upsert_sql: one array parameter per column"""
+    return f"SELECT * FROM unnest({', '.join(f'%s::{kind}[]' for kind in types)})"
+
+
+def row_columns(rows):
+    """Transpose rows into one list per column (the unnest_rows parameters)"""
+    return tuple(list(column) for column in zip(*rows))
+
+
+def first_seen_row(row):
+    """(first_date, platform, slug, first_downloads) of a modpack row"""
+    return (row[0], row[1], row[3], row[4])
+
+
+def sparse_upsert_sql(source, rows):
+    """
+    Change-only history upsert of SPARSE_SOURCES[source] (see StatsDatabase.sparse):
+    returns the statement, whose single output value is the number of rows written.
+    rows: source of the incoming rows, as in UPSERT_SQL.
+    """
+    spec = SPARSE_SOURCES[source]
+    table, key = spec['table'], spec['key']
+    columns = ', '.join(spec['columns'])
+    differs = ' OR '.join(f"s.{column} IS DISTINCT FROM i.{column}" for column in spec['values'])
+    changed = ' OR '.join(
+        f"{table}.{column} IS DISTINCT FROM EXCLUDED.{column}" for column in spec['values']
+    )
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in spec['values'])
+    return f"""
+        WITH incoming ({columns}) AS ({rows}),
+        closed AS (
+            -- Nouvelle exécution du jour avec une autre valeur : l'intervalle prolongé
+            -- aujourd'hui s'arrête de nouveau la veille
+            UPDATE {table} s SET valid_to = i.date - 1
+            FROM incoming i
+            WHERE s.platform = i.platform AND s.{key} = i.{key}
+              AND s.date < i.date AND s.valid_to >= i.date
+              AND ({differs})
+        ),
+        unchanged AS (
+            SELECT s.id, s.date AS start_date, i.platform, i.{key}, i.date
+            FROM {table} s
+            JOIN incoming i ON s.platform = i.platform AND s.{key} = i.{key}
+            WHERE s.date < i.date AND COALESCE(s.valid_to, s.date) >= i.date - 1
+              AND NOT ({differs})
+              AND NOT EXISTS (
+                  SELECT 1 FROM {table} t
+                  WHERE t.platform = i.platform AND t.{key} = i.{key} AND t.date = i.date
+              )
+        ),
+        -- Déjà prolongé jusqu'à ce jour (nouvelle exécution) : aucune écriture
+        extended AS (
+            UPDATE {table} s SET valid_to = u.date
+            FROM unchanged u
+            WHERE s.id = u.id AND s.date = u.start_date AND s.valid_to IS DISTINCT FROM u.date
+            RETURNING 1
+        ),
+        inserted AS (
+            INSERT INTO {table} ({columns})
+            SELECT {columns} FROM incoming i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM unchanged u WHERE u.platform = i.platform AND u.{key} = i.{key}
+            )
+            ON CONFLICT (date, platform, {key})
+            DO UPDATE SET {updates}
+            WHERE {changed}
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM extended) + (SELECT COUNT(*) FROM inserted)
+    """
+
+
+def expanded_rows_sql(source, lower=None):
+    """
+    Subquery of the day rows of a sparse SPARSE_SOURCES[source] history (intervals expanded)
+    
+    With lower (an SQL date expression), stored rows are filtered before expansion: only
+    intervals still valid on/after lower are read, from their first day >= lower.
+    """
+    spec = SPARSE_SOURCES[source]
+    columns = ', '.join(f"s.{column}" for column in spec['columns'][1:])
+    first, where = "0", ""
+    if lower:
+        first = f"GREATEST({lower} - s.date, 0)"
+        where = f"WHERE COALESCE(s.valid_to, s.date) >= {lower}"
+    return f"""(
+            SELECT s.date + n AS date, {columns}
+            FROM {spec['table']} s
+            CROSS JOIN LATERAL generate_series({first}, COALESCE(s.valid_to, s.date) - s.date) n
+            {where}
+        ) expanded"""
+
+
+def latest_days_sql(source, cursor=False):
+    """
+    Lateral subquery h (date, label, downloads, key): the last %(fetch)s days (all when NULL)
+    of entity l.<key> on %(platform)s in a sparse history, intervals expanded
+    
+    Only the latest %(fetch)s stored rows of the entity are read, through its
+    (platform, entity, date DESC) index. cursor: days before the row (%(date)s, %(key)s)
+    of a page token only.
+    """
+    spec = SPARSE_SOURCES[source]
+    key = spec['key']
+    label = 'version_name' if source == 'version' else 'modpack_name'
+    # Dernier jour lisible de chaque entité : le jour du curseur seulement avant sa clé
+    if cursor:
+        last_day = f"%(date)s::date - (l.{key} >= %(key)s)::int"
+        bounds = f"AND s.date <= {last_day}"
+        last_day = f"LEAST(COALESCE(s.valid_to, s.date), {last_day})"
+    else:
+        bounds = ""
+        last_day = "COALESCE(s.valid_to, s.date)"
+    return f"""
+        CROSS JOIN LATERAL (
+            SELECT r.date + n AS date, r.label, r.downloads, r.key
+            FROM (
+                SELECT s.date, {last_day} AS last_day,
+                       s.{label} AS label, s.downloads, s.{key} AS key
+                FROM {spec['table']} s
+                WHERE s.platform = %(platform)s AND s.{key} = l.{key} {bounds}
+                ORDER BY s.date DESC
+                LIMIT %(fetch)s
+            ) r
+            CROSS JOIN LATERAL generate_series(
+                r.last_day - r.date, GREATEST(r.last_day - r.date - %(fetch)s::int + 1, 0), -1
+            ) n
+            ORDER BY 1 DESC
+            LIMIT %(fetch)s
+        ) h"""
+
+
+def sparse_history_query(source, platform, key_value, days):
+    """(query, params) of the day-resolution version/modpack history getters on a sparse history"""
+    key = SPARSE_SOURCES[source]['key']
+    params = {'platform': platform, 'fetch': days}
+    entity = ""
+    if key_value:
+        params['entity'] = key_value
+        entity = f"AND l.{key} = %(entity)s"
+    return (f"""
+        SELECT h.date, h.label, h.downloads
+        FROM {source}_latest l
+        {latest_days_sql(source)}
+        WHERE l.platform = %(platform)s {entity}
+        ORDER BY h.date DESC, h.key DESC
+        LIMIT %(fetch)s
+    """, params)
+
+
+def rollup_upsert_sql(source, since=None, sparse=False):
+    """
+    Upsert of the ROLLUP_SOURCES[source] rollup for one resolution, from the period
+    containing `since` (whole history when None); parameters: %(resolution)s, %(since)s.
+    Only periods whose values changed are rewritten.
+    
+    sparse: the history table holds intervals (see StatsDatabase.sparse); otherwise it is
+    read directly, so the `since` bound reaches its index and prunes its partitions.
+    """
+    spec = ROLLUP_SOURCES[source]
+    group = ', '.join(['platform'] + spec['keys'])
+    value = spec['value']
+    
+    def last(column):
+        return f"(array_agg({column} ORDER BY date DESC))[1]"
+    
+    columns = ['resolution', 'platform'] + spec['keys'] + [
+        'period_start', 'last_date', value
+    ] + spec['extra'] + ['min_value', 'max_value', 'delta']
+    selects = ['%(resolution)s::text', 'platform'] + spec['keys'] + [
+        'date_trunc(%(resolution)s, date)::date', 'MAX(date)', last(value)
+    ] + [last(column) for column in spec['extra']] + [
+        f"MIN({value})", f"MAX({value})",
+        f"{last(value)} - (array_agg({value} ORDER BY date))[1]"
+    ]
+    refreshed = columns[len(spec['keys']) + 3:]
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in refreshed)
+    changed = (
+        f"({', '.join(spec['rollup'] + '.' + column for column in refreshed)}) IS DISTINCT FROM "
+        f"({', '.join('EXCLUDED.' + column for column in refreshed)})"
+    )
+    lower = "date_trunc(%(resolution)s, %(since)s::date)::date" if since else None
+    rows = spec['table']
+    if sparse and source in SPARSE_SOURCES:
+        rows = expanded_rows_sql(source, lower)
+    conditions = [f"{key} IS NOT NULL" for key in spec['keys']]
+    if since:
+        conditions.append(f"date >= {lower}")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+        INSERT INTO {spec['rollup']} ({', '.join(columns)})
+        SELECT {', '.join(selects)}
+        FROM {rows}
+        {where}
+        GROUP BY {group}, date_trunc(%(resolution)s, date)
+        ON CONFLICT (resolution, {group}, period_start)
+        DO UPDATE SET {updates}
+        WHERE {changed}
+    """
+
+
+def parse_lsn(text):
+    """Position 'X/Y' du WAL (pg_lsn) -> entier comparable"""
+    high, low = text.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def open_database(db_url=None, **kwargs):
+    """
+    StatsDatabase for db_url, or its SQLite counterpart for sqlite:// URLs
+    (file or in-memory database, same getters and savers, no server needed)
+    """
+    db_url = db_url or os.environ.get('DATABASE_URL', 'postgresql://localhost/createnuclear_stats')
+    if db_url.startswith('sqlite:'):
+        from src.core.sqlite_database import SQLiteStatsDatabase
+        return SQLiteStatsDatabase(db_url, **kwargs)
+    return StatsDatabase(db_url, **kwargs)
+
+
+def _freeze(value):
+    """Hashable form of a getter argument (lists/sets of slugs...)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def _instrumented(method):
+    """
+    Record each call in self.query_stats under the method name (latency, rows, bytes);
+    statements run meanwhile are attributed to it in the slow-query log.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        outer = getattr(self._operation, 'name', None)
+        if outer is None:
+            self._operation.name = method.__name__
+        started = time.perf_counter()
+        value = None
+        failed = True
+        try:
+            value = method(self, *args, **kwargs)
+            failed = False
+            return value
+        finally:
+            self._operation.name = outer
+            self.query_stats.record(
+                method.__name__, (time.perf_counter() - started) * 1000,
+                result_rows(value), result_bytes(value), failed
+            )
+    return wrapper
+
+
+def _cached(*tables):
+    """
+    Serve a getter from self.cache, keyed by its arguments and the data versions of
+    the tables it reads: entries stay valid until one of those tables changes.
+    Calls are instrumented (see _instrumented), cache hits included.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return method(self, *args, **kwargs)
+            versions = self.get_data_versions()
+            key = (
+                method.__name__, _freeze(args), _freeze(kwargs),
+                tuple(versions.get(table, 0) for table in tables)
+            )
+            found, value = self.cache.get(key)
+            if not found:
+                value = method(self, *args, **kwargs)
+                self.cache.put(key, value, tables)
+            # Callers add columns to the frames they get: never hand out the cached one
+            if isinstance(value, pd.DataFrame):
+                return value.copy()
+            if isinstance(value, dict):
+                return {key: item.copy() if isinstance(item, pd.DataFrame) else item
+                        for key, item in value.items()}
+            return value
+        return _instrumented(wrapper)
+    return decorator
+
+
+def empty_frame(dtypes):
+    """DataFrame without rows, typed by dtypes"""
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+
+
+def frame_from_csv(buffer, dtypes):
+    """DataFrame typed by dtypes from a COPY ... TO STDOUT (FORMAT csv) export"""
+    if not buffer.getbuffer().nbytes:
+        return empty_frame(dtypes)
+    
+    buffer.seek(0)
+    return pd.read_csv(
+        buffer, header=None, names=list(dtypes),
+        dtype={column: dtype for column, dtype in dtypes.items() if column != 'date'},
+        parse_dates=['date'], keep_default_na=False, na_values=['']
+    )
+
+
+def pick_resolution(days):
+    """day/week/month for a range of `days` so a chart gets a few hundred points at most"""
+    if days <= HISTORY_DAILY_MAX_DAYS:
+        return 'day'
+    if days <= HISTORY_WEEKLY_MAX_DAYS:
+        return 'week'
+    return 'month'
+
+
+def daily_history_query(platform, days, resolution):
+    """(query, params) of the daily history getters at a resolved resolution"""
+    if resolution != 'day':
+        return ("""
+            SELECT last_date, total_downloads, followers, versions_count
+            FROM daily_stats_rollup
+            WHERE resolution = %s AND platform = %s
+              AND (%s::int IS NULL OR last_date > CURRENT_DATE - %s::int)
+            ORDER BY period_start DESC
+        """, (resolution, platform, days, days))
+    
+    return ("""
+        SELECT date, total_downloads, followers, versions_count
+        FROM daily_stats
+        WHERE platform = %s
+        ORDER BY date DESC
+        LIMIT %s
+    """, (platform, days))
+
+
+def version_history_query(platform, version_name, days, resolution, sparse=False):
+    """
+    (query, params) of the version history getters at a resolved resolution
+    
+    At day resolution, days is a row count (the last `days` rows, LIMIT days), as for the
+    daily history; weekly/monthly rows are those of periods ending in the last `days` days.
+    sparse: as in rollup_upsert_sql.
+    """
+    if resolution != 'day':
+        return ("""
+            SELECT last_date, version_name, downloads
+            FROM version_stats_rollup
+            WHERE resolution = %s AND platform = %s
+              AND (%s::text IS NULL OR version_name = %s)
+              AND (%s::int IS NULL OR last_date > CURRENT_DATE - %s::int)
+            ORDER BY period_start DESC
+        """, (resolution, platform, version_name, version_name, days, days))
+    
+    if sparse:
+        return sparse_history_query('version', platform, version_name, days)
+    if version_name:
+        return ("""
+            SELECT date, version_name, downloads
+            FROM version_stats
+            WHERE platform = %s AND version_name = %s
+            ORDER BY date DESC
+            LIMIT %s
+        """, (platform, version_name, days))
+    else:
+        return ("""
+            SELECT date, version_name, downloads
+            FROM version_stats
+            WHERE platform = %s
+            ORDER BY date DESC
+            LIMIT %s
+        """, (platform, days))
+
+
+def modpack_history_query(platform, modpack_slug, days, resolution, sparse=False):
+    """(query, params) of the modpack history getters at a resolved resolution (as version_history_query)"""
+    if resolution != 'day':
+        return ("""
+            SELECT last_date, modpack_name, downloads
+            FROM modpack_stats_rollup
+            WHERE resolution = %s AND platform = %s
+              AND (%s::text IS NULL OR modpack_slug = %s)
+              AND (%s::int IS NULL OR last_date > CURRENT_DATE - %s::int)
+            ORDER BY period_start DESC
+        """, (resolution, platform, modpack_slug, modpack_slug, days, days))
+    
+    if sparse:
+        return sparse_history_query('modpack', platform, modpack_slug, days)
+    if modpack_slug:
+        return ("""
+            SELECT date, modpack_name, downloads
+            FROM modpack_stats
+            WHERE platform = %s AND modpack_slug = %s
+            ORDER BY date DESC
+            LIMIT %s
+        """, (platform, modpack_slug, days))
+    else:
+        return ("""
+            SELECT date, modpack_name, downloads
+            FROM modpack_stats
+            WHERE platform = %s
+            ORDER BY date DESC
+            LIMIT %s
+        """, (platform, days))
+
+
+def daily_series_query(platforms, days, resolution):
+    """(query, params) of get_daily_stats_history_frames: one series per platform"""
+    if resolution != 'day':
+        return ("""
+            SELECT platform, last_date, total_downloads, followers, versions_count
+            FROM daily_stats_rollup
+            WHERE resolution = %s AND platform = ANY(%s)
+              AND (%s::int IS NULL OR last_date > CURRENT_DATE - %s::int)
+            ORDER BY platform, period_start DESC
+        """, (resolution, list(platforms), days, days))
+    
+    # LIMIT days par plateforme
+    return ("""
+        SELECT platform, date, total_downloads, followers, versions_count
+        FROM (
+            SELECT platform, date, total_downloads, followers, versions_count,
+                   ROW_NUMBER() OVER (PARTITION BY platform ORDER BY date DESC) AS row_rank
+            FROM daily_stats
+            WHERE platform = ANY(%s)
+        ) ranked
+        WHERE %s::int IS NULL OR row_rank <= %s
+        ORDER BY platform, date DESC
+    """, (list(platforms), days, days))
+
+
+def entity_series_query(source, platform, keys, days, resolution, sparse=False):
+    """(query, params) of get_version/modpack_stats_history_frames: one series per key (sparse as in rollup_upsert_sql)"""
+    spec = ROLLUP_SOURCES[source]
+    key = spec['keys'][0]
+    label = 'version_name' if source == 'version' else 'modpack_name'
+    if resolution != 'day':
+        return (f"""
+            SELECT {key}, last_date, {label}, downloads
+            FROM {spec['rollup']}
+            WHERE resolution = %s AND platform = %s AND {key} = ANY(%s)
+              AND (%s::int IS NULL OR last_date > CURRENT_DATE - %s::int)
+            ORDER BY {key}, period_start DESC
+        """, (resolution, platform, list(keys), days, days))
+    
+    if sparse:
+        return (f"""
+            SELECT l.{key}, h.date, h.label, h.downloads
+            FROM unnest(%(keys)s::text[]) AS l({key})
+            {latest_days_sql(source)}
+            ORDER BY l.{key}, h.date DESC
+        """, {'platform': platform, 'keys': list(keys), 'fetch': days})
+    
+    # LIMIT days par entité, comme les getters à une série
+    return (f"""
+        SELECT {key}, date, {label}, downloads
+        FROM (
+            SELECT *,
+                   ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY date DESC) AS row_rank
+            FROM {spec['table']}
+            WHERE platform = %s AND {key} = ANY(%s)
+        ) ranked
+        WHERE %s::int IS NULL OR row_rank <= %s
+        ORDER BY {key}, date DESC
+    """, (platform, list(keys), days, days))
+
+
+def top_movers_query(source, platform, window_days, limit):
+    """
+    (query, params) of get_top_movers: growth of every entity over the last window_days days
+    
+    The baseline is the value at the window start, i.e. the last history row dated on or
+    before it (a sparse row stays valid until the next one), or the first observation for
+    entities that appeared inside the window. Each baseline is one probe of the
+    (platform, entity, date DESC) index, whatever the length of the history.
+    """
+    spec = SPARSE_SOURCES[source]
+    key = spec['key']
+    label = 'version_number' if source == 'version' else 'modpack_name'
+    return (f"""
+        SELECT key, label, start_downloads, downloads,
+               downloads - start_downloads AS growth,
+               (downloads - start_downloads)::float8 * 100 / NULLIF(start_downloads, 0) AS growth_pct
+        FROM (
+            SELECT l.{key} AS key, l.{label} AS label, l.downloads,
+                   COALESCE(
+                       (SELECT s.downloads FROM {spec['table']} s
+                        WHERE s.platform = l.platform AND s.{key} = l.{key}
+                          AND s.date <= CURRENT_DATE - %(window)s::int
+                        ORDER BY s.date DESC LIMIT 1),
+                       (SELECT s.downloads FROM {spec['table']} s
+                        WHERE s.platform = l.platform AND s.{key} = l.{key}
+                        ORDER BY s.date LIMIT 1)
+                   ) AS start_downloads
+            FROM {source}_latest l
+            WHERE l.platform = %(platform)s AND l.date > CURRENT_DATE - %(window)s::int
+            OFFSET 0  -- pas de remontée : une sonde par entité, pas une par référence
+        ) movers
+        ORDER BY growth DESC NULLS LAST, key
+        LIMIT %(limit)s
+    """, {'platform': platform, 'window': window_days, 'limit': limit})
+
+
+def download_growth_query(platform, days):
+    """(query, params) of get_download_growth"""
+    return ("""
+        WITH stats AS (
+            SELECT date, total_downloads,
+                   LAG(total_downloads) OVER (ORDER BY date) as prev_downloads
+            FROM daily_stats
+            WHERE platform = %s
+            ORDER BY date DESC
+            LIMIT %s
+        )
+        SELECT
+            date,
+            total_downloads,
+            total_downloads - COALESCE(prev_downloads, 0) as daily_growth
+        FROM stats
+        ORDER BY date DESC
+    """, (platform, days))
+
+
+def latest_query(source, platform):
+    """(query, params) of get_all_versions_latest / get_all_modpacks_latest"""
+    return (f"""
+        SELECT {LATEST_COLUMNS[source]}
+        FROM {source}_latest
+        WHERE platform = %s
+        ORDER BY {SPARSE_SOURCES[source]['key']}
+    """, (platform,))
+
+
+def initial_downloads_query(platform, slugs):
+    """(query, params) of get_modpacks_initial_downloads (slugs: list, or None for every modpack)"""
+    if slugs is None:
+        return ("""
+            SELECT modpack_slug, first_downloads, first_date
+            FROM modpack_first_seen
+            WHERE platform = %s
+        """, (platform,))
+    return ("""
+        SELECT modpack_slug, first_downloads, first_date
+        FROM modpack_first_seen
+        WHERE platform = %s AND modpack_slug = ANY(%s::text[])
+    """, (platform, slugs))
+
+
+def first_seen_map(rows):
+    """{slug: {'downloads', 'date'}} of get_modpacks_initial_downloads from its query rows"""
+    return {row[0]: {'downloads': row[1], 'date': row[2]} for row in rows}
+
+
+def history_days_query(source, platforms):
+    """(query, params) of the number of days covered by the history of platforms (see pick_resolution)"""
+    return (
+        f"SELECT CURRENT_DATE - MIN(date) FROM {ROLLUP_SOURCES[source]['table']} WHERE platform = ANY(%s::text[])",
+        (platforms,)
+    )
+
+
+def version_rows(platform, versions_data, day):
+    """History rows of save_version_stats: (date, platform, name, number, downloads, date_published)"""
+    rows = []
+    for version in versions_data:
+        date_published = None
+        if version.get('date_published'):
+            try:
+                # Colonne TIMESTAMP : le fuseau est ignoré
+                date_published = datetime.fromisoformat(
+                    version['date_published'].replace('Z', '+00:00')
+                ).replace(tzinfo=None)
+            except ValueError:
+                pass
+        
+        rows.append((
+            day,
+            platform,
+            version['name'],
+            version.get('version_number', ''),
+            version['downloads'],
+            date_published
+        ))
+    return rows
+
+
+def modpack_rows(platform, modpacks_data, day):
+    """History rows of save_modpack_stats: (date, platform, name, slug, downloads, followers)"""
+    return [(
+        day,
+        platform,
+        modpack['title'] if 'title' in modpack else modpack.get('name', ''),
+        modpack['slug'],
+        modpack['downloads'],
+        modpack.get('follows', modpack.get('followers', 0))
+    ) for modpack in modpacks_data]
+
+
+# Colonnes des getters get_all_*_latest (et de leurs pages)
+LATEST_COLUMNS = {
+    'version': 'version_name, version_number, downloads, date_published',
+    'modpack': 'modpack_name, modpack_slug, downloads',
+}
+
+# Pages à curseur (keyset) : types des colonnes de la clé de tri, sélectionnées en fin de
+# ligne par les requêtes de page et retirées des lignes renvoyées (voir keyset_page)
+PAGE_CURSORS = {
+    'daily': (date,),
+    'version': (date, str),
+    'modpack': (date, str),
+    'version_latest': (str,),
+    'modpack_latest': (str,),
+}
+
+
+def encode_page_token(kind, cursor):
+    """Opaque continuation token: the kind of page and the sort key of its last row"""
+    values = [value.isoformat() if isinstance(value, date) else value for value in cursor]
+    payload = json.dumps([kind, *values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_page_token(kind, token):
+    """Sort key of a token from encode_page_token, typed by PAGE_CURSORS (ValueError if invalid)"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        token_kind, *values = payload
+        types = PAGE_CURSORS[kind]
+        if token_kind != kind or len(values) != len(types):
+            raise ValueError
+        return [date.fromisoformat(value) if kind_type is date else kind_type(value)
+                for kind_type, value in zip(types, values)]
+    except (TypeError, ValueError, KeyError, AttributeError):
+        raise ValueError(f"Invalid page token for {kind} pages") from None
+
+
+def keyset_page(kind, rows, limit):
+    """
+    (rows, next_token) of a page fetched with limit + 1 rows: the extra row only tells
+    whether another page follows (next_token is None on the last page)
+    """
+    width = len(PAGE_CURSORS[kind])
+    next_token = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_token = encode_page_token(kind, rows[-1][-width:])
+    return [tuple(row[:-width]) for row in rows], next_token
+
+
+def history_page_query(source, platform, key_value, limit, page_token, sparse=False):
+    """
+    (query, params) of the keyset history pages: day rows by descending (date, key),
+    limit + 1 of them, starting after the row encoded in page_token
+    
+    Dense history: one backward range scan of the (date, platform, key) unique index from
+    the cursor, limit + 1 index entries whatever the page depth (the (platform, entity,
+    date DESC) index for a single entity). Sparse history (see rollup_upsert_sql): each
+    entity's index is walked from the cursor and at most limit + 1 days of its intervals
+    are expanded, so a page reads up to entities x (limit + 1) rows, deep or not.
+    """
+    params = {'platform': platform, 'fetch': limit + 1}
+    if page_token is not None:
+        params['date'], *key = decode_page_token(source, page_token)
+        if key:
+            params['key'] = key[0]
+    if source == 'daily':
+        after = "AND date < %(date)s" if page_token is not None else ""
+        return (f"""
+            SELECT date, total_downloads, followers, versions_count, date
+            FROM daily_stats
+            WHERE platform = %(platform)s {after}
+            ORDER BY date DESC
+            LIMIT %(fetch)s
+        """, params)
+    
+    spec = SPARSE_SOURCES[source]
+    key = spec['key']
+    if key_value:
+        params['entity'] = key_value
+    if not sparse:
+        label = 'version_name' if source == 'version' else 'modpack_name'
+        conditions = ["platform = %(platform)s"]
+        if key_value:
+            conditions.append(f"{key} = %(entity)s")
+        if key_value and page_token is not None:
+            # (date, entité) < curseur pour une seule entité : borne sur date seule (index de l'entité)
+            conditions.append("date < %(date)s::date + (%(entity)s < %(key)s)::int")
+        elif page_token is not None:
+            conditions.append(f"(date, platform, {key}) < (%(date)s, %(platform)s, %(key)s)")
+        order = "date DESC" if key_value else f"date DESC, platform DESC, {key} DESC"
+        return (f"""
+            SELECT date, {label}, downloads, date, {key}
+            FROM {spec['table']}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order}
+            LIMIT %(fetch)s
+        """, params)
+    
+    entity = f"AND l.{key} = %(entity)s" if key_value else ""
+    return (f"""
+        SELECT h.date, h.label, h.downloads, h.date, h.key
+        FROM {source}_latest l
+        {latest_days_sql(source, cursor=page_token is not None)}
+        WHERE l.platform = %(platform)s {entity}
+        ORDER BY h.date DESC, h.key DESC
+        LIMIT %(fetch)s
+    """, params)
+
+
+def latest_page_query(source, platform, limit, page_token):
+    """(query, params) of the keyset catalog pages: *_latest rows by key, limit + 1 of them"""
+    kind = f"{source}_latest"
+    params = {'platform': platform, 'fetch': limit + 1}
+    key = SPARSE_SOURCES[source]['key']
+    after = ""
+    if page_token is not None:
+        params['key'], = decode_page_token(kind, page_token)
+        after = f"AND {key} > %(key)s"
+    return (f"""
+        SELECT {LATEST_COLUMNS[source]}, {key}
+        FROM {kind}
+        WHERE platform = %(platform)s {after}
+        ORDER BY {key}
+        LIMIT %(fetch)s
+    """, params)
+
+
+def series_frames(frame, keys, source):
+    """Split a SERIES_FRAME_DTYPES[source] frame into {key: frame}, as returned by the single-series getters"""
+    columns = list(HISTORY_FRAME_DTYPES[source])
+    groups = {key: group[columns].reset_index(drop=True) for key, group in frame.groupby('series', sort=False)}
+    return {key: groups[key] if key in groups else empty_frame(HISTORY_FRAME_DTYPES[source]) for key in keys}
+
+
+class _StatsConnection(psycopg2.extensions.connection):
+    """Connexion psycopg2 annotée de sa dernière utilisation (health checks)"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_used = time.monotonic()
+        # Texte de requête -> (nom du statement préparé sur cette connexion, types des paramètres)
+        self.prepared = {}
+        # _Replica d'origine (None = primaire)
+        self.replica = None
+
+
+class _Replica:
+    """Pool d'un réplica en lecture seule et dernière position de rejeu lue"""
+    
+    def __init__(self, url, size):
+        self.url = url
+        # minconn 0 : un réplica injoignable ne bloque pas le démarrage
+        self.pool = ThreadedConnectionPool(
+            0, size, url, connection_factory=_StatsConnection, client_encoding='UTF8'
+        )
+        self.slots = threading.BoundedSemaphore(size)
+        # LSN rejoué (None = inconnu ou réplica injoignable) et instant de la dernière lecture
+        self.replay_lsn = None
+        self.checked = None
+    
+    def mark_down(self):
+        """Skip this replica until its position is re-read (DB_REPLICA_LSN_CHECK)"""
+        self.replay_lsn = None
+        self.checked = time.monotonic()
+
+
+class _CopyStream:
+    """File-like object feeding COPY FROM STDIN from an iterator of rows (CSV-encoded on the fly)"""
+    
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._line = io.StringIO()
+        self._writer = csv.writer(self._line, lineterminator='\n')
+        self._pending = ''
+    
+    def read(self, size=-1):
+        chunks = [self._pending]
+        length = len(self._pending)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._line.seek(0)
+            self._line.truncate()
+            self._writer.writerow(row)
+            chunk = self._line.getvalue()
+            chunks.append(chunk)
+            length += len(chunk)
+        data = ''.join(chunks)
+        if size < 0:
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+    
+    readline = read
+
+
+class BaseStatsDatabase:
+    """
+    Backend-independent part of StatsDatabase and SQLiteStatsDatabase
+    
+    Holds the result cache and data versions, the tracking of written tables, the rows
+    built by the savers and every getter. A backend provides the connection handling
+    (_run, _fetchall, _stream, _fetch_frame, transaction(), _after_commit(),
+    read_from_primary()) and its SQL dialect: the _*_sql query builders, the upserts,
+    save_daily_stats, _refresh_rollups, _bump_versions and the backfills.
+    """
+    
+    def __init__(self, batch_size=None, sparse=False, cache_bytes=None, slow_query_ms=None):
+        self.batch_size = batch_size or DB_BATCH_SIZE
+        self.sparse = sparse
+        self.stream_itersize = DB_STREAM_ITERSIZE
+        self.cache = QueryCache(cache_bytes) if cache_bytes else None
+        slow_query_ms = DB_SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms
+        self.query_stats = QueryStats(slow_query_ms or None)
+        self._operation = threading.local()
+        self._versions = {}
+        self._versions_checked = None
+        self._touched = set()
+        # Positionné tant qu'un listener tient self._versions à jour (plus de polling)
+        self._listening = threading.Event()
+        self.last_notification = None
+    
+    def health_check(self):
+        """Return True if the database answers a trivial query"""
+        try:
+            with self.read_from_primary():
+                return self._fetchall("SELECT 1") == [(1,)]
+        except Exception:
+            return False
+    
+    def backfill_latest_tables(self):
+        """Public entry point for migrations/repairs of the latest-snapshot tables"""
+        self._run(self._backfill_latest_tables)
+    
+    def backfill_first_seen(self):
+        """Public entry point for migrations/repairs of modpack_first_seen"""
+        self._run(self._backfill_first_seen)
+    
+    @_instrumented
+    def refresh_rollups(self, since=None, sources=None):
+        """
+        Refresh weekly/monthly rollups incrementally
+        
+        since: date of the oldest new data (default: today, i.e. the current week/month).
+        """
+        since = since or datetime.now(timezone.utc).date()
+        self._touched |= self._run(lambda cur: self._refresh_rollups(cur, since, sources or ROLLUP_SOURCES))
+    
+    def refresh_all_rollups(self, sources=None):
+        """Rebuild rollups from the whole history (after imports/backfills)"""
+        self._touched |= self._run(lambda cur: self._refresh_rollups(cur, None, sources or ROLLUP_SOURCES))
+    
+    def get_data_versions(self):
+        """
+        Current {table: version} map
+        
+        Kept up to date by NOTIFY while start_listener() is connected; otherwise
+        re-read at most every DB_CACHE_VERSION_CHECK seconds.
+        """
+        now = time.monotonic()
+        if self._versions_checked is not None and self._listening.is_set():
+            # Les NOTIFY tiennent self._versions à jour : pas de relecture
+            return self._versions
+        if self._versions_checked is None or now - self._versions_checked >= DB_CACHE_VERSION_CHECK:
+            with self.read_from_primary():
+                versions = dict(self._fetchall("SELECT table_name, version FROM data_versions"))
+            changed = [table for table, version in versions.items() if self._versions.get(table) != version]
+            if changed:
+                self._versions_changed(changed)
+            self._versions = versions
+            self._versions_checked = now
+        return self._versions
+    
+    def _versions_changed(self, tables):
+        """New data was published in tables: entries keyed by older versions can never be hit again"""
+        if self.cache is not None:
+            self.cache.invalidate(tables)
+    
+    @_instrumented
+    def bump_data_versions(self, tables=None, run_id=None):
+        """
+        Publish new data: increment the version of `tables` (default: the tables this
+        instance wrote since the last bump), which invalidates cached reads everywhere.
+        On PostgreSQL the new versions are also sent on DB_NOTIFY_CHANNEL
+        ({"run_id", "versions"}), delivered to listeners when the transaction commits.
+        Returns the new {table: version} of the bumped tables.
+        """
+        tables = sorted(set(tables) if tables is not None else self._touched)
+        if not tables:
+            return {}
+        
+        versions = self._run(lambda cur: self._bump_versions(cur, tables, run_id))
+        self._touched.difference_update(tables)
+        # Avant le commit, une lecture concurrente remettrait en cache les anciennes versions
+        self._after_commit(lambda: self._forget_versions(tables))
+        return versions
+    
+    def _forget_versions(self, tables):
+        """Drop the cached reads of tables; the next getter re-reads the data versions"""
+        if self.cache is not None:
+            self.cache.invalidate(tables)
+        self._versions_checked = None
+    
+    def clear_cache(self):
+        """Drop every cached read of this instance (no effect on other processes)"""
+        if self.cache is not None:
+            self.cache.invalidate()
+        self._versions_checked = None
+    
+    def _pick_resolution(self, source, platform, days):
+        """
+        Choose day/week/month so a chart gets a few hundred points at most
+        
+        platform: a platform or a list of platforms (longest history wins when days is None).
+        """
+        if days is None:
+            platforms = [platform] if isinstance(platform, str) else list(platform)
+            rows = self._fetchall(*self._history_days_sql(source, platforms))
+            days = rows[0][0] or 0
+        return pick_resolution(days)
+    
+    def _resolution(self, source, platform, days, resolution):
+        """Resolution of a history read: as given, or picked from the range for 'auto'"""
+        if resolution == 'auto':
+            return self._pick_resolution(source, platform, days)
+        if resolution not in HISTORY_RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        return resolution
+    
+    def _track(self, kind, counts):
+        """Remember the tables changed by a write (published by bump_data_versions)"""
+        if counts['written']:
+            self._touched.update(WRITE_TABLES[kind])
+        return counts
+    
+    @staticmethod
+    def _dedupe_rows(rows, key_index):
+        """Keep the last row per conflict key (a multi-row upsert cannot touch a row twice)"""
+        return list({row[key_index]: row for row in rows}.values())
+    
+    @_instrumented
+    def save_version_stats(self, platform, versions_data):
+        """Save version statistics for today (returns {'written', 'unchanged'} row counts)"""
+        rows = version_rows(platform, versions_data, datetime.now(timezone.utc).date())
+        return self._track('version', self._run(lambda cur: self._upsert_version_rows(cur, rows)))
+    
+    @_instrumented
+    def save_modpack_stats(self, platform, modpacks_data):
+        """Save modpack statistics for today (returns {'written', 'unchanged'} row counts)"""
+        rows = modpack_rows(platform, modpacks_data, datetime.now(timezone.utc).date())
+        return self._track('modpack', self._run(lambda cur: self._upsert_modpack_rows(cur, rows)))
+    
+    @_cached('daily_stats', 'daily_stats_rollup')
+    def get_daily_stats_history(self, platform, days=30, resolution='day'):
+        """
+        Get historical daily statistics
+        
+        resolution: 'day' (default), 'week', 'month', or 'auto' to pick it from the requested
+        range (see pick_resolution). Weekly/monthly rows carry the last values of each
+        period, dated by its last day.
+        """
+        return self._fetchall(*self._daily_history_query(platform, days, resolution))
+    
+    def iter_daily_stats_history(self, platform, days=30, resolution='day', chunk_size=None):
+        """Same rows as get_daily_stats_history, yielded in chunks (see _stream)"""
+        query, params = self._daily_history_query(platform, days, resolution)
+        return self._stream(query, params, chunk_size)
+    
+    @_cached('daily_stats', 'daily_stats_rollup')
+    def get_daily_stats_history_frame(self, platform, days=30, resolution='day'):
+        """Same rows as get_daily_stats_history, as a DataFrame typed by HISTORY_FRAME_DTYPES['daily']"""
+        query, params = self._daily_history_query(platform, days, resolution)
+        return self._fetch_frame(query, params, HISTORY_FRAME_DTYPES['daily'])
+    
+    def _daily_history_query(self, platform, days, resolution):
+        """(query, params) of get_daily_stats_history"""
+        resolution = self._resolution('daily', platform, days, resolution)
+        return self._history_sql('daily', platform, None, days, resolution)
+    
+    @_cached('daily_stats', 'daily_stats_rollup')
+    def get_daily_stats_history_frames(self, platforms, days=30, resolution='day'):
+        """
+        get_daily_stats_history_frame for several platforms in one query: {platform: DataFrame}
+        
+        All series share one resolution (with 'auto', picked from the longest history when
+        days is None), so they can be drawn on the same chart.
+        """
+        platforms = list(platforms)
+        if not platforms:
+            return {}
+        resolution = self._resolution('daily', platforms, days, resolution)
+        query, params = self._series_sql('daily', None, platforms, days, resolution)
+        return series_frames(self._fetch_frame(query, params, SERIES_FRAME_DTYPES['daily']), platforms, 'daily')
+    
+    @_cached('daily_stats')
+    def get_daily_stats_history_page(self, platform, limit=100, page_token=None):
+        """
+        One page of the daily history, newest first: (rows, next_page_token)
+        
+        Rows are those of get_daily_stats_history at day resolution. Pass next_page_token
+        back to get the following page (None on the last one); pages are read by keyset
+        (date < last date), so every page costs the same whatever its depth.
+        """
+        query, params = self._page_sql('daily', platform, None, limit, page_token)
+        return keyset_page('daily', self._fetchall(query, params), limit)
+    
+    @_cached('version_stats', 'version_stats_rollup')
+    def get_version_stats_history(self, platform, version_name=None, days=30, resolution='day'):
+        """Get historical version statistics (resolution as in get_daily_stats_history)"""
+        return self._fetchall(*self._version_history_query(platform, version_name, days, resolution))
+    
+    def iter_version_stats_history(self, platform, version_name=None, days=30, resolution='day',
+                                   chunk_size=None):
+        """Same rows as get_version_stats_history, yielded in chunks (see _stream)"""
+        query, params = self._version_history_query(platform, version_name, days, resolution)
+        return self._stream(query, params, chunk_size)
+    
+    @_cached('version_stats', 'version_stats_rollup')
+    def get_version_stats_history_frame(self, platform, version_name=None, days=30, resolution='day'):
+        """Same rows as get_version_stats_history, as a DataFrame typed by HISTORY_FRAME_DTYPES['version']"""
+        query, params = self._version_history_query(platform, version_name, days, resolution)
+        return self._fetch_frame(query, params, HISTORY_FRAME_DTYPES['version'])
+    
+    def _version_history_query(self, platform, version_name, days, resolution):
+        """(query, params) of get_version_stats_history"""
+        resolution = self._resolution('version', platform, days, resolution)
+        return self._history_sql('version', platform, version_name, days, resolution)
+    
+    @_cached('version_stats', 'version_stats_rollup')
+    def get_version_stats_history_frames(self, platform, version_names, days=30, resolution='day'):
+        """get_version_stats_history_frame for several versions in one query: {version_name: DataFrame}"""
+        return self._entity_frames('version', platform, version_names, days, resolution)
+    
+    @_cached('version_stats', 'version_latest')
+    def get_version_stats_history_page(self, platform, version_name=None, limit=100, page_token=None):
+        """
+        One page of the version history by descending (date, version_name): (rows, next_page_token)
+        
+        Rows are those of get_version_stats_history at day resolution (see
+        get_daily_stats_history_page for tokens).
+        """
+        query, params = self._page_sql('version', platform, version_name, limit, page_token)
+        return keyset_page('version', self._fetchall(query, params), limit)
+    
+    def _entity_frames(self, source, platform, keys, days, resolution):
+        """{key: DataFrame} of the version/modpack batched getters"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        resolution = self._resolution(source, platform, days, resolution)
+        query, params = self._series_sql(source, platform, keys, days, resolution)
+        return series_frames(self._fetch_frame(query, params, SERIES_FRAME_DTYPES[source]), keys, source)
+    
+    @_cached('daily_stats')
+    def get_download_growth(self, platform, days=7):
+        """Calculate download growth over period"""
+        return self._fetchall(*self._growth_sql(platform, days))
+    
+    @_cached('version_stats', 'version_latest', 'modpack_stats', 'modpack_latest')
+    def get_top_movers(self, platform, window_days=7, limit=10, source='modpack'):
+        """
+        Leaderboard of the entities ('modpack' or 'version') that gained the most downloads
+        over the last window_days days, seen within that window
+        
+        Returns (key, name, start_downloads, downloads, growth, growth_pct) tuples, by
+        descending growth; growth_pct is None when the baseline is 0.
+        """
+        return self._fetchall(*self._top_movers_sql(source, platform, window_days, limit))
+    
+    @_cached('version_latest')
+    def get_all_versions_latest(self, platform):
+        """Get latest stats for all versions"""
+        return self._fetchall(*self._latest_sql('version', platform))
+    
+    @_cached('version_latest')
+    def get_versions_latest_page(self, platform, limit=100, page_token=None):
+        """One page of get_all_versions_latest, by version_name: (rows, next_page_token)"""
+        query, params = self._latest_page_sql('version', platform, limit, page_token)
+        return keyset_page('version_latest', self._fetchall(query, params), limit)
+    
+    @_cached('modpack_first_seen')
+    def get_modpacks_initial_downloads(self, platform, slugs=None):
+        """Get initial download count for modpacks (first recorded date), optionally restricted to slugs"""
+        return first_seen_map(self._fetchall(*self._initial_downloads_sql(
+            platform, None if slugs is None else list(slugs)
+        )))
+    
+    @_cached('modpack_stats', 'modpack_stats_rollup')
+    def get_modpack_stats_history(self, platform, modpack_slug=None, days=30, resolution='day'):
+        """Get historical modpack statistics (resolution as in get_daily_stats_history)"""
+        return self._fetchall(*self._modpack_history_query(platform, modpack_slug, days, resolution))
+    
+    def iter_modpack_stats_history(self, platform, modpack_slug=None, days=30, resolution='day',
+                                   chunk_size=None):
+        """Same rows as get_modpack_stats_history, yielded in chunks (see _stream)"""
+        query, params = self._modpack_history_query(platform, modpack_slug, days, resolution)
+        return self._stream(query, params, chunk_size)
+    
+    @_cached('modpack_stats', 'modpack_stats_rollup')
+    def get_modpack_stats_history_frame(self, platform, modpack_slug=None, days=30, resolution='day'):
+        """Same rows as get_modpack_stats_history, as a DataFrame typed by HISTORY_FRAME_DTYPES['modpack']"""
+        query, params = self._modpack_history_query(platform, modpack_slug, days, resolution)
+        return self._fetch_frame(query, params, HISTORY_FRAME_DTYPES['modpack'])
+    
+    def _modpack_history_query(self, platform, modpack_slug, days, resolution):
+        """(query, params) of get_modpack_stats_history"""
+        resolution = self._resolution('modpack', platform, days, resolution)
+        return self._history_sql('modpack', platform, modpack_slug, days, resolution)
+    
+    @_cached('modpack_stats', 'modpack_stats_rollup')
+    def get_modpack_stats_history_frames(self, platform, modpack_slugs, days=30, resolution='day'):
+        """get_modpack_stats_history_frame for several modpacks in one query: {slug: DataFrame}"""
+        return self._entity_frames('modpack', platform, modpack_slugs, days, resolution)
+    
+    @_cached('modpack_stats', 'modpack_latest')
+    def get_modpack_stats_history_page(self, platform, modpack_slug=None, limit=100, page_token=None):
+        """
+        One page of the modpack history by descending (date, modpack_slug): (rows, next_page_token)
+        
+        Rows are those of get_modpack_stats_history at day resolution (see
+        get_daily_stats_history_page for tokens).
+        """
+        query, params = self._page_sql('modpack', platform, modpack_slug, limit, page_token)
+        return keyset_page('modpack', self._fetchall(query, params), limit)
+    
+    @_cached('modpack_latest')
+    def get_all_modpacks_latest(self, platform):
+        """Get latest stats for all modpacks"""
+        return self._fetchall(*self._latest_sql('modpack', platform))
+    
+    @_cached('modpack_latest')
+    def get_modpacks_latest_page(self, platform, limit=100, page_token=None):
+        """One page of get_all_modpacks_latest, by modpack_slug: (rows, next_page_token)"""
+        query, params = self._latest_page_sql('modpack', platform, limit, page_token)
+        return keyset_page('modpack_latest', self._fetchall(query, params), limit)
+    
+    # Requêtes propres au dialecte SQL : (query, params) fournis par chaque backend
+    
+    def _history_sql(self, source, platform, key_value, days, resolution):
+        """History of a platform ('daily') or of one/all entities ('version', 'modpack'), newest first"""
+        raise NotImplementedError
+    
+    def _series_sql(self, source, platform, keys, days, resolution):
+        """History of several series at once, tagged by series (keys: platforms for 'daily')"""
+        raise NotImplementedError
+    
+    def _page_sql(self, source, platform, key_value, limit, page_token):
+        """limit + 1 history rows after page_token, with the keyset cursor columns last"""
+        raise NotImplementedError
+    
+    def _latest_page_sql(self, source, platform, limit, page_token):
+        """limit + 1 rows of a *_latest table after page_token, with the cursor column last"""
+        raise NotImplementedError
+    
+    def _latest_sql(self, source, platform):
+        """Every row of a *_latest table for a platform"""
+        raise NotImplementedError
+    
+    def _growth_sql(self, platform, days):
+        """Rows of get_download_growth"""
+        raise NotImplementedError
+    
+    def _top_movers_sql(self, source, platform, window_days, limit):
+        """Rows of get_top_movers"""
+        raise NotImplementedError
+    
+    def _initial_downloads_sql(self, platform, slugs):
+        """(slug, first_downloads, first_date) of the modpacks of a platform (slugs: list or None)"""
+        raise NotImplementedError
+    
+    def _history_days_sql(self, source, platforms):
+        """One row: days between the first history row of platforms and today"""
+        raise NotImplementedError
+
+
+class StatsDatabase(BaseStatsDatabase):
+    def __init__(self, db_url=None, batch_size=None, pool_size=None, sparse=None, cache_bytes=None,
+                 prepare=None, slow_query_ms=None, read_urls=None):
+        """
+        Initialize database connection
+        
+        pool_size: when set, queries run on a ThreadedConnectionPool of up to
+        pool_size connections (one cursor per query, safe across threads);
+        otherwise a single connection is used and exposed as self.conn/self.cursor.
+        sparse: store version/modpack history as change-only intervals
+        (default: DB_SPARSE_HISTORY). Results are identical in both modes, but only
+        sparse reads expand intervals: it must match how the history tables are written.
+        cache_bytes: enable the getter result cache (LRU, capped at cache_bytes),
+        invalidated through the data_versions table. Results are shared: do not mutate.
+        prepare: run getters and saves as server-side prepared statements, parsed and
+        planned once per connection (default: DB_PREPARED_STATEMENTS; disable behind
+        a transaction-mode pooler).
+        slow_query_ms: statements slower than this are kept in the slow-query log of
+        self.query_stats with their EXPLAIN plan (default: DB_SLOW_QUERY_MS, 0 = off).
+        read_urls: read-only replicas (default: DATABASE_READ_URLS), each with its own
+        pool of up to pool_size connections. Getters are spread over them; writes, DDL
+        and the reads of transaction() / read_from_primary() blocks use the primary.
+        Staleness guard: a replica serves a read only once it has replayed the WAL up
+        to the last write this instance knows of (its own commits, and the data versions
+        announced by other processes), otherwise the read goes to the primary.
+        """
         if db_url is None:
             db_url = os.environ.get('DATABASE_URL', 'postgresql://localhost/createnuclear_stats')
         
-        self.conn = psycopg2.connect(db_url)
+        super().__init__(batch_size, DB_SPARSE_HISTORY if sparse is None else sparse, cache_bytes, slow_query_ms)
+        self.db_url = db_url
+        self.prepare = DB_PREPARED_STATEMENTS if prepare is None else prepare
+        read_urls = DATABASE_READ_URLS if read_urls is None else read_urls
+        self.replicas = [_Replica(url, pool_size or 1) for url in read_urls]
+        self._replica_turn = itertools.count()
+        # Lectures forcées sur le primaire (read_from_primary), par thread
+        self._routing = threading.local()
+        # Position du WAL que les réplicas doivent avoir rejouée, à relire après une écriture
+        self._min_lsn = 0
+        self._lsn_outdated = False
+        self._lsn_lock = threading.Lock()
+        self._stream_ids = itertools.count()
+        self._savepoint_ids = itertools.count()
+        # Connexion de l'unité de travail (transaction()) en cours et actions à jouer
+        # après son commit (on_commit), par thread
+        self._unit = threading.local()
+        self._listener = None
+        self._stop_listening = threading.Event()
+        self.pool = None
+        self.conn = None
+        self.cursor = None
+        
+        if pool_size:
+            self.pool = ThreadedConnectionPool(
+                min(DB_POOL_MIN_SIZE, pool_size), pool_size, db_url,
+                connection_factory=_StatsConnection, client_encoding='UTF8'
+            )
+            # getconn() lève PoolError quand le pool est vide : on attend plutôt un slot
+            self._pool_slots = threading.BoundedSemaphore(pool_size)
+        else:
+            self._reconnect()
+        
+        self.ensure_schema()
+    
+    def _reconnect(self):
+        """(Re)open the single shared connection"""
+        self.conn = psycopg2.connect(self.db_url, connection_factory=_StatsConnection)
         self.conn.set_client_encoding('UTF8')
         self.cursor = self.conn.cursor()
-        self.create_tables()
+    
+    @staticmethod
+    def _is_healthy(conn):
+        """Check a connection before handing it out (ping only if idle for a while)"""
+        if conn.closed:
+            return False
+        if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - conn.last_used < DB_HEALTHCHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+    
+    def _acquire(self, replica=None):
+        """Get a healthy connection (from a replica, the pool or the shared one)"""
+        if replica is None and self.pool is None:
+            if not self._is_healthy(self.conn):
+                self._discard(self.conn)
+            return self.conn
+        
+        pool, slots = (replica.pool, replica.slots) if replica else (self.pool, self._pool_slots)
+        slots.acquire()
+        try:
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            conn.replica = replica
+            return conn
+        except Exception:
+            slots.release()
+            if replica is not None:
+                replica.mark_down()
+            raise
+    
+    def _release(self, conn):
+        """Give a connection back once its transaction is finished"""
+        conn.last_used = time.monotonic()
+        if conn.replica is not None:
+            conn.replica.pool.putconn(conn)
+            conn.replica.slots.release()
+        elif self.pool is not None:
+            self.pool.putconn(conn)
+            self._pool_slots.release()
+    
+    def _discard(self, conn):
+        """Drop a broken connection and replace it"""
+        replica = conn.replica
+        if replica is not None:
+            replica.mark_down()
+            replica.pool.putconn(conn, close=True)
+            replica.slots.release()
+            return
+        if self.pool is not None:
+            self.pool.putconn(conn, close=True)
+            self._pool_slots.release()
+            return
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self._reconnect()
+    
+    @contextmanager
+    def _cursor(self, name=None, read=False):
+        """
+        Yield a dedicated cursor; commit on success, rollback (or reconnect) on error
+        
+        name: open a server-side (named) cursor instead of a client-side one.
+        read: the block only reads, it may run on an up-to-date replica.
+        Inside transaction(), the cursor runs on the unit's connection under a
+        savepoint instead (released on success, rolled back on error, never committed).
+        """
+        unit = getattr(self._unit, 'conn', None)
+        if unit is not None:
+            with self._savepoint(unit, name) as cur:
+                yield cur
+            return
+        
+        replica = self._pick_replica() if read else None
+        try:
+            conn = self._acquire(replica)
+        except CONNECTION_ERRORS:
+            if replica is None:
+                raise
+            # Réplica injoignable : la lecture passe par le primaire
+            conn = self._acquire()
+        try:
+            with conn.cursor(name) as cur:
+                yield cur
+            conn.commit()
+            if not read and self.replicas:
+                # Les réplicas devront avoir rejoué cette écriture
+                self._lsn_outdated = True
+        except CONNECTION_ERRORS:
+            self._discard(conn)
+            raise
+        except BaseException:
+            # BaseException : un générateur abandonné (GeneratorExit) rend aussi sa connexion
+            try:
+                conn.rollback()
+            except CONNECTION_ERRORS:
+                self._discard(conn)
+                raise
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+    
+    @contextmanager
+    def _savepoint(self, conn, name=None):
+        """Yield a cursor on conn whose statements are undone alone if the block raises"""
+        savepoint = f"stats_write_{next(self._savepoint_ids)}"
+        with conn.cursor() as cur:
+            cur.execute(f"SAVEPOINT {savepoint}")
+        try:
+            with conn.cursor(name) as cur:
+                yield cur
+        except BaseException:
+            if not conn.closed:
+                with conn.cursor() as cur:
+                    cur.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            raise
+        with conn.cursor() as cur:
+            cur.execute(f"RELEASE SAVEPOINT {savepoint}")
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: every read and write of the calling thread inside the block runs
+        in one transaction, committed once when the block exits (rolled back if it raises)
+        
+        Each operation runs under its own savepoint, so a failed save is undone alone and
+        the block may catch the error and go on. Notifications from bump_data_versions
+        are delivered on commit, and the local cache is invalidated after it. Nested calls
+        join the enclosing unit. A dropped connection is not retried: it aborts the whole unit.
+        """
+        if getattr(self._unit, 'conn', None) is not None:
+            yield self
+            return
+        
+        touched = set(self._touched)
+        self._unit.on_commit = []
+        try:
+            with self._cursor() as cur:
+                self._unit.conn = cur.connection
+                try:
+                    yield self
+                finally:
+                    self._unit.conn = None
+        except BaseException:
+            # Rien n'a été écrit : les tables de l'unité ne sont plus à publier
+            self._unit.on_commit = []
+            self._touched.clear()
+            self._touched.update(touched)
+            raise
+        callbacks, self._unit.on_commit = self._unit.on_commit, []
+        for callback in callbacks:
+            callback()
+    
+    def _after_commit(self, callback):
+        """Run callback once the current writes are committed: now, or when the transaction() unit commits"""
+        if getattr(self._unit, 'conn', None) is not None:
+            self._unit.on_commit.append(callback)
+        else:
+            callback()
+    
+    def _pick_replica(self):
+        """Replica for the next read (round robin over the up-to-date ones), None for the primary"""
+        if not self.replicas or getattr(self._routing, 'primary', False):
+            return None
+        if self._lsn_outdated:
+            self._lsn_outdated = False
+            try:
+                with self.read_from_primary():
+                    lsn = parse_lsn(self._fetchall("SELECT pg_current_wal_lsn()::text")[0][0])
+            except BaseException:
+                self._lsn_outdated = True
+                raise
+            with self._lsn_lock:
+                self._min_lsn = max(self._min_lsn, lsn)
+        
+        start = next(self._replica_turn)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if self._caught_up(replica):
+                return replica
+        return None
+    
+    def _caught_up(self, replica):
+        """
+        True if replica has replayed the WAL up to self._min_lsn
+        
+        Replay only moves forward: the position is re-read only while the replica is
+        behind, at most every DB_REPLICA_LSN_CHECK seconds.
+        """
+        if replica.replay_lsn is not None and replica.replay_lsn >= self._min_lsn:
+            return True
+        now = time.monotonic()
+        if replica.checked is not None and now - replica.checked < DB_REPLICA_LSN_CHECK:
+            return False
+        replica.checked = now
+        
+        try:
+            conn = self._acquire(replica)
+        except CONNECTION_ERRORS:
+            return False
+        try:
+            with conn.cursor() as cur:
+                # Un serveur hors recovery (URL du primaire) est à jour par construction
+                cur.execute("""
+                    SELECT (CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn()
+                                 ELSE pg_current_wal_lsn() END)::text
+                """)
+                lsn = cur.fetchone()[0]
+            conn.rollback()
+        except CONNECTION_ERRORS:
+            self._discard(conn)
+            return False
+        self._release(conn)
+        replica.replay_lsn = parse_lsn(lsn) if lsn else None
+        return replica.replay_lsn is not None and replica.replay_lsn >= self._min_lsn
+    
+    @contextmanager
+    def read_from_primary(self):
+        """Send the reads of the calling thread to the primary inside the block"""
+        outer = getattr(self._routing, 'primary', False)
+        self._routing.primary = True
+        try:
+            yield self
+        finally:
+            self._routing.primary = outer
+    
+    def _run(self, operation, read=False):
+        """
+        Run operation(cursor) in its own transaction
+        
+        read: operation only reads (see _cursor). A read is retried once on a dropped
+        connection (a failed replica is skipped on retry). A write is not: the connection
+        may drop after the server committed it, and replaying it would apply it twice
+        (bump_data_versions would bump the versions again).
+        """
+        for attempt in range(2):
+            try:
+                with self._cursor(read=read) as cur:
+                    return operation(cur)
+            except CONNECTION_ERRORS:
+                if attempt or not read:
+                    raise
+    
+    def _execute(self, cur, query, params=None):
+        """
+        cur.execute(query, params), through a prepared statement when self.prepare is set
+        
+        The first call of a query text on a connection PREPAREs it ($n placeholders);
+        later calls only send EXECUTE with the values, and PostgreSQL reuses the plan
+        (a generic one once it is not costlier than the custom plans). EXECUTE values
+        are cast to the parameter types inferred by PREPARE: unlike a plain query, an
+        EXECUTE does not coerce e.g. a text[] value to a timestamp[] parameter.
+        
+        Only fixed texts are worth preparing: a statement stays allocated on the server for
+        the life of the connection. Queries with an IN (%s, %s...) list are run as is (pass
+        an array to "= ANY(%s)" instead), and past MAX_PREPARED_STATEMENTS on a connection
+        new texts are too.
+        """
+        started = time.perf_counter()
+        prepared = cur.connection.prepared if self.prepare else {}
+        if query not in prepared and (
+            not self.prepare or not _PREPARABLE.match(query) or _IN_LIST.search(query)
+            or len(prepared) >= MAX_PREPARED_STATEMENTS
+        ):
+            cur.execute(query, params)
+        else:
+            statement, args = numbered_query(query, params)
+            name, types = prepared.get(query, (None, None))
+            if name is None:
+                name = f"stats_{len(prepared)}"
+                cur.execute(f"PREPARE {name} AS {statement}")
+                cur.execute(
+                    "SELECT parameter_types::text[] FROM pg_prepared_statements WHERE name = %s", (name,)
+                )
+                types = cur.fetchone()[0]
+                prepared[query] = (name, types)
+            if args:
+                cur.execute(f"EXECUTE {name} ({', '.join(f'%s::{kind}' for kind in types)})", args)
+            else:
+                cur.execute(f"EXECUTE {name}")
+        self._log_if_slow(cur, query, params, started)
+    
+    def _log_if_slow(self, cur, query, params, started):
+        """Add the statement to the slow-query log if it ran longer than the threshold"""
+        elapsed = (time.perf_counter() - started) * 1000
+        if not self.query_stats.is_slow(elapsed):
+            return
+        statement = cur.mogrify(query, params).decode('utf-8')
+        plan = self._explain(cur.connection, statement) if DB_SLOW_QUERY_EXPLAIN else None
+        self.query_stats.log_slow(getattr(self._operation, 'name', None), statement, elapsed, plan)
+    
+    def _explain(self, conn, statement):
+        """
+        Estimated plan of a statement (EXPLAIN on conn under a savepoint, nothing is run)
+        
+        With DB_SLOW_QUERY_EXPLAIN_ANALYZE, reads get EXPLAIN (ANALYZE, BUFFERS) instead and
+        are run a second time; writes never are (EXPLAIN ANALYZE would apply them twice).
+        """
+        analyze = DB_SLOW_QUERY_EXPLAIN_ANALYZE and _READ_ONLY.match(statement)
+        options = 'ANALYZE, BUFFERS' if analyze else 'COSTS'
+        try:
+            with self._savepoint(conn) as cur:
+                cur.execute(f"EXPLAIN ({options}) {statement}")
+                return '\n'.join(row[0] for row in cur.fetchall())
+        except psycopg2.Error as e:
+            return f"EXPLAIN failed: {e}"
+    
+    def _fetchall(self, query, params=None):
+        """Execute a read query (prepared, see _execute) and return all rows"""
+        def operation(cur):
+            self._execute(cur, query, params)
+            return cur.fetchall()
+        return self._run(operation, read=True)
+    
+    def _stream(self, query, params=None, chunk_size=None):
+        """
+        Yield the rows of query in lists of chunk_size rows (default DB_STREAM_ITERSIZE)
+        
+        Rows are read through a named server-side cursor, so only one chunk is held in
+        memory. The connection stays busy until the generator is exhausted or closed; in
+        single-connection mode, do not run other queries while iterating.
+        """
+        chunk_size = chunk_size or self.stream_itersize
+        with self._cursor(name=f"stats_stream_{next(self._stream_ids)}", read=True) as cur:
+            cur.itersize = chunk_size
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    
+    def _fetch_frame(self, query, params, dtypes):
+        """
+        Run query and return a typed DataFrame without building Python row tuples
+        
+        The result is exported with COPY ... TO STDOUT (CSV) and parsed by the pandas C
+        reader: dates land directly in datetime64 columns, counters in int64.
+        """
+        def operation(cur):
+            buffer = io.BytesIO()
+            statement = cur.mogrify(query, params).decode('utf-8')
+            started = time.perf_counter()
+            cur.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT csv)", buffer)
+            self._log_if_slow(cur, statement, None, started)
+            return buffer
+        
+        return frame_from_csv(self._run(operation, read=True), dtypes)
+    
+    def get_schema_version(self):
+        """Schema version recorded in the database (0 if never initialized)"""
+        try:
+            with self.read_from_primary():
+                rows = self._fetchall("SELECT version FROM schema_version")
+        except psycopg2.errors.UndefinedTable:
+            return 0
+        return rows[0][0] if rows else 0
+    
+    def ensure_schema(self):
+        """
+        Run the DDL only when the database is behind SCHEMA_VERSION
+        
+        Up-to-date databases cost a single SELECT at connect time; no DDL lock is taken.
+        Returns True if the schema was (re)created.
+        """
+        if self.get_schema_version() >= SCHEMA_VERSION:
+            return False
+        self._run(lambda cur: self._upgrade_schema(cur, force=False))
+        return True
     
     def create_tables(self):
-        """Create tables if they don't exist"""
+        """Create tables if they don't exist (always runs the DDL)"""
+        self._run(lambda cur: self._upgrade_schema(cur, force=True))
+    
+    def _upgrade_schema(self, cur, force):
+        """Run _create_tables under an advisory lock and record SCHEMA_VERSION"""
+        # Plusieurs process démarrant ensemble : un seul exécute le DDL, les autres attendent
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+                version INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("SELECT version FROM schema_version")
+        row = cur.fetchone()
+        if not force and row and row[0] >= SCHEMA_VERSION:
+            return
         
+        self._create_tables(cur)
+        cur.execute("""
+            INSERT INTO schema_version (id, version) VALUES (TRUE, %s)
+            ON CONFLICT (id) DO UPDATE SET
+                version = GREATEST(schema_version.version, EXCLUDED.version),
+                updated_at = CURRENT_TIMESTAMP
+        """, (SCHEMA_VERSION,))
+    
+    def _create_tables(self, cur):
         # Table pour les stats globales par jour
-        self.cursor.execute("""
+        cur.execute("""
             CREATE TABLE IF NOT EXISTS daily_stats (
                 id SERIAL PRIMARY KEY,
                 date DATE NOT NULL,
@@ -32,7 +1909,7 @@ class StatsDatabase:
         """)
         
         # Table pour les stats par version
-        self.cursor.execute("""
+        cur.execute("""
             CREATE TABLE IF NOT EXISTS version_stats (
                 id SERIAL PRIMARY KEY,
                 date DATE NOT NULL,
@@ -47,7 +1924,7 @@ class StatsDatabase:
         """)
         
         # Table pour les modpacks
-        self.cursor.execute("""
+        cur.execute("""
             CREATE TABLE IF NOT EXISTS modpack_stats (
                 id SERIAL PRIMARY KEY,
                 date DATE NOT NULL,
@@ -61,30 +1938,421 @@ class StatsDatabase:
             )
         """)
         
+        # Fin de validité des lignes en mode creux (ajoutée aux bases existantes)
+        cur.execute("""
+            SELECT table_name FROM information_schema.columns
+            WHERE column_name = 'valid_to' AND table_name IN ('version_stats', 'modpack_stats')
+        """)
+        with_valid_to = {row[0] for row in cur.fetchall()}
+        for spec in SPARSE_SOURCES.values():
+            if spec['table'] not in with_valid_to:
+                cur.execute(f"ALTER TABLE {spec['table']} ADD COLUMN valid_to DATE")
+        
         # Index pour améliorer les performances
-        self.cursor.execute("""
+        cur.execute("""
             CREATE INDEX IF NOT EXISTS idx_daily_stats_date 
             ON daily_stats(date DESC)
         """)
         
-        self.cursor.execute("""
+        cur.execute("""
             CREATE INDEX IF NOT EXISTS idx_version_stats_date 
             ON version_stats(date DESC, platform)
         """)
         
-        self.cursor.execute("""
+        cur.execute("""
             CREATE INDEX IF NOT EXISTS idx_modpack_stats_date 
             ON modpack_stats(date DESC, platform)
         """)
         
-        self.conn.commit()
+        # Séries d'une entité (historique, valeur à une date : get_top_movers)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_daily_stats_platform 
+            ON daily_stats(platform, date DESC)
+        """)
+        
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_version_stats_name 
+            ON version_stats(platform, version_name, date DESC)
+        """)
+        
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_modpack_stats_slug 
+            ON modpack_stats(platform, modpack_slug, date DESC)
+        """)
+        
+        # Séries journalières reconstruites à la lecture (identiques en mode dense ou creux)
+        self._create_dense_views(cur)
+        
+        # Tables dérivées de l'historique : remplies une fois à leur création
+        cur.execute("""
+            SELECT to_regclass('version_latest') IS NULL OR to_regclass('modpack_latest') IS NULL,
+                   to_regclass('modpack_first_seen') IS NULL,
+                   to_regclass('daily_stats_rollup') IS NULL OR to_regclass('version_stats_rollup') IS NULL
+                       OR to_regclass('modpack_stats_rollup') IS NULL
+        """)
+        needs_latest_backfill, needs_first_seen_backfill, needs_rollup_backfill = cur.fetchone()
+        
+        # Dernières valeurs connues (une ligne par entité), tenues à jour par les saves
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS version_latest (
+                platform VARCHAR(20) NOT NULL,
+                version_name VARCHAR(255) NOT NULL,
+                version_number VARCHAR(255),
+                downloads INTEGER NOT NULL,
+                date_published TIMESTAMP,
+                date DATE NOT NULL,
+                PRIMARY KEY (platform, version_name)
+            )
+        """)
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS modpack_latest (
+                platform VARCHAR(20) NOT NULL,
+                modpack_slug VARCHAR(255) NOT NULL,
+                modpack_name VARCHAR(255) NOT NULL,
+                downloads INTEGER NOT NULL,
+                followers INTEGER,
+                date DATE NOT NULL,
+                PRIMARY KEY (platform, modpack_slug)
+            )
+        """)
+        
+        # Première observation de chaque modpack (base du calcul "Since Added")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS modpack_first_seen (
+                platform VARCHAR(20) NOT NULL,
+                modpack_slug VARCHAR(255) NOT NULL,
+                first_date DATE NOT NULL,
+                first_downloads INTEGER NOT NULL,
+                PRIMARY KEY (platform, modpack_slug)
+            )
+        """)
+        
+        # Agrégats hebdomadaires/mensuels (dernière valeur, min/max, croissance de la période)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS daily_stats_rollup (
+                resolution VARCHAR(10) NOT NULL,
+                platform VARCHAR(20) NOT NULL,
+                period_start DATE NOT NULL,
+                last_date DATE NOT NULL,
+                total_downloads INTEGER NOT NULL,
+                followers INTEGER,
+                versions_count INTEGER,
+                min_value INTEGER NOT NULL,
+                max_value INTEGER NOT NULL,
+                delta INTEGER NOT NULL,
+                PRIMARY KEY (resolution, platform, period_start)
+            )
+        """)
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS version_stats_rollup (
+                resolution VARCHAR(10) NOT NULL,
+                platform VARCHAR(20) NOT NULL,
+                version_name VARCHAR(255) NOT NULL,
+                period_start DATE NOT NULL,
+                last_date DATE NOT NULL,
+                downloads INTEGER NOT NULL,
+                min_value INTEGER NOT NULL,
+                max_value INTEGER NOT NULL,
+                delta INTEGER NOT NULL,
+                PRIMARY KEY (resolution, platform, version_name, period_start)
+            )
+        """)
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS modpack_stats_rollup (
+                resolution VARCHAR(10) NOT NULL,
+                platform VARCHAR(20) NOT NULL,
+                modpack_slug VARCHAR(255) NOT NULL,
+                period_start DATE NOT NULL,
+                last_date DATE NOT NULL,
+                downloads INTEGER NOT NULL,
+                modpack_name VARCHAR(255),
+                min_value INTEGER NOT NULL,
+                max_value INTEGER NOT NULL,
+                delta INTEGER NOT NULL,
+                PRIMARY KEY (resolution, platform, modpack_slug, period_start)
+            )
+        """)
+        
+        # Version des données par table, incrémentée à chaque collecte (cache des lectures)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS data_versions (
+                table_name VARCHAR(63) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        if needs_latest_backfill:
+            self._backfill_latest_tables(cur)
+        if needs_first_seen_backfill:
+            self._backfill_first_seen(cur)
+        if needs_rollup_backfill:
+            self._refresh_rollups(cur, since=None, sources=ROLLUP_SOURCES)
+    
+    def _create_dense_views(self, cur):
+        """Create the missing *_dense views (one row per observed day, intervals expanded)"""
+        for spec in SPARSE_SOURCES.values():
+            cur.execute("SELECT to_regclass(%s) IS NULL", (spec['dense'],))
+            if cur.fetchone()[0]:
+                columns = ', '.join(f"s.{column}" for column in spec['columns'][1:])
+                cur.execute(f"""
+                    CREATE VIEW {spec['dense']} AS
+                    SELECT s.date + n AS date, {columns}
+                    FROM {spec['table']} s
+                    CROSS JOIN LATERAL generate_series(0, COALESCE(s.valid_to, s.date) - s.date) n
+                """)
+    
+    def _backfill_latest_tables(self, cur):
+        """Rebuild the latest-snapshot tables from the full history (one DISTINCT ON scan)"""
+        cur.execute("""
+            INSERT INTO version_latest
+            (platform, version_name, version_number, downloads, date_published, date)
+            SELECT DISTINCT ON (platform, version_name)
+                platform, version_name, version_number, downloads, date_published,
+                COALESCE(valid_to, date)
+            FROM version_stats
+            ORDER BY platform, version_name, date DESC
+            ON CONFLICT (platform, version_name) DO UPDATE SET
+                version_number = EXCLUDED.version_number,
+                downloads = EXCLUDED.downloads,
+                date_published = EXCLUDED.date_published,
+                date = EXCLUDED.date
+            WHERE version_latest.date <= EXCLUDED.date
+        """)
+        
+        cur.execute("""
+            INSERT INTO modpack_latest
+            (platform, modpack_slug, modpack_name, downloads, followers, date)
+            SELECT DISTINCT ON (platform, modpack_slug)
+                platform, modpack_slug, modpack_name, downloads, followers,
+                COALESCE(valid_to, date)
+            FROM modpack_stats
+            WHERE modpack_slug IS NOT NULL
+            ORDER BY platform, modpack_slug, date DESC
+            ON CONFLICT (platform, modpack_slug) DO UPDATE SET
+                modpack_name = EXCLUDED.modpack_name,
+                downloads = EXCLUDED.downloads,
+                followers = EXCLUDED.followers,
+                date = EXCLUDED.date
+            WHERE modpack_latest.date <= EXCLUDED.date
+        """)
     
+    def _backfill_first_seen(self, cur):
+        """Rebuild modpack_first_seen from the earliest history row of each modpack"""
+        cur.execute("""
+            INSERT INTO modpack_first_seen (platform, modpack_slug, first_date, first_downloads)
+            SELECT DISTINCT ON (platform, modpack_slug)
+                platform, modpack_slug, date, downloads
+            FROM modpack_stats
+            WHERE modpack_slug IS NOT NULL
+            ORDER BY platform, modpack_slug, date
+            ON CONFLICT (platform, modpack_slug) DO UPDATE SET
+                first_date = EXCLUDED.first_date,
+                first_downloads = EXCLUDED.first_downloads
+            WHERE EXCLUDED.first_date <= modpack_first_seen.first_date
+        """)
+    
+    def _refresh_rollups(self, cur, since, sources):
+        """
+        Recompute every rollup period that starts on/after the period containing `since`
+        
+        Returns the rollup tables that actually changed.
+        """
+        changed_tables = set()
+        for source in sources:
+            query = rollup_upsert_sql(source, since, self.sparse)
+            for resolution in ROLLUP_RESOLUTIONS:
+                self._execute(cur, query, {'resolution': resolution, 'since': since})
+                if cur.rowcount:
+                    changed_tables.add(ROLLUP_SOURCES[source]['rollup'])
+        return changed_tables
+    
+    def _bump_versions(self, cur, tables, run_id):
+        """Increment the versions of tables and NOTIFY them (see bump_data_versions)"""
+        self._execute(cur, BUMP_VERSIONS_SQL, (tables,))
+        versions = dict(cur.fetchall())
+        cur.execute(
+            "SELECT pg_notify(%s, %s)",
+            (DB_NOTIFY_CHANNEL, json.dumps({'run_id': run_id, 'versions': versions}))
+        )
+        return versions
+    
+    def _versions_changed(self, tables):
+        """Drop the cached reads of tables; later reads wait for replicas to replay them"""
+        super()._versions_changed(tables)
+        if self.replicas:
+            # Ne pas mettre en cache sous ces versions des données d'un réplica en retard
+            self._lsn_outdated = True
+    
+    def start_listener(self):
+        """
+        LISTEN on DB_NOTIFY_CHANNEL in a daemon thread (dedicated connection) and
+        invalidate the cached reads of the tables each collection run touched.
+        Falls back to polling data_versions while disconnected.
+        """
+        if self.cache is None or (self._listener is not None and self._listener.is_alive()):
+            return
+        self._stop_listening.clear()
+        self._listener = threading.Thread(target=self._listen, name="stats-db-listener", daemon=True)
+        self._listener.start()
+    
+    def stop_listener(self):
+        """Stop the listener thread started by start_listener()"""
+        self._stop_listening.set()
+        if self._listener is not None:
+            self._listener.join()
+            self._listener = None
+    
+    def _listen(self):
+        """Listener loop: (re)connect, LISTEN, apply notifications until stopped"""
+        delay = 1
+        while not self._stop_listening.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.db_url)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(DB_NOTIFY_CHANNEL)))
+                # Des runs ont pu se terminer avant le LISTEN : une relecture puis plus de polling
+                self._versions_checked = None
+                self.get_data_versions()
+                self._listening.set()
+                delay = 1
+                while not self._stop_listening.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._apply_notification(conn.notifies.pop(0).payload)
+            except CONNECTION_ERRORS:
+                self._stop_listening.wait(delay)
+                delay = min(delay * 2, 60)
+            finally:
+                self._listening.clear()
+                if conn is not None:
+                    conn.close()
+    
+    def _apply_notification(self, payload):
+        """Merge the versions announced by a run and drop the cached reads they outdate"""
+        message = json.loads(payload)
+        versions = dict(self._versions)
+        changed = [
+            table for table, version in message['versions'].items()
+            if version > versions.get(table, 0)
+        ]
+        for table in changed:
+            versions[table] = message['versions'][table]
+        self._versions = versions
+        if changed:
+            self._versions_changed(changed)
+        self.last_notification = {
+            'run_id': message.get('run_id'), 'tables': sorted(changed), 'received_at': datetime.now()
+        }
+    
+    @staticmethod
+    def _next_month(day):
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    
+    @staticmethod
+    def _is_partitioned(cur, table):
+        cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cur.fetchone()
+        return bool(row and row[0])
+    
+    def _ensure_partitions(self, cur, table, start, end):
+        """
+        Create the monthly partitions of `table` covering [start, end]
+        
+        Rows that already landed in the DEFAULT partition for those months are moved
+        into the new partition before it is attached.
+        """
+        month = start.replace(day=1)
+        while month <= end:
+            upper = self._next_month(month)
+            name = f"{table}_p{month:%Y%m}"
+            cur.execute("SELECT to_regclass(%s) IS NULL", (name,))
+            if cur.fetchone()[0]:
+                cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+                cur.execute(f"""
+                    WITH moved AS (
+                        DELETE FROM {table}_default WHERE date >= %s AND date < %s RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved
+                """, (month, upper))
+                cur.execute(
+                    f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                    (month, upper)
+                )
+            month = upper
+    
+    def ensure_partitions(self, months_ahead=PARTITION_MONTHS_AHEAD):
+        """Create partitions for the current month and the next months (no-op if not partitioned)"""
+        today = datetime.now(timezone.utc).date()
+        end = today
+        for _ in range(months_ahead):
+            end = self._next_month(end)
+        
+        def operation(cur):
+            for table in PARTITIONED_TABLES:
+                if self._is_partitioned(cur, table):
+                    self._ensure_partitions(cur, table, today, end)
+        self._run(operation)
+    
+    def drop_partitions_before(self, cutoff, archive=False):
+        """
+        Retention: remove monthly partitions entirely older than `cutoff`
+        
+        archive=True detaches them instead (kept as standalone tables, e.g. for pg_dump).
+        Sparse intervals still valid on the first kept day are split there first.
+        Returns the names of the partitions removed.
+        """
+        boundary = cutoff.replace(day=1)
+        
+        def operation(cur):
+            removed = []
+            for table in PARTITIONED_TABLES:
+                if not self._is_partitioned(cur, table):
+                    continue
+                spec = next(spec for spec in SPARSE_SOURCES.values() if spec['table'] == table)
+                columns = ', '.join(spec['columns'][1:])
+                cur.execute("""
+                    SELECT c.relname
+                    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = to_regclass(%s) AND c.relname ~ '_p[0-9]{6}$'
+                    ORDER BY c.relname
+                """, (table,))
+                for (name,) in cur.fetchall():
+                    month = datetime.strptime(name[-6:], '%Y%m').date()
+                    if self._next_month(month) > cutoff:
+                        continue
+                    # Reste de l'intervalle à partir du premier jour conservé
+                    cur.execute(f"""
+                        INSERT INTO {table} (date, {columns}, valid_to)
+                        SELECT %s, {columns}, NULLIF(valid_to, %s)
+                        FROM {name}
+                        WHERE valid_to >= %s
+                        ON CONFLICT DO NOTHING
+                    """, (boundary, boundary, boundary))
+                    if archive:
+                        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                    else:
+                        cur.execute(f"DROP TABLE {name}")
+                    removed.append(name)
+                    self._touched.add(table)
+            return removed
+        return self._run(operation)
+    
+    @_instrumented
     def save_daily_stats(self, platform, total_downloads, followers, versions_count):
-        """Save daily global statistics"""
+        """Save daily global statistics (returns {'written', 'unchanged'} row counts)"""
         today = datetime.now(timezone.utc).date()
         
-        try:
-            self.cursor.execute("""
+        def operation(cur):
+            self._execute(cur, """
                 INSERT INTO daily_stats (date, platform, total_downloads, followers, versions_count)
                 VALUES (%s, %s, %s, %s, %s)
                 ON CONFLICT (date, platform) 
@@ -92,188 +2360,367 @@ class StatsDatabase:
                     total_downloads = EXCLUDED.total_downloads,
                     followers = EXCLUDED.followers,
                     versions_count = EXCLUDED.versions_count
+                WHERE (daily_stats.total_downloads, daily_stats.followers, daily_stats.versions_count)
+                    IS DISTINCT FROM (EXCLUDED.total_downloads, EXCLUDED.followers, EXCLUDED.versions_count)
             """, (today, platform, total_downloads, followers, versions_count))
-            self.conn.commit()
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+            return {'written': cur.rowcount, 'unchanged': 1 - cur.rowcount}
+        return self._track('daily', self._run(operation))
     
-    def save_version_stats(self, platform, versions_data):
-        """Save version statistics for today"""
-        today = datetime.now(timezone.utc).date()
+    def _upsert_sparse_rows(self, cur, source, rows):
+        """
+        Change-only history write: a row whose values equal the interval observed the
+        day before only extends that interval's valid_to; other rows are inserted.
+        Returns the number of history rows written.
+        """
+        query = sparse_upsert_sql(source, unnest_rows(UNNEST_TYPES[source]))
+        written = 0
+        for start in range(0, len(rows), self.batch_size):
+            self._execute(cur, query, row_columns(rows[start:start + self.batch_size]))
+            written += cur.fetchone()[0]
+        return written
+    
+    def _upsert_batches(self, cur, query, rows, fetch=False):
+        """
+        Run an UPSERT_SQL statement over rows, batch_size rows per execution
         
-        try:
-            for version in versions_data:
-                date_published = None
-                if 'date_published' in version and version['date_published']:
-                    try:
-                        date_published = datetime.fromisoformat(version['date_published'].replace('Z', '+00:00'))
-                    except:
-                        pass
-                
-                self.cursor.execute("""
-                    INSERT INTO version_stats 
-                    (date, platform, version_name, version_number, downloads, date_published)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (date, platform, version_name)
-                    DO UPDATE SET 
-                        downloads = EXCLUDED.downloads
-                """, (
-                    today,
-                    platform,
-                    version['name'],
-                    version.get('version_number', ''),
-                    version['downloads'],
-                    date_published
-                ))
-            self.conn.commit()
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+        Each batch is sent as one array per column, so the statement text never changes
+        and is prepared once. Returns the number of rows returned (fetch) or affected.
+        """
+        count = 0
+        for start in range(0, len(rows), self.batch_size):
+            self._execute(cur, query, row_columns(rows[start:start + self.batch_size]))
+            count += len(cur.fetchall()) if fetch else cur.rowcount
+        return count
     
-    def save_modpack_stats(self, platform, modpacks_data):
-        """Save modpack statistics for today"""
-        today = datetime.now(timezone.utc).date()
+    def _compact_history(self, cur, sources, where=None, params=None):
+        """
+        Fold consecutive days with identical values into one interval row. An interval
+        that overlaps later rows (days loaded into its middle) is split around them: its
+        other days keep their values. Returns the number of rows removed.
         
-        try:
-            for modpack in modpacks_data:
-                self.cursor.execute("""
+        where: SQL condition (on the history table, with params) limiting the work to some
+        entities and dates; it must select every row overlapping or adjacent to the changed ones.
+        """
+        removed = 0
+        for source in sources:
+            spec = SPARSE_SOURCES[source]
+            table, key = spec['table'], spec['key']
+            values = ', '.join(spec['values'])
+            window = f"PARTITION BY platform, {key} ORDER BY date"
+            unchanged = ' AND '.join(
+                f"LAG({column}) OVER w IS NOT DISTINCT FROM {column}" for column in spec['values']
+            )
+            scope = f"WHERE {where}" if where else ""
+            split_values = ', '.join(f"r.{column}" for column in spec['values'])
+            cur.execute(f"""
+                CREATE TEMP TABLE history_rows AS
+                SELECT date, platform, {key}, {values}, COALESCE(valid_to, date) AS end_date,
+                       COALESCE(COALESCE(valid_to, date) >= LEAD(date) OVER ({window}), false) AS overlapped
+                FROM {table}
+                {scope}
+            """, params)
+            # Jours de chaque intervalle chevauché non couverts par une ligne commencée après lui,
+            # puis regroupement des jours consécutifs de mêmes valeurs
+            cur.execute(f"""
+                CREATE TEMP TABLE history_runs AS
+                SELECT MIN(date) AS date, platform, {key}, {values}, MAX(end_date) AS end_date
+                FROM (
+                    SELECT *, SUM(starts) OVER ({window}) AS run
+                    FROM (
+                        SELECT *, CASE WHEN LAG(end_date) OVER w = date - 1 AND {unchanged}
+                                       THEN 0 ELSE 1 END AS starts
+                        FROM (
+                            SELECT date, platform, {key}, {values}, end_date
+                            FROM history_rows
+                            WHERE NOT overlapped
+                            UNION ALL
+                            SELECT d.day::date, r.platform, r.{key}, {split_values}, d.day::date
+                            FROM history_rows r
+                            CROSS JOIN LATERAL generate_series(r.date, r.end_date, interval '1 day') d (day)
+                            WHERE r.overlapped AND NOT EXISTS (
+                                SELECT 1 FROM history_rows o
+                                WHERE o.platform = r.platform AND o.{key} = r.{key}
+                                  AND o.date > r.date AND o.date <= d.day AND o.end_date >= d.day
+                            )
+                        ) days
+                        WINDOW w AS ({window})
+                    ) marked
+                ) runs
+                GROUP BY platform, {key}, run, {values}
+            """)
+            cur.execute(f"""
+                DELETE FROM {table} t USING history_rows h
+                WHERE t.platform = h.platform AND t.{key} = h.{key} AND t.date = h.date
+                  AND NOT EXISTS (
+                      SELECT 1 FROM history_runs r
+                      WHERE r.platform = t.platform AND r.{key} = t.{key} AND r.date = t.date
+                  )
+            """)
+            removed += cur.rowcount
+            cur.execute(f"""
+                UPDATE {table} t SET valid_to = NULLIF(r.end_date, r.date)
+                FROM history_runs r
+                WHERE t.platform = r.platform AND t.{key} = r.{key} AND t.date = r.date
+                  AND t.valid_to IS DISTINCT FROM NULLIF(r.end_date, r.date)
+            """)
+            # Reste d'un intervalle coupé : nouvelle ligne avec les anciennes valeurs
+            cur.execute(f"""
+                INSERT INTO {table} (date, platform, {key}, {values}, valid_to)
+                SELECT date, platform, {key}, {values}, NULLIF(end_date, date)
+                FROM history_runs r
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table} t
+                    WHERE t.platform = r.platform AND t.{key} = r.{key} AND t.date = r.date
+                )
+            """)
+            removed -= cur.rowcount
+            cur.execute("DROP TABLE history_rows, history_runs")
+        return removed
+    
+    def compact_history(self, sources=None):
+        """Convert existing daily version/modpack rows to change-only intervals (see sparse)"""
+        if not self.sparse:
+            raise ValueError("compact_history needs sparse=True: dense reads would skip the folded days")
+        return self._run(lambda cur: self._compact_history(cur, sources or SPARSE_SOURCES))
+    
+    def _upsert_version_rows(self, cur, rows):
+        """
+        Upsert version rows (history + latest snapshot) in multi-row batches (no commit)
+        
+        Rows identical to what is stored are skipped (no new tuple, trigger or WAL).
+        Returns {'written', 'unchanged'} history row counts.
+        """
+        rows = self._dedupe_rows(rows, 2)
+        source_rows = unnest_rows(UNNEST_TYPES['version'])
+        if self.sparse:
+            written = self._upsert_sparse_rows(cur, 'version', rows)
+        else:
+            written = self._upsert_batches(cur, UPSERT_SQL['version_stats'].format(rows=source_rows), rows, fetch=True)
+        self._upsert_batches(cur, UPSERT_SQL['version_latest'].format(rows=source_rows), rows)
+        return {'written': written, 'unchanged': len(rows) - written}
+    
+    def _upsert_modpack_rows(self, cur, rows):
+        """
+        Upsert modpack rows (history + latest snapshot) in multi-row batches (no commit)
+        
+        Same no-op skipping and return value as _upsert_version_rows.
+        """
+        rows = self._dedupe_rows(rows, 3)
+        source_rows = unnest_rows(UNNEST_TYPES['modpack'])
+        if self.sparse:
+            written = self._upsert_sparse_rows(cur, 'modpack', rows)
+        else:
+            written = self._upsert_batches(cur, UPSERT_SQL['modpack_stats'].format(rows=source_rows), rows, fetch=True)
+        self._upsert_batches(cur, UPSERT_SQL['modpack_latest'].format(rows=source_rows), rows)
+        self._upsert_batches(
+            cur, UPSERT_SQL['modpack_first_seen'].format(rows=unnest_rows(UNNEST_TYPES['first_seen'])),
+            [first_seen_row(row) for row in rows]
+        )
+        return {'written': written, 'unchanged': len(rows) - written}
+    
+    @_instrumented
+    def bulk_load_modpack_stats(self, rows, platform, default_date=None):
+        """
+        Stream modpack rows through COPY into an unlogged staging table, then merge them
+        into modpack_stats with one set-based upsert. Returns {'written', 'unchanged'}
+        row counts (rows identical to the stored ones are not rewritten).
+        
+        rows: iterable of (date, platform, name, slug, downloads, followers); date and
+        platform may be None to use default_date (today) / platform. The iterable is
+        consumed lazily, so the input never has to fit in memory.
+        """
+        default_date = default_date or datetime.now(timezone.utc).date()
+        
+        with self._cursor() as cur:
+            cur.execute("""
+                CREATE UNLOGGED TABLE IF NOT EXISTS modpack_stats_staging (
+                    seq BIGSERIAL,
+                    date DATE,
+                    platform VARCHAR(20),
+                    modpack_name VARCHAR(255),
+                    modpack_slug VARCHAR(255),
+                    downloads INTEGER,
+                    followers INTEGER
+                )
+            """)
+            # TRUNCATE verrouille la table jusqu'au commit : les imports concurrents s'enchaînent
+            cur.execute("TRUNCATE modpack_stats_staging RESTART IDENTITY")
+            cur.copy_expert("""
+                COPY modpack_stats_staging (date, platform, modpack_name, modpack_slug, downloads, followers)
+                FROM STDIN WITH (FORMAT csv)
+            """, _CopyStream(rows))
+            
+            cur.execute(
+                "SELECT MIN(COALESCE(date, %s)), MAX(COALESCE(date, %s)) FROM modpack_stats_staging",
+                (default_date, default_date)
+            )
+            first, last = cur.fetchone()
+            # Un import historique peut viser des mois sans partition
+            if first is not None and self._is_partitioned(cur, 'modpack_stats'):
+                self._ensure_partitions(cur, 'modpack_stats', first, last)
+            
+            if self.sparse:
+                # Un intervalle qui commence à une date importée serait réécrit en entier par la
+                # fusion : il redevient une ligne par jour (recompactées après la fusion)
+                cur.execute("""
+                    WITH staged AS (
+                        SELECT DISTINCT COALESCE(date, %(date)s) AS date, COALESCE(platform, %(platform)s) AS platform,
+                               modpack_slug
+                        FROM modpack_stats_staging
+                        WHERE modpack_slug IS NOT NULL
+                    ),
+                    split AS (
+                        SELECT s.id, s.date, s.platform, s.modpack_name, s.modpack_slug, s.downloads, s.followers,
+                               s.valid_to
+                        FROM modpack_stats s
+                        JOIN staged i USING (date, platform, modpack_slug)
+                        WHERE s.valid_to IS NOT NULL
+                    ),
+                    days AS (
+                        INSERT INTO modpack_stats (date, platform, modpack_name, modpack_slug, downloads, followers)
+                        SELECT p.date + n, p.platform, p.modpack_name, p.modpack_slug, p.downloads, p.followers
+                        FROM split p
+                        CROSS JOIN LATERAL generate_series(1, p.valid_to - p.date) n
+                    )
+                    UPDATE modpack_stats s SET valid_to = NULL
+                    FROM split p
+                    WHERE s.id = p.id AND s.date = p.date
+                    RETURNING p.valid_to
+                """, {'date': default_date, 'platform': platform})
+                # Les jours éclatés sont recompactés avec les jours importés
+                last = max([last] + [row[0] for row in cur.fetchall()])
+            
+            # La dernière occurrence d'une clé l'emporte, comme avec les upserts ligne à ligne
+            cur.execute("""
+                WITH incoming AS (
+                    SELECT DISTINCT ON (date, platform, modpack_slug)
+                        date, platform, modpack_name, modpack_slug, downloads, followers
+                    FROM (
+                        SELECT seq, COALESCE(date, %s), COALESCE(platform, %s), COALESCE(modpack_name, ''),
+                               modpack_slug, COALESCE(downloads, 0), COALESCE(followers, 0)
+                        FROM modpack_stats_staging
+                        WHERE modpack_slug IS NOT NULL
+                    ) s (seq, date, platform, modpack_name, modpack_slug, downloads, followers)
+                    ORDER BY date, platform, modpack_slug, seq DESC
+                ),
+                written AS (
                     INSERT INTO modpack_stats 
                     (date, platform, modpack_name, modpack_slug, downloads, followers)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    SELECT date, platform, modpack_name, modpack_slug, downloads, followers
+                    FROM incoming
                     ON CONFLICT (date, platform, modpack_slug)
                     DO UPDATE SET 
                         downloads = EXCLUDED.downloads,
                         followers = EXCLUDED.followers
-                """, (
-                    today,
-                    platform,
-                    modpack['title'] if 'title' in modpack else modpack.get('name', ''),
-                    modpack['slug'],
-                    modpack['downloads'],
-                    modpack.get('follows', modpack.get('followers', 0))
-                ))
-            self.conn.commit()
-        except Exception as e:
-            self.conn.rollback()
-            raise e
-    
-    def get_daily_stats_history(self, platform, days=30):
-        """Get historical daily statistics"""
-        self.cursor.execute("""
-            SELECT date, total_downloads, followers, versions_count
-            FROM daily_stats
-            WHERE platform = %s
-            ORDER BY date DESC
-            LIMIT %s
-        """, (platform, days))
-        
-        return self.cursor.fetchall()
-    
-    def get_version_stats_history(self, platform, version_name=None, days=30):
-        """Get historical version statistics"""
-        if version_name:
-            self.cursor.execute("""
-                SELECT date, version_name, downloads
-                FROM version_stats
-                WHERE platform = %s AND version_name = %s
-                ORDER BY date DESC
-                LIMIT %s
-            """, (platform, version_name, days))
-        else:
-            self.cursor.execute("""
-                SELECT date, version_name, downloads
-                FROM version_stats
-                WHERE platform = %s
-                ORDER BY date DESC
-                LIMIT %s
-            """, (platform, days))
+                    WHERE (modpack_stats.downloads, modpack_stats.followers)
+                        IS DISTINCT FROM (EXCLUDED.downloads, EXCLUDED.followers)
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM incoming), (SELECT COUNT(*) FROM written)
+            """, (default_date, platform))
+            staged, written = cur.fetchone()
+            
+            cur.execute("""
+                INSERT INTO modpack_latest 
+                (date, platform, modpack_name, modpack_slug, downloads, followers)
+                SELECT DISTINCT ON (platform, modpack_slug)
+                    date, platform, modpack_name, modpack_slug, downloads, followers
+                FROM (
+                    SELECT seq, COALESCE(date, %s), COALESCE(platform, %s), COALESCE(modpack_name, ''),
+                           modpack_slug, COALESCE(downloads, 0), COALESCE(followers, 0)
+                    FROM modpack_stats_staging
+                    WHERE modpack_slug IS NOT NULL
+                ) s (seq, date, platform, modpack_name, modpack_slug, downloads, followers)
+                ORDER BY platform, modpack_slug, date DESC, seq DESC
+                ON CONFLICT (platform, modpack_slug)
+                DO UPDATE SET 
+                    modpack_name = EXCLUDED.modpack_name,
+                    downloads = EXCLUDED.downloads,
+                    followers = EXCLUDED.followers,
+                    date = EXCLUDED.date
+                WHERE modpack_latest.date <= EXCLUDED.date
+                  AND (modpack_latest.date, modpack_latest.modpack_name,
+                       modpack_latest.downloads, modpack_latest.followers)
+                      IS DISTINCT FROM (EXCLUDED.date, EXCLUDED.modpack_name,
+                                        EXCLUDED.downloads, EXCLUDED.followers)
+            """, (default_date, platform))
+            
+            cur.execute("""
+                INSERT INTO modpack_first_seen 
+                (first_date, platform, modpack_slug, first_downloads)
+                SELECT DISTINCT ON (platform, modpack_slug)
+                    date, platform, modpack_slug, downloads
+                FROM (
+                    SELECT seq, COALESCE(date, %s), COALESCE(platform, %s),
+                           modpack_slug, COALESCE(downloads, 0)
+                    FROM modpack_stats_staging
+                    WHERE modpack_slug IS NOT NULL
+                ) s (seq, date, platform, modpack_slug, downloads)
+                ORDER BY platform, modpack_slug, date, seq DESC
+                ON CONFLICT (platform, modpack_slug)
+                DO UPDATE SET 
+                    first_date = EXCLUDED.first_date,
+                    first_downloads = EXCLUDED.first_downloads
+                WHERE EXCLUDED.first_date <= modpack_first_seen.first_date
+                  AND (modpack_first_seen.first_date, modpack_first_seen.first_downloads)
+                      IS DISTINCT FROM (EXCLUDED.first_date, EXCLUDED.first_downloads)
+            """, (default_date, platform))
+            
+            # Les jours importés redeviennent des intervalles : seuls les modpacks importés sont
+            # recompactés, sur les lignes qui touchent ou jouxtent les dates importées
+            if self.sparse and first is not None:
+                self._compact_history(cur, ['modpack'], """
+                    (platform, modpack_slug) IN (
+                        SELECT COALESCE(platform, %(platform)s), modpack_slug
+                        FROM modpack_stats_staging
+                        WHERE modpack_slug IS NOT NULL
+                    )
+                    AND date <= %(last)s::date + 1 AND COALESCE(valid_to, date) >= %(first)s::date - 1
+                """, {'platform': platform, 'first': first, 'last': last})
+            cur.execute("TRUNCATE modpack_stats_staging")
         
-        return self.cursor.fetchall()
+        return self._track('modpack', {'written': written, 'unchanged': staged - written})
     
-    def get_download_growth(self, platform, days=7):
-        """Calculate download growth over period"""
-        self.cursor.execute("""
-            WITH stats AS (
-                SELECT date, total_downloads,
-                       LAG(total_downloads) OVER (ORDER BY date) as prev_downloads
-                FROM daily_stats
-                WHERE platform = %s
-                ORDER BY date DESC
-                LIMIT %s
-            )
-            SELECT 
-                date,
-                total_downloads,
-                total_downloads - COALESCE(prev_downloads, 0) as daily_growth
-            FROM stats
-            ORDER BY date DESC
-        """, (platform, days))
-        
-        return self.cursor.fetchall()
+    def _history_sql(self, source, platform, key_value, days, resolution):
+        if source == 'daily':
+            return daily_history_query(platform, days, resolution)
+        if source == 'version':
+            return version_history_query(platform, key_value, days, resolution, self.sparse)
+        return modpack_history_query(platform, key_value, days, resolution, self.sparse)
+    
+    def _series_sql(self, source, platform, keys, days, resolution):
+        if source == 'daily':
+            return daily_series_query(keys, days, resolution)
+        return entity_series_query(source, platform, keys, days, resolution, self.sparse)
+    
+    def _page_sql(self, source, platform, key_value, limit, page_token):
+        return history_page_query(source, platform, key_value, limit, page_token, self.sparse)
+    
+    def _latest_page_sql(self, source, platform, limit, page_token):
+        return latest_page_query(source, platform, limit, page_token)
+    
+    def _latest_sql(self, source, platform):
+        return latest_query(source, platform)
+    
+    def _growth_sql(self, platform, days):
+        return download_growth_query(platform, days)
+    
+    def _top_movers_sql(self, source, platform, window_days, limit):
+        return top_movers_query(source, platform, window_days, limit)
+    
+    def _initial_downloads_sql(self, platform, slugs):
+        return initial_downloads_query(platform, slugs)
+    
+    def _history_days_sql(self, source, platforms):
+        return history_days_query(source, platforms)
     
-    def get_all_versions_latest(self, platform):
-        """Get latest stats for all versions"""
-        self.cursor.execute("""
-            SELECT DISTINCT ON (version_name)
-                version_name, version_number, downloads, date_published
-            FROM version_stats
-            WHERE platform = %s
-            ORDER BY version_name, date DESC
-        """, (platform,))
-        
-        return self.cursor.fetchall()
-    
-    def get_modpacks_initial_downloads(self, platform):
-        """Get initial download count for all modpacks (first recorded date)"""
-        self.cursor.execute("""
-            SELECT m.modpack_slug, m.downloads, m.date
-            FROM modpack_stats m
-            INNER JOIN (
-                SELECT modpack_slug, MIN(date) as first_date
-                FROM modpack_stats
-                WHERE platform = %s
-                GROUP BY modpack_slug
-            ) first_dates ON m.modpack_slug = first_dates.modpack_slug AND m.date = first_dates.first_date
-            WHERE m.platform = %s
-        """, (platform, platform))
-        
-        return {row[0]: {'downloads': row[1], 'date': row[2]} for row in self.cursor.fetchall()}
-
-    def get_modpack_stats_history(self, platform, modpack_slug=None, days=30):
-        """Get historical modpack statistics"""
-        if modpack_slug:
-            self.cursor.execute("""
-                SELECT date, modpack_name, downloads
-                FROM modpack_stats
-                WHERE platform = %s AND modpack_slug = %s
-                ORDER BY date DESC
-                LIMIT %s
-            """, (platform, modpack_slug, days))
-        else:
-            self.cursor.execute("""
-                SELECT date, modpack_name, downloads
-                FROM modpack_stats
-                WHERE platform = %s
-                ORDER BY date DESC
-                LIMIT %s
-            """, (platform, days))
-        
-        return self.cursor.fetchall()
-
-    def get_all_modpacks_latest(self, platform):
-        """Get latest stats for all modpacks"""
-        self.cursor.execute("""
-            SELECT DISTINCT ON (modpack_slug)
-                modpack_name, modpack_slug, downloads
-            FROM modpack_stats
-            WHERE platform = %s
-            ORDER BY modpack_slug, date DESC
-        """, (platform,))
-        
-        return self.cursor.fetchall()
-
     def close(self):
-        """Close database connection"""
-        self.cursor.close()
-        self.conn.close()
+        """Close database connection(s)"""
+        self.stop_listener()
+        for replica in self.replicas:
+            replica.pool.closeall()
+        if self.pool is not None:
+            self.pool.closeall()
+        else:
+            self.cursor.close()
+            self.conn.close()
@@ -3,10 +3,15 @@ Gestionnaire de modpacks CurseForge
 """
 import csv
 import json
-from typing import List, Dict, Optional
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 from src.config import MODPACKS_CSV_PATH, MODPACKS_JSON_PATH
 
+# Résultats de query() mémorisés (LRU) : les recherches libres du dashboard n'en ajoutent pas sans fin
+QUERY_CACHE_SIZE = 32
+
 
 class ModpackManager:
     """Gestionnaire pour charger et manipuler les modpacks"""
@@ -15,6 +20,116 @@ class ModpackManager:
         self.csv_path = Path(MODPACKS_CSV_PATH)
         self.json_path = Path(MODPACKS_JSON_PATH)
         self._modpacks: List[Dict] = []
+        self._by_slug: Dict[str, Dict] = {}
+        # Position de chaque slug dans _modpacks (remplacement sur place sans recherche)
+        self._positions: Dict[str, int] = {}
+        # Agrégats maintenus à chaque modification (évite 4 passes par get_stats)
+        self._stats = self._empty_stats()
+        # Vue triée par téléchargements décroissants, maintenue par insertion
+        # dichotomique : _ranked_keys[i] == (-downloads, rang dans _modpacks) de _ranked[i].
+        # Le rang (croissant, jamais réutilisé) garde l'ordre de la liste entre ex aequo,
+        # comme sorted() ; _rank_keys retrouve la clé d'un modpack (par identité).
+        self._ranked: List[Dict] = []
+        self._ranked_keys: List[Tuple[int, int]] = []
+        self._rank_keys: Dict[int, Tuple[int, int]] = {}
+        self._next_rank = 0
+        # Résultats filtrés/triés mémorisés pour query() (LRU de QUERY_CACHE_SIZE entrées),
+        # vidés à chaque modification
+        self._query_cache: "OrderedDict[Tuple, List[Dict]]" = OrderedDict()
+        self._loaded_mtime: Optional[float] = None
+    
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {'total': 0, 'with_downloads': 0, 'total_downloads': 0, 'with_ids': 0}
+    
+    @staticmethod
+    def _downloads(modpack: Dict) -> int:
+        return modpack.get('downloads', 0) or 0
+    
+    def _account(self, modpack: Dict, sign: int):
+        """Ajoute (sign=1) ou retire (sign=-1) un modpack des agrégats"""
+        downloads = self._downloads(modpack)
+        self._stats['total'] += sign
+        self._stats['total_downloads'] += sign * downloads
+        if downloads > 0:
+            self._stats['with_downloads'] += sign
+        if modpack.get('id'):
+            self._stats['with_ids'] += sign
+    
+    def set_modpacks(self, modpacks: List[Dict]):
+        """Remplace la liste et reconstruit agrégats et vue triée (un seul tri)"""
+        self._modpacks = modpacks
+        self._by_slug = {}
+        self._positions = {}
+        for position, modpack in enumerate(modpacks):
+            if modpack.get('slug'):
+                self._by_slug[modpack['slug']] = modpack
+                self._positions[modpack['slug']] = position
+        self._stats = self._empty_stats()
+        for modpack in modpacks:
+            self._account(modpack, 1)
+        self._rank_keys = {id(m): (-self._downloads(m), rank) for rank, m in enumerate(modpacks)}
+        self._next_rank = len(modpacks)
+        self._ranked = sorted(modpacks, key=lambda m: self._rank_keys[id(m)])
+        self._ranked_keys = [self._rank_keys[id(m)] for m in self._ranked]
+        self._query_cache.clear()
+    
+    def _rank_insert(self, modpack: Dict, rank: int):
+        key = (-self._downloads(modpack), rank)
+        pos = bisect_left(self._ranked_keys, key)
+        self._ranked_keys.insert(pos, key)
+        self._ranked.insert(pos, modpack)
+        self._rank_keys[id(modpack)] = key
+    
+    def _rank_remove(self, modpack: Dict) -> int:
+        """Retire modpack de la vue triée et retourne son rang (clés uniques : une recherche)"""
+        key = self._rank_keys.pop(id(modpack))
+        pos = bisect_left(self._ranked_keys, key)
+        del self._ranked[pos]
+        del self._ranked_keys[pos]
+        return key[1]
+    
+    def upsert_modpack(self, modpack: Dict):
+        """Ajoute ou remplace un modpack (par slug) en mettant à jour les vues"""
+        slug = modpack.get('slug')
+        previous = self._by_slug.get(slug) if slug else None
+        if previous is not None:
+            # Remplacement sur place : même position dans la liste, même rang entre ex aequo
+            self._account(previous, -1)
+            rank = self._rank_remove(previous)
+            self._modpacks[self._positions[slug]] = modpack
+        else:
+            rank = self._next_rank
+            self._next_rank += 1
+            if slug:
+                self._positions[slug] = len(self._modpacks)
+            self._modpacks.append(modpack)
+        if slug:
+            self._by_slug[slug] = modpack
+        self._account(modpack, 1)
+        self._rank_insert(modpack, rank)
+        self._query_cache.clear()
+    
+    def remove_modpack(self, slug: str) -> bool:
+        """Supprime un modpack par slug"""
+        modpack = self._by_slug.pop(slug, None)
+        if modpack is None:
+            return False
+        self._account(modpack, -1)
+        self._rank_remove(modpack)
+        position = self._positions.pop(slug)
+        del self._modpacks[position]
+        for other, other_position in self._positions.items():
+            if other_position > position:
+                self._positions[other] = other_position - 1
+        self._query_cache.clear()
+        return True
+    
+    def _source_mtime(self) -> Optional[float]:
+        for path in (self.csv_path, self.json_path):
+            if path.exists():
+                return path.stat().st_mtime
+        return None
     
     def load_from_csv(self) -> List[Dict]:
         """Charge les modpacks depuis le CSV"""
@@ -34,7 +149,7 @@ class ModpackManager:
                         'link': row['link']
                     })
             
-            self._modpacks = modpacks
+            self.set_modpacks(modpacks)
             return modpacks
         except Exception as e:
             print(f"Error loading CSV: {e}")
@@ -49,7 +164,7 @@ class ModpackManager:
             with open(self.json_path, 'r', encoding='utf-8') as f:
                 modpacks = json.load(f)
             
-            self._modpacks = modpacks
+            self.set_modpacks(modpacks)
             return modpacks
         except Exception as e:
             print(f"Error loading JSON: {e}")
@@ -60,8 +175,15 @@ class ModpackManager:
         modpacks = self.load_from_csv()
         if not modpacks:
             modpacks = self.load_from_json()
+        self._loaded_mtime = self._source_mtime()
         return modpacks
     
+    def refresh(self) -> List[Dict]:
+        """Recharge les modpacks seulement si le fichier source a changé"""
+        if not self._modpacks or self._source_mtime() != self._loaded_mtime:
+            self.load()
+        return self._modpacks
+    
     def save_to_csv(self, modpacks: List[Dict]) -> bool:
         """Sauvegarde les modpacks en CSV"""
         if not modpacks:
@@ -82,7 +204,8 @@ class ModpackManager:
                         'link': modpack.get('link', '')
                     })
             
-            self._modpacks = modpacks
+            self.set_modpacks(modpacks)
+            self._loaded_mtime = self._source_mtime()
             return True
         except Exception as e:
             print(f"Error saving CSV: {e}")
@@ -93,17 +216,7 @@ class ModpackManager:
         if not self._modpacks:
             self.load()
         
-        total = len(self._modpacks)
-        with_downloads = sum(1 for m in self._modpacks if m.get('downloads', 0) > 0)
-        total_downloads = sum(m.get('downloads', 0) for m in self._modpacks)
-        with_ids = sum(1 for m in self._modpacks if m.get('id'))
-        
-        return {
-            'total': total,
-            'with_downloads': with_downloads,
-            'total_downloads': total_downloads,
-            'with_ids': with_ids
-        }
+        return dict(self._stats)
     
     def get_modpacks(self) -> List[Dict]:
         """Retourne la liste des modpacks"""
@@ -115,7 +228,34 @@ class ModpackManager:
         """Trie par nombre de téléchargements"""
         if not self._modpacks:
             self.load()
-        return sorted(self._modpacks, key=lambda x: x.get('downloads', 0), reverse=reverse)
+        return list(self._ranked) if reverse else self.get_page(0, len(self._ranked), reverse=False)
+    
+    def top_k(self, k: int) -> List[Dict]:
+        """Retourne les k modpacks les plus téléchargés"""
+        return self.get_page(0, k)
+    
+    def get_page(self, offset: int, limit: int, reverse: bool = True) -> List[Dict]:
+        """Retourne une tranche de la vue triée par téléchargements"""
+        if not self._modpacks:
+            self.load()
+        offset = max(0, offset)
+        if reverse:
+            return self._ranked[offset:offset + limit]
+        # Ordre croissant : la vue parcourue à l'envers, groupe d'ex aequo par groupe,
+        # chaque groupe gardant l'ordre de la liste (comme sorted(..., reverse=False))
+        total = len(self._ranked)
+        if offset >= total:
+            return []
+        key = self._ranked_keys[total - 1 - offset][0]
+        end = bisect_right(self._ranked_keys, (key, float('inf')))
+        skip = offset - (total - end)
+        page = []
+        while end > 0 and len(page) < limit:
+            first = bisect_left(self._ranked_keys, (self._ranked_keys[end - 1][0], -1))
+            page.extend(self._ranked[first + skip:min(end, first + skip + limit - len(page))])
+            skip = 0
+            end = first
+        return page
     
     def filter_by_name(self, query: str) -> List[Dict]:
         """Filtre par nom"""
@@ -123,3 +263,51 @@ class ModpackManager:
             self.load()
         query_lower = query.lower()
         return [m for m in self._modpacks if query_lower in m.get('name', '').lower()]
+    
+    def query(self, filter: Optional[Dict] = None, sort: Tuple[str, bool] = ('downloads', True),
+              offset: int = 0, limit: int = 50) -> Tuple[List[Dict], int]:
+        """
+        Retourne une page de modpacks et le nombre total de résultats
+        
+        filter: {'name': sous-chaîne, 'with_downloads': bool}
+        sort: (clé, décroissant) avec clé 'downloads' ou 'name'
+        """
+        if not self._modpacks:
+            self.load()
+        
+        filter = filter or {}
+        name = (filter.get('name') or '').lower()
+        with_downloads = bool(filter.get('with_downloads'))
+        sort_key, reverse = sort
+        if sort_key not in ('downloads', 'name'):
+            raise ValueError(f"Unknown sort key: {sort_key}")
+        offset = max(0, offset)
+        
+        # Sans recherche textuelle, la vue par téléchargements suffit :
+        # les modpacks avec téléchargements en forment le préfixe.
+        if not name and sort_key == 'downloads':
+            total = self._stats['with_downloads'] if with_downloads else len(self._ranked)
+            limit = max(0, min(limit, total - offset))
+            if not reverse:
+                offset += len(self._ranked) - total
+            return self.get_page(offset, limit, reverse), total
+        
+        key = (name, with_downloads, sort_key, reverse)
+        matches = self._query_cache.get(key)
+        if matches is not None:
+            self._query_cache.move_to_end(key)
+        else:
+            if sort_key == 'downloads':
+                source = self.sort_by_downloads(reverse)
+            else:
+                source = sorted(self._modpacks, key=lambda x: x.get('name', '').lower(), reverse=reverse)
+            matches = [
+                m for m in source
+                if (not name or name in m.get('name', '').lower())
+                and (not with_downloads or self._downloads(m) > 0)
+            ]
+            self._query_cache[key] = matches
+            if len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        
+        return matches[offset:offset + limit], len(matches)
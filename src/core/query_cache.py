@@ -0,0 +1,84 @@
+"""
+Cache LRU des résultats de requêtes de StatsDatabase
+Chaque entrée est étiquetée par les tables lues, pour une invalidation ciblée
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+import pandas as pd
+
+
+def estimate_size(value: Any) -> int:
+    """Taille approximative en octets d'un résultat (DataFrame, tuples, dicts...)"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class QueryCache:
+    """Cache LRU borné en mémoire, partagé entre threads"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, frozenset]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Retourne (trouvé, valeur) et marque l'entrée comme récemment utilisée"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key: Hashable, value: Any, tags: Iterable[str]):
+        """Ajoute une entrée puis évince les moins récentes au-delà de max_bytes"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, frozenset(tags))
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def invalidate(self, tags: Optional[Iterable[str]] = None) -> int:
+        """Supprime les entrées liées à l'une des tables (toutes si tags est None)"""
+        with self._lock:
+            if tags is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return removed
+            tags = set(tags)
+            stale = [key for key, (_, _, entry_tags) in self._entries.items() if entry_tags & tags]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)[1]
+            return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        """Statistiques du cache (entrées, octets, hits/misses)"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
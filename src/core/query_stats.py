@@ -0,0 +1,151 @@
+"""
+Instrumentation des requêtes de StatsDatabase
+Latences par méthode (histogramme), lignes et octets lus, journal des requêtes lentes
+"""
+import bisect
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from src.core.query_cache import estimate_size
+
+# Bornes supérieures des classes de l'histogramme (ms) ; la dernière classe est ouverte
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# Lignes mesurées pour estimer la taille d'un DataFrame
+SIZE_SAMPLE_ROWS = 100
+
+
+def is_page(value: Any) -> bool:
+    """True pour une page à curseur (lignes, jeton de continuation) des getters *_page"""
+    return (isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], list)
+            and (value[1] is None or isinstance(value[1], str)))
+
+
+def result_rows(value: Any) -> int:
+    """Nombre de lignes d'un résultat (tuples, page, DataFrame, {clé: DataFrame}, compteurs d'un save)"""
+    if value is None:
+        return 0
+    if is_page(value):
+        return len(value[0])
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        if value.keys() == {'written', 'unchanged'}:
+            return value['written'] + value['unchanged']
+        return sum(len(item) if isinstance(item, pd.DataFrame) else 1 for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    return 1
+
+
+def result_bytes(value: Any) -> int:
+    """Taille approximative d'un résultat, extrapolée de ses premières lignes (coût constant)"""
+    if is_page(value):
+        return result_bytes(value[0]) + estimate_size(value[1])
+    if isinstance(value, list) and value:
+        return estimate_size(value[0]) * len(value)
+    if isinstance(value, pd.DataFrame) and len(value) > SIZE_SAMPLE_ROWS:
+        sample = value.head(SIZE_SAMPLE_ROWS)
+        return int(sample.memory_usage(deep=True).sum() * len(value) / SIZE_SAMPLE_ROWS)
+    if isinstance(value, dict):
+        return sum(result_bytes(item) for item in value.values())
+    return estimate_size(value)
+
+
+class _MethodStats:
+    """Compteurs d'une méthode"""
+
+    __slots__ = ('calls', 'total_ms', 'max_ms', 'rows', 'bytes', 'errors', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.errors = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def percentile(self, fraction: float) -> float:
+        """Borne supérieure de la classe contenant le quantile (max observé pour la classe ouverte)"""
+        rank = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                if index == len(LATENCY_BUCKETS_MS):
+                    return self.max_ms
+                return min(LATENCY_BUCKETS_MS[index], self.max_ms)
+        return self.max_ms
+
+
+class QueryStats:
+    """Statistiques des appels, partagées entre threads"""
+
+    def __init__(self, slow_ms: Optional[float] = None, slow_log_size: int = 50):
+        self.slow_ms = slow_ms
+        self._methods: Dict[str, _MethodStats] = {}
+        self._slow: "deque[Dict[str, Any]]" = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+        self.since = datetime.now()
+
+    def record(self, method: str, elapsed_ms: float, rows: int = 0, size: int = 0, error: bool = False):
+        """Ajoute un appel de method à ses compteurs"""
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = _MethodStats()
+            stats.calls += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.rows += rows
+            stats.bytes += size
+            stats.errors += error
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def is_slow(self, elapsed_ms: float) -> bool:
+        """True si une requête de cette durée doit entrer dans le journal des requêtes lentes"""
+        return self.slow_ms is not None and elapsed_ms >= self.slow_ms
+
+    def log_slow(self, method: Optional[str], query: str, elapsed_ms: float, plan: Optional[str]):
+        """Ajoute une requête lente au journal (les plus anciennes sont évincées)"""
+        with self._lock:
+            self._slow.append({
+                'at': datetime.now(), 'method': method, 'duration_ms': elapsed_ms,
+                'query': query, 'plan': plan,
+            })
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Une ligne par méthode, de la plus coûteuse (temps total) à la moins coûteuse"""
+        with self._lock:
+            rows = [{
+                'method': method,
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'total_ms': stats.total_ms,
+                'mean_ms': stats.total_ms / stats.calls,
+                'p50_ms': stats.percentile(0.50),
+                'p95_ms': stats.percentile(0.95),
+                'p99_ms': stats.percentile(0.99),
+                'max_ms': stats.max_ms,
+                'rows': stats.rows,
+                'bytes': stats.bytes,
+                'histogram': dict(zip([*map(str, LATENCY_BUCKETS_MS), 'inf'], stats.buckets)),
+            } for method, stats in self._methods.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        """Journal des requêtes lentes, de la plus récente à la plus ancienne"""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def reset(self):
+        """Remet les compteurs et le journal à zéro"""
+        with self._lock:
+            self._methods.clear()
+            self._slow.clear()
+            self.since = datetime.now()
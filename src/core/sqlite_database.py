@@ -0,0 +1,923 @@
+"""
+Backend SQLite de StatsDatabase (fichier ou :memory:)
+Mêmes getters/savers, mêmes résultats et même sémantique d'upsert que PostgreSQL,
+sans serveur : benchmarks en process, CI et dashboards locaux (DATABASE_URL=sqlite:///stats.db)
+"""
+import io
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone, timedelta
+
+import pandas as pd
+
+from src.core.database import (
+    ROLLUP_RESOLUTIONS, ROLLUP_SOURCES, SCHEMA_VERSION, SPARSE_SOURCES, LATEST_COLUMNS, BaseStatsDatabase,
+    empty_frame, frame_from_csv, decode_page_token, _instrumented
+)
+from src.config import DB_SLOW_QUERY_EXPLAIN
+
+# Dates stockées en texte ISO, relues en date/datetime grâce aux types déclarés.
+# Comme une colonne TIMESTAMP PostgreSQL, le fuseau d'un datetime est ignoré.
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.replace(tzinfo=None).isoformat(sep=' '))
+sqlite3.register_converter('DATE', lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda raw: datetime.fromisoformat(raw.decode()))
+
+# Type des dates des DataFrames PostgreSQL (pd.read_csv(parse_dates=...), varie selon pandas)
+FRAME_DATE_DTYPE = frame_from_csv(io.BytesIO(b'2000-01-01\n'), {'date': 'datetime64[ns]'})['date'].dtype
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATE NOT NULL,
+        platform VARCHAR(20) NOT NULL,
+        total_downloads INTEGER NOT NULL,
+        followers INTEGER,
+        versions_count INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(date, platform)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS version_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATE NOT NULL,
+        platform VARCHAR(20) NOT NULL,
+        version_name VARCHAR(255) NOT NULL,
+        version_number VARCHAR(255),
+        downloads INTEGER NOT NULL,
+        date_published TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(date, platform, version_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS modpack_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATE NOT NULL,
+        platform VARCHAR(20) NOT NULL,
+        modpack_name VARCHAR(255) NOT NULL,
+        modpack_slug VARCHAR(255),
+        downloads INTEGER NOT NULL,
+        followers INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(date, platform, modpack_slug)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_daily_stats_date ON daily_stats(date DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_version_stats_date ON version_stats(date DESC, platform)",
+    "CREATE INDEX IF NOT EXISTS idx_modpack_stats_date ON modpack_stats(date DESC, platform)",
+    "CREATE INDEX IF NOT EXISTS idx_daily_stats_platform ON daily_stats(platform, date DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_version_stats_name ON version_stats(platform, version_name, date DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_modpack_stats_slug ON modpack_stats(platform, modpack_slug, date DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS version_latest (
+        platform VARCHAR(20) NOT NULL,
+        version_name VARCHAR(255) NOT NULL,
+        version_number VARCHAR(255),
+        downloads INTEGER NOT NULL,
+        date_published TIMESTAMP,
+        date DATE NOT NULL,
+        PRIMARY KEY (platform, version_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS modpack_latest (
+        platform VARCHAR(20) NOT NULL,
+        modpack_slug VARCHAR(255) NOT NULL,
+        modpack_name VARCHAR(255) NOT NULL,
+        downloads INTEGER NOT NULL,
+        followers INTEGER,
+        date DATE NOT NULL,
+        PRIMARY KEY (platform, modpack_slug)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS modpack_first_seen (
+        platform VARCHAR(20) NOT NULL,
+        modpack_slug VARCHAR(255) NOT NULL,
+        first_date DATE NOT NULL,
+        first_downloads INTEGER NOT NULL,
+        PRIMARY KEY (platform, modpack_slug)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_stats_rollup (
+        resolution VARCHAR(10) NOT NULL,
+        platform VARCHAR(20) NOT NULL,
+        period_start DATE NOT NULL,
+        last_date DATE NOT NULL,
+        total_downloads INTEGER NOT NULL,
+        followers INTEGER,
+        versions_count INTEGER,
+        min_value INTEGER NOT NULL,
+        max_value INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        PRIMARY KEY (resolution, platform, period_start)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS version_stats_rollup (
+        resolution VARCHAR(10) NOT NULL,
+        platform VARCHAR(20) NOT NULL,
+        version_name VARCHAR(255) NOT NULL,
+        period_start DATE NOT NULL,
+        last_date DATE NOT NULL,
+        downloads INTEGER NOT NULL,
+        min_value INTEGER NOT NULL,
+        max_value INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        PRIMARY KEY (resolution, platform, version_name, period_start)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS modpack_stats_rollup (
+        resolution VARCHAR(10) NOT NULL,
+        platform VARCHAR(20) NOT NULL,
+        modpack_slug VARCHAR(255) NOT NULL,
+        period_start DATE NOT NULL,
+        last_date DATE NOT NULL,
+        downloads INTEGER NOT NULL,
+        modpack_name VARCHAR(255),
+        min_value INTEGER NOT NULL,
+        max_value INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        PRIMARY KEY (resolution, platform, modpack_slug, period_start)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        table_name VARCHAR(63) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# Début de période équivalent à date_trunc('week' | 'month', date)
+PERIOD_START = {
+    'week': "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "date(date, 'start of month')",
+}
+
+
+def sqlite_path(db_url):
+    """Chemin SQLite d'une URL sqlite:///chemin (sqlite:// ou sqlite:///:memory: = en mémoire)"""
+    path = db_url[len('sqlite://'):]
+    # sqlite:///relatif.db -> relatif.db, sqlite:////absolu.db -> /absolu.db
+    if path.startswith('/'):
+        path = path[1:]
+    return path or ':memory:'
+
+
+def _distinct(table, columns):
+    """NULL-safe "stored row differs from EXCLUDED" condition of an upsert"""
+    return ' OR '.join(f"{table}.{column} IS NOT excluded.{column}" for column in columns)
+
+
+class SQLiteStatsDatabase(BaseStatsDatabase):
+    def __init__(self, db_url='sqlite://', batch_size=None, pool_size=None, sparse=None, cache_bytes=None,
+                 prepare=None, slow_query_ms=None, read_urls=None):
+        """
+        SQLite counterpart of StatsDatabase (same getters, savers and return values)
+        
+        db_url: sqlite:///relative.db, sqlite:////absolute.db or sqlite:// (in memory).
+        One connection shared by all threads behind a lock; pool_size, prepare and read_urls
+        are accepted for compatibility and ignored (sqlite3 already keeps compiled
+        statements in a per-connection cache, and there are no replicas).
+        sparse: history is always stored daily here; sparse=True raises ValueError.
+        cache_bytes: as in StatsDatabase (data versions are polled, no LISTEN/NOTIFY).
+        slow_query_ms: as in StatsDatabase; slow reads are logged with EXPLAIN QUERY PLAN.
+        """
+        if sparse:
+            raise ValueError("Sparse history needs PostgreSQL: SQLite stores one row per day")
+        
+        super().__init__(batch_size, False, cache_bytes, slow_query_ms)
+        self.db_url = db_url
+        self.pool = None
+        self.replicas = []
+        self._lock = threading.RLock()
+        self._in_unit = False
+        # Actions à jouer après le commit de l'unité de travail en cours
+        self._on_commit = []
+        self.conn = sqlite3.connect(
+            sqlite_path(db_url), detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        self.cursor = self.conn.cursor()
+        
+        self.ensure_schema()
+    
+    @contextmanager
+    def _cursor(self):
+        """
+        Yield a cursor in its own transaction; commit on success, rollback on error
+        
+        Inside transaction(), the cursor runs under a savepoint of the unit instead.
+        """
+        with self._lock:
+            if self._in_unit:
+                with self._savepoint() as cur:
+                    yield cur
+                return
+            cur = self.conn.cursor()
+            try:
+                yield cur
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            finally:
+                cur.close()
+    
+    @contextmanager
+    def _savepoint(self):
+        """Yield a cursor whose statements are undone alone if the block raises"""
+        cur = self.conn.cursor()
+        cur.execute("SAVEPOINT stats_write")
+        try:
+            yield cur
+        except BaseException:
+            cur.execute("ROLLBACK TO SAVEPOINT stats_write")
+            cur.execute("RELEASE SAVEPOINT stats_write")
+            raise
+        else:
+            cur.execute("RELEASE SAVEPOINT stats_write")
+        finally:
+            cur.close()
+    
+    @contextmanager
+    def transaction(self):
+        """Unit of work committed once at the end (see StatsDatabase.transaction)"""
+        with self._lock:
+            if self._in_unit:
+                yield self
+                return
+            
+            touched = set(self._touched)
+            self._on_commit = []
+            try:
+                with self._cursor() as cur:
+                    cur.execute("BEGIN")
+                    self._in_unit = True
+                    try:
+                        yield self
+                    finally:
+                        self._in_unit = False
+            except BaseException:
+                self._on_commit = []
+                self._touched.clear()
+                self._touched.update(touched)
+                raise
+            callbacks, self._on_commit = self._on_commit, []
+            for callback in callbacks:
+                callback()
+    
+    def _after_commit(self, callback):
+        """Run callback once the current writes are committed (see StatsDatabase._after_commit)"""
+        if self._in_unit:
+            self._on_commit.append(callback)
+        else:
+            callback()
+    
+    @contextmanager
+    def read_from_primary(self):
+        """No replicas in SQLite: every read already sees the last write"""
+        yield self
+    
+    def _run(self, operation):
+        """Run operation(cursor) in its own transaction"""
+        with self._cursor() as cur:
+            return operation(cur)
+    
+    def _fetchall(self, query, params=()):
+        """Execute a read query and return all rows"""
+        def operation(cur):
+            started = time.perf_counter()
+            rows = cur.execute(query, params).fetchall()
+            self._log_if_slow(cur, query, params, started)
+            return rows
+        return self._run(operation)
+    
+    def _log_if_slow(self, cur, query, params, started):
+        """Add the statement to the slow-query log (with EXPLAIN QUERY PLAN) if it ran too long"""
+        elapsed = (time.perf_counter() - started) * 1000
+        if not self.query_stats.is_slow(elapsed):
+            return
+        plan = None
+        if DB_SLOW_QUERY_EXPLAIN:
+            plan = '\n'.join(row[-1] for row in cur.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall())
+        self.query_stats.log_slow(getattr(self._operation, 'name', None), query, elapsed, plan)
+    
+    def _changes(self, cur, query, rows):
+        """executemany() returning the number of rows actually inserted or updated"""
+        before = self.conn.total_changes
+        cur.executemany(query, rows)
+        return self.conn.total_changes - before
+    
+    def _stream(self, query, params=(), chunk_size=None):
+        """Yield the rows of query in lists of chunk_size rows (default DB_STREAM_ITERSIZE)"""
+        chunk_size = chunk_size or self.stream_itersize
+        with self._cursor() as cur:
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    
+    def _fetch_frame(self, query, params, dtypes):
+        """Run query and return a DataFrame typed like StatsDatabase._fetch_frame"""
+        rows = self._fetchall(query, params)
+        if not rows:
+            return empty_frame(dtypes)
+        
+        # Une colonne par liste : pas de tableau objet 2D gardé vivant derrière les colonnes texte
+        frame = pd.DataFrame(dict(zip(dtypes, zip(*rows))))
+        # Dates déjà converties en date : pas d'aller-retour par le texte
+        frame['date'] = pd.to_datetime(frame['date']).astype(FRAME_DATE_DTYPE)
+        return frame.astype({column: dtype for column, dtype in dtypes.items() if column != 'date'})
+    
+    def get_schema_version(self):
+        """Schema version recorded in the database file (PRAGMA user_version)"""
+        return self._fetchall("PRAGMA user_version")[0][0]
+    
+    def ensure_schema(self):
+        """Run the DDL only when the database is behind SCHEMA_VERSION"""
+        if self.get_schema_version() >= SCHEMA_VERSION:
+            return False
+        self.create_tables()
+        return True
+    
+    def create_tables(self):
+        """Create tables if they don't exist (always runs the DDL)"""
+        def operation(cur):
+            for statement in SCHEMA:
+                cur.execute(statement)
+            # PRAGMA n'accepte pas de paramètre lié
+            cur.execute(f"PRAGMA user_version = {int(SCHEMA_VERSION)}")
+        self._run(operation)
+    
+    def _backfill_latest_tables(self, cur):
+        """Rebuild version_latest/modpack_latest from the most recent history rows"""
+        cur.execute("""
+            INSERT INTO version_latest
+            (platform, version_name, version_number, downloads, date_published, date)
+            SELECT platform, version_name, version_number, downloads, date_published, date
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY platform, version_name ORDER BY date DESC) AS row_rank
+                FROM version_stats
+            )
+            WHERE row_rank = 1
+            ON CONFLICT (platform, version_name) DO UPDATE SET
+                version_number = excluded.version_number,
+                downloads = excluded.downloads,
+                date_published = excluded.date_published,
+                date = excluded.date
+            WHERE version_latest.date <= excluded.date
+        """)
+        cur.execute("""
+            INSERT INTO modpack_latest
+            (platform, modpack_slug, modpack_name, downloads, followers, date)
+            SELECT platform, modpack_slug, modpack_name, downloads, followers, date
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY platform, modpack_slug ORDER BY date DESC) AS row_rank
+                FROM modpack_stats
+                WHERE modpack_slug IS NOT NULL
+            )
+            WHERE row_rank = 1
+            ON CONFLICT (platform, modpack_slug) DO UPDATE SET
+                modpack_name = excluded.modpack_name,
+                downloads = excluded.downloads,
+                followers = excluded.followers,
+                date = excluded.date
+            WHERE modpack_latest.date <= excluded.date
+        """)
+    
+    def _backfill_first_seen(self, cur):
+        """Rebuild modpack_first_seen from the earliest history row of each modpack"""
+        cur.execute("""
+            INSERT INTO modpack_first_seen (platform, modpack_slug, first_date, first_downloads)
+            SELECT platform, modpack_slug, date, downloads
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY platform, modpack_slug ORDER BY date) AS row_rank
+                FROM modpack_stats
+                WHERE modpack_slug IS NOT NULL
+            )
+            WHERE row_rank = 1
+            ON CONFLICT (platform, modpack_slug) DO UPDATE SET
+                first_date = excluded.first_date,
+                first_downloads = excluded.first_downloads
+            WHERE excluded.first_date <= modpack_first_seen.first_date
+        """)
+    
+    def _refresh_rollups(self, cur, since, sources):
+        """
+        Recompute every rollup period that starts on/after the period containing `since`
+        
+        Same rows as the PostgreSQL version (window functions instead of array_agg).
+        Returns the rollup tables that actually changed.
+        """
+        changed_tables = set()
+        for source in sources:
+            spec = ROLLUP_SOURCES[source]
+            keys = spec['keys']
+            value = spec['value']
+            group = ', '.join(['platform'] + keys + ['period_start'])
+            
+            columns = ['resolution', 'platform'] + keys + [
+                'period_start', 'last_date', value
+            ] + spec['extra'] + ['min_value', 'max_value', 'delta']
+            selects = ['?', 'platform'] + keys + [
+                'period_start', 'MAX(date)', 'MAX(last_value)'
+            ] + [f"MAX(last_{column})" for column in spec['extra']] + [
+                f"MIN({value})", f"MAX({value})", "MAX(last_value) - MAX(first_value)"
+            ]
+            lasts = ''.join(
+                f", FIRST_VALUE({column}) OVER latest AS last_{column}" for column in spec['extra']
+            )
+            refreshed = columns[len(keys) + 3:]
+            updates = ', '.join(f"{column} = excluded.{column}" for column in refreshed)
+            conditions = [f"{key} IS NOT NULL" for key in keys]
+            
+            for resolution in ROLLUP_RESOLUTIONS:
+                params = [resolution]
+                where = list(conditions)
+                if since:
+                    where.append("date >= ?")
+                    params.append(self._period_start(resolution, since))
+                before = self.conn.total_changes
+                cur.execute(f"""
+                    INSERT INTO {spec['rollup']} ({', '.join(columns)})
+                    SELECT {', '.join(selects)}
+                    FROM (
+                        SELECT *,
+                               FIRST_VALUE({value}) OVER latest AS last_value,
+                               FIRST_VALUE({value}) OVER (PARTITION BY {group} ORDER BY date) AS first_value
+                               {lasts}
+                        FROM (
+                            SELECT *, {PERIOD_START[resolution]} AS period_start
+                            FROM {spec['table']}
+                            {'WHERE ' + ' AND '.join(where) if where else ''}
+                        )
+                        WINDOW latest AS (PARTITION BY {group} ORDER BY date DESC)
+                    )
+                    WHERE true
+                    GROUP BY {group}
+                    ON CONFLICT (resolution, {group})
+                    DO UPDATE SET {updates}
+                    WHERE {_distinct(spec['rollup'], refreshed)}
+                """, params)
+                if self.conn.total_changes != before:
+                    changed_tables.add(spec['rollup'])
+        return changed_tables
+    
+    @staticmethod
+    def _period_start(resolution, day):
+        """Python equivalent of date_trunc(resolution, day)"""
+        if isinstance(day, datetime):
+            day = day.date()
+        if resolution == 'week':
+            return day - timedelta(days=day.weekday())
+        return day.replace(day=1)
+    
+    def _bump_versions(self, cur, tables, run_id):
+        """Increment the versions of tables (run_id is only sent by PostgreSQL's NOTIFY)"""
+        cur.executemany("""
+            INSERT INTO data_versions (table_name, version) VALUES (?, 1)
+            ON CONFLICT (table_name) DO UPDATE SET
+                version = data_versions.version + 1,
+                updated_at = CURRENT_TIMESTAMP
+        """, [(table,) for table in tables])
+        placeholders = ', '.join('?' * len(tables))
+        return dict(cur.execute(
+            f"SELECT table_name, version FROM data_versions WHERE table_name IN ({placeholders})",
+            tables
+        ).fetchall())
+    
+    def start_listener(self):
+        """No LISTEN/NOTIFY in SQLite: cached reads rely on data version polling"""
+    
+    def stop_listener(self):
+        """See start_listener()"""
+    
+    @staticmethod
+    def _cutoff(days):
+        """First excluded date of a `days` window (CURRENT_DATE - days), None for all history"""
+        if days is None:
+            return None
+        return datetime.now(timezone.utc).date() - timedelta(days=days)
+    
+    @staticmethod
+    def _limit(days):
+        """LIMIT value (SQLite: -1 = no limit)"""
+        return -1 if days is None else days
+    
+    def ensure_partitions(self, months_ahead=None):
+        """No partitions in SQLite (no-op, like an unpartitioned PostgreSQL database)"""
+    
+    def drop_partitions_before(self, cutoff, archive=False):
+        """No partitions in SQLite: nothing is removed"""
+        return []
+    
+    def compact_history(self, sources=None):
+        """SQLite history is always daily: nothing to compact"""
+        return 0
+    
+    @_instrumented
+    def save_daily_stats(self, platform, total_downloads, followers, versions_count):
+        """Save daily global statistics (returns {'written', 'unchanged'} row counts)"""
+        today = datetime.now(timezone.utc).date()
+        
+        def operation(cur):
+            written = self._changes(cur, f"""
+                INSERT INTO daily_stats (date, platform, total_downloads, followers, versions_count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (date, platform)
+                DO UPDATE SET
+                    total_downloads = excluded.total_downloads,
+                    followers = excluded.followers,
+                    versions_count = excluded.versions_count
+                WHERE {_distinct('daily_stats', ['total_downloads', 'followers', 'versions_count'])}
+            """, [(today, platform, total_downloads, followers, versions_count)])
+            return {'written': written, 'unchanged': 1 - written}
+        return self._track('daily', self._run(operation))
+    
+    def _upsert_version_rows(self, cur, rows):
+        """Upsert version rows (history + latest snapshot), skipping identical rows (no commit)"""
+        rows = self._dedupe_rows(rows, 2)
+        written = self._changes(cur, """
+            INSERT INTO version_stats
+            (date, platform, version_name, version_number, downloads, date_published)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (date, platform, version_name)
+            DO UPDATE SET
+                downloads = excluded.downloads
+            WHERE version_stats.downloads IS NOT excluded.downloads
+        """, rows)
+        cur.executemany(f"""
+            INSERT INTO version_latest
+            (date, platform, version_name, version_number, downloads, date_published)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (platform, version_name)
+            DO UPDATE SET
+                version_number = excluded.version_number,
+                downloads = excluded.downloads,
+                date_published = excluded.date_published,
+                date = excluded.date
+            WHERE version_latest.date <= excluded.date
+              AND ({_distinct('version_latest', ['date', 'version_number', 'downloads', 'date_published'])})
+        """, rows)
+        return {'written': written, 'unchanged': len(rows) - written}
+    
+    def _upsert_modpack_rows(self, cur, rows):
+        """Upsert modpack rows (history, latest snapshot, first seen), skipping identical rows"""
+        rows = self._dedupe_rows(rows, 3)
+        written = self._changes(cur, f"""
+            INSERT INTO modpack_stats
+            (date, platform, modpack_name, modpack_slug, downloads, followers)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (date, platform, modpack_slug)
+            DO UPDATE SET
+                downloads = excluded.downloads,
+                followers = excluded.followers
+            WHERE {_distinct('modpack_stats', ['downloads', 'followers'])}
+        """, rows)
+        cur.executemany(f"""
+            INSERT INTO modpack_latest
+            (date, platform, modpack_name, modpack_slug, downloads, followers)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (platform, modpack_slug)
+            DO UPDATE SET
+                modpack_name = excluded.modpack_name,
+                downloads = excluded.downloads,
+                followers = excluded.followers,
+                date = excluded.date
+            WHERE modpack_latest.date <= excluded.date
+              AND ({_distinct('modpack_latest', ['date', 'modpack_name', 'downloads', 'followers'])})
+        """, rows)
+        cur.executemany(f"""
+            INSERT INTO modpack_first_seen
+            (first_date, platform, modpack_slug, first_downloads)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (platform, modpack_slug)
+            DO UPDATE SET
+                first_date = excluded.first_date,
+                first_downloads = excluded.first_downloads
+            WHERE excluded.first_date <= modpack_first_seen.first_date
+              AND ({_distinct('modpack_first_seen', ['first_date', 'first_downloads'])})
+        """, [(row[0], row[1], row[3], row[4]) for row in rows])
+        return {'written': written, 'unchanged': len(rows) - written}
+    
+    @_instrumented
+    def bulk_load_modpack_stats(self, rows, platform, default_date=None):
+        """
+        Load modpack rows through a temporary staging table, then merge them with one
+        set-based upsert per table. Same input and {'written', 'unchanged'} result as
+        StatsDatabase.bulk_load_modpack_stats; the iterable is consumed lazily.
+        """
+        default_date = default_date or datetime.now(timezone.utc).date()
+        
+        with self._cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS modpack_stats_staging (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date DATE,
+                    platform VARCHAR(20),
+                    modpack_name VARCHAR(255),
+                    modpack_slug VARCHAR(255),
+                    downloads INTEGER,
+                    followers INTEGER
+                )
+            """)
+            cur.execute("DELETE FROM modpack_stats_staging")
+            cur.executemany("""
+                INSERT INTO modpack_stats_staging (date, platform, modpack_name, modpack_slug, downloads, followers)
+                VALUES (date(?), ?, ?, ?, ?, ?)
+            """, rows)
+            
+            # La dernière occurrence d'une clé l'emporte, comme avec les upserts ligne à ligne
+            staged_rows = """
+                SELECT seq, COALESCE(date, :day) AS date, COALESCE(platform, :platform) AS platform,
+                       COALESCE(modpack_name, '') AS modpack_name, modpack_slug,
+                       COALESCE(downloads, 0) AS downloads, COALESCE(followers, 0) AS followers
+                FROM modpack_stats_staging
+                WHERE modpack_slug IS NOT NULL
+            """
+            params = {'day': default_date, 'platform': platform}
+            staged = cur.execute(f"""
+                SELECT COUNT(*) FROM (SELECT DISTINCT date, platform, modpack_slug FROM ({staged_rows}))
+            """, params).fetchone()[0]
+            
+            before = self.conn.total_changes
+            cur.execute(f"""
+                INSERT INTO modpack_stats
+                (date, platform, modpack_name, modpack_slug, downloads, followers)
+                SELECT date, platform, modpack_name, modpack_slug, downloads, followers
+                FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY date, platform, modpack_slug ORDER BY seq DESC
+                    ) AS row_rank
+                    FROM ({staged_rows})
+                )
+                WHERE row_rank = 1
+                ON CONFLICT (date, platform, modpack_slug)
+                DO UPDATE SET
+                    downloads = excluded.downloads,
+                    followers = excluded.followers
+                WHERE {_distinct('modpack_stats', ['downloads', 'followers'])}
+            """, params)
+            written = self.conn.total_changes - before
+            
+            cur.execute(f"""
+                INSERT INTO modpack_latest
+                (date, platform, modpack_name, modpack_slug, downloads, followers)
+                SELECT date, platform, modpack_name, modpack_slug, downloads, followers
+                FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY platform, modpack_slug ORDER BY date DESC, seq DESC
+                    ) AS row_rank
+                    FROM ({staged_rows})
+                )
+                WHERE row_rank = 1
+                ON CONFLICT (platform, modpack_slug)
+                DO UPDATE SET
+                    modpack_name = excluded.modpack_name,
+                    downloads = excluded.downloads,
+                    followers = excluded.followers,
+                    date = excluded.date
+                WHERE modpack_latest.date <= excluded.date
+                  AND ({_distinct('modpack_latest', ['date', 'modpack_name', 'downloads', 'followers'])})
+            """, params)
+            
+            cur.execute(f"""
+                INSERT INTO modpack_first_seen
+                (first_date, platform, modpack_slug, first_downloads)
+                SELECT date, platform, modpack_slug, downloads
+                FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY platform, modpack_slug ORDER BY date, seq DESC
+                    ) AS row_rank
+                    FROM ({staged_rows})
+                )
+                WHERE row_rank = 1
+                ON CONFLICT (platform, modpack_slug)
+                DO UPDATE SET
+                    first_date = excluded.first_date,
+                    first_downloads = excluded.first_downloads
+                WHERE excluded.first_date <= modpack_first_seen.first_date
+                  AND ({_distinct('modpack_first_seen', ['first_date', 'first_downloads'])})
+            """, params)
+            cur.execute("DELETE FROM modpack_stats_staging")
+        
+        return self._track('modpack', {'written': written, 'unchanged': staged - written})
+    
+    def _history_sql(self, source, platform, key_value, days, resolution):
+        cutoff = self._cutoff(days)
+        if source == 'daily':
+            if resolution != 'day':
+                return ("""
+                    SELECT last_date, total_downloads, followers, versions_count
+                    FROM daily_stats_rollup
+                    WHERE resolution = ? AND platform = ?
+                      AND (? IS NULL OR last_date > ?)
+                    ORDER BY period_start DESC
+                """, (resolution, platform, cutoff, cutoff))
+            return ("""
+                SELECT date, total_downloads, followers, versions_count
+                FROM daily_stats
+                WHERE platform = ?
+                ORDER BY date DESC
+                LIMIT ?
+            """, (platform, self._limit(days)))
+        
+        spec = ROLLUP_SOURCES[source]
+        key = spec['keys'][0]
+        label = 'version_name' if source == 'version' else 'modpack_name'
+        if resolution != 'day':
+            return (f"""
+                SELECT last_date, {label}, downloads
+                FROM {spec['rollup']}
+                WHERE resolution = ? AND platform = ?
+                  AND (? IS NULL OR {key} = ?)
+                  AND (? IS NULL OR last_date > ?)
+                ORDER BY period_start DESC
+            """, (resolution, platform, key_value, key_value, cutoff, cutoff))
+        return (f"""
+            SELECT date, {label}, downloads
+            FROM {spec['table']}
+            WHERE platform = ?
+              AND (? IS NULL OR {key} = ?)
+            ORDER BY date DESC
+            LIMIT ?
+        """, (platform, key_value or None, key_value or None, self._limit(days)))
+    
+    def _series_sql(self, source, platform, keys, days, resolution):
+        marks = ', '.join('?' * len(keys))
+        cutoff = self._cutoff(days)
+        if source == 'daily':
+            if resolution != 'day':
+                return (f"""
+                    SELECT platform, last_date, total_downloads, followers, versions_count
+                    FROM daily_stats_rollup
+                    WHERE resolution = ? AND platform IN ({marks})
+                      AND (? IS NULL OR last_date > ?)
+                    ORDER BY platform, period_start DESC
+                """, [resolution, *keys, cutoff, cutoff])
+            return (f"""
+                SELECT platform, date, total_downloads, followers, versions_count
+                FROM (
+                    SELECT platform, date, total_downloads, followers, versions_count,
+                           ROW_NUMBER() OVER (PARTITION BY platform ORDER BY date DESC) AS row_rank
+                    FROM daily_stats
+                    WHERE platform IN ({marks})
+                )
+                WHERE ? IS NULL OR row_rank <= ?
+                ORDER BY platform, date DESC
+            """, [*keys, days, days])
+        
+        spec = ROLLUP_SOURCES[source]
+        key = spec['keys'][0]
+        label = 'version_name' if source == 'version' else 'modpack_name'
+        if resolution != 'day':
+            return (f"""
+                SELECT {key}, last_date, {label}, downloads
+                FROM {spec['rollup']}
+                WHERE resolution = ? AND platform = ? AND {key} IN ({marks})
+                  AND (? IS NULL OR last_date > ?)
+                ORDER BY {key}, period_start DESC
+            """, [resolution, platform, *keys, cutoff, cutoff])
+        return (f"""
+            SELECT {key}, date, {label}, downloads
+            FROM (
+                SELECT *,
+                       ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY date DESC) AS row_rank
+                FROM {spec['table']}
+                WHERE platform = ? AND {key} IN ({marks})
+            )
+            WHERE ? IS NULL OR row_rank <= ?
+            ORDER BY {key}, date DESC
+        """, [platform, *keys, days, days])
+    
+    def _page_sql(self, source, platform, key_value, limit, page_token):
+        params = {'platform': platform, 'fetch': limit + 1}
+        if source == 'daily':
+            after = ""
+            if page_token is not None:
+                params['date'], = decode_page_token('daily', page_token)
+                after = "AND date < :date"
+            return (f"""
+                SELECT date, total_downloads, followers, versions_count, date
+                FROM daily_stats
+                WHERE platform = :platform {after}
+                ORDER BY date DESC
+                LIMIT :fetch
+            """, params)
+        
+        key = SPARSE_SOURCES[source]['key']
+        label = 'version_name' if source == 'version' else 'modpack_name'
+        params['entity'] = key_value or None
+        after = ""
+        if page_token is not None:
+            params['date'], params['key'] = decode_page_token(source, page_token)
+            after = f"AND (date, platform, {key}) < (:date, :platform, :key)"
+        return (f"""
+            SELECT date, {label}, downloads, date, {key}
+            FROM {SPARSE_SOURCES[source]['table']}
+            WHERE platform = :platform AND {key} IS NOT NULL
+              AND (:entity IS NULL OR {key} = :entity) {after}
+            ORDER BY date DESC, platform DESC, {key} DESC
+            LIMIT :fetch
+        """, params)
+    
+    def _latest_page_sql(self, source, platform, limit, page_token):
+        kind = f"{source}_latest"
+        key = SPARSE_SOURCES[source]['key']
+        params = {'platform': platform, 'fetch': limit + 1}
+        after = ""
+        if page_token is not None:
+            params['key'], = decode_page_token(kind, page_token)
+            after = f"AND {key} > :key"
+        return (f"""
+            SELECT {LATEST_COLUMNS[source]}, {key}
+            FROM {kind}
+            WHERE platform = :platform {after}
+            ORDER BY {key}
+            LIMIT :fetch
+        """, params)
+    
+    def _latest_sql(self, source, platform):
+        return (f"""
+            SELECT {LATEST_COLUMNS[source]}
+            FROM {source}_latest
+            WHERE platform = ?
+            ORDER BY {SPARSE_SOURCES[source]['key']}
+        """, (platform,))
+    
+    def _growth_sql(self, platform, days):
+        return ("""
+            WITH stats AS (
+                SELECT date, total_downloads,
+                       LAG(total_downloads) OVER (ORDER BY date) as prev_downloads
+                FROM daily_stats
+                WHERE platform = ?
+                ORDER BY date DESC
+                LIMIT ?
+            )
+            SELECT
+                date,
+                total_downloads,
+                total_downloads - COALESCE(prev_downloads, 0) as daily_growth
+            FROM stats
+            ORDER BY date DESC
+        """, (platform, self._limit(days)))
+    
+    def _top_movers_sql(self, source, platform, window_days, limit):
+        spec = SPARSE_SOURCES[source]
+        key = spec['key']
+        label = 'version_number' if source == 'version' else 'modpack_name'
+        return (f"""
+            SELECT key, label, start_downloads, downloads,
+                   downloads - start_downloads AS growth,
+                   CAST(downloads - start_downloads AS REAL) * 100 / NULLIF(start_downloads, 0) AS growth_pct
+            FROM (
+                SELECT l.{key} AS key, l.{label} AS label, l.downloads,
+                       COALESCE(
+                           (SELECT s.downloads FROM {spec['table']} s
+                            WHERE s.platform = l.platform AND s.{key} = l.{key} AND s.date <= :cutoff
+                            ORDER BY s.date DESC LIMIT 1),
+                           (SELECT s.downloads FROM {spec['table']} s
+                            WHERE s.platform = l.platform AND s.{key} = l.{key}
+                            ORDER BY s.date LIMIT 1)
+                       ) AS start_downloads
+                FROM {source}_latest l
+                WHERE l.platform = :platform AND l.date > :cutoff
+            )
+            ORDER BY growth DESC, key
+            LIMIT :limit
+        """, {'platform': platform, 'cutoff': self._cutoff(window_days), 'limit': limit})
+    
+    def _initial_downloads_sql(self, platform, slugs):
+        query = """
+            SELECT modpack_slug, first_downloads, first_date
+            FROM modpack_first_seen
+            WHERE platform = ?
+        """
+        if slugs is None:
+            return query, [platform]
+        return query + f" AND modpack_slug IN ({', '.join('?' * len(slugs))})", [platform, *slugs]
+    
+    def _history_days_sql(self, source, platforms):
+        # date('now') est en UTC, comme CURRENT_DATE côté collecte
+        return (
+            f"SELECT CAST(julianday(date('now')) - julianday(MIN(date)) AS INTEGER) "
+            f"FROM {ROLLUP_SOURCES[source]['table']} WHERE platform IN ({', '.join('?' * len(platforms))})",
+            platforms
+        )
+    
+    def close(self):
+        """Close the database connection"""
+        self.cursor.close()
+        self.conn.close()
@@ -17,8 +17,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.core.api_clients import ModrinthClient, CurseForgeClient
 from src.core.modpack_manager import ModpackManager
-from src.core.database import StatsDatabase
-from src.config import DATABASE_URL, CACHE_TTL
+from src.core.database import open_database
+from src.config import DATABASE_URL, DB_POOL_SIZE, DB_CACHE_MAX_MB, CACHE_TTL
 
 
 # === PAGE CONFIG ===
@@ -249,26 +249,30 @@ st.markdown("""
 @st.cache_resource
 def get_clients():
     """Get clients"""
+    database = None
+    if DATABASE_URL:
+        database = open_database(DATABASE_URL, pool_size=DB_POOL_SIZE, cache_bytes=DB_CACHE_MAX_MB * 1024 * 1024)
+        # Invalidation du cache à la fin de chaque collecte (LISTEN/NOTIFY)
+        database.start_listener()
+    
     return {
         'modrinth': ModrinthClient(),
         'curseforge': CurseForgeClient(),
         'modpack_manager': ModpackManager(),
-        'database': StatsDatabase(DATABASE_URL) if DATABASE_URL else None
+        'database': database
     }
 
 
 @st.cache_data(ttl=CACHE_TTL)
-def load_all_data():
-    """Charge toutes les données"""
+def load_api_data():
+    """Charge les données des APIs et des modpacks"""
     clients = get_clients()
     
     data = {
         'modrinth': None,
         'curseforge': None,
         'modpacks': [],
-        'modpack_stats': {},
-        'database_modrinth': [],
-        'database_curseforge': []
+        'modpack_stats': {}
     }
     
     try:
@@ -288,11 +292,24 @@ def load_all_data():
     except:
         pass
     
+    return data
+
+
+def load_all_data():
+    """Charge toutes les données (l'historique passe par le cache de la base, invalidé par version)"""
+    clients = get_clients()
+    
+    data = dict(load_api_data())
+    data['database_modrinth'] = pd.DataFrame()
+    data['database_curseforge'] = pd.DataFrame()
+    
     # Charger historique database
     if clients['database']:
         try:
-            data['database_modrinth'] = clients['database'].get_daily_stats_history('modrinth', days=90)
-            data['database_curseforge'] = clients['database'].get_daily_stats_history('curseforge', days=90)
+            # Les deux plateformes en une requête
+            history = clients['database'].get_daily_stats_history_frames(['modrinth', 'curseforge'], days=90)
+            data['database_modrinth'] = history['modrinth']
+            data['database_curseforge'] = history['curseforge']
             data['initial_downloads'] = clients['database'].get_modpacks_initial_downloads('curseforge')
         except:
             pass
@@ -314,6 +331,8 @@ def main():
     with col2:
         if st.button("🔄"):
             st.cache_data.clear()
+            if get_clients()['database']:
+                get_clients()['database'].clear_cache()
             st.rerun()
     
     st.markdown("---")
@@ -360,14 +379,12 @@ def main():
     with c1:
         st.markdown("**📈 Downloads Evolution (Modrinth + CurseForge)**")
         
-        if data['database_modrinth'] or data['database_curseforge']:
+        if not data['database_modrinth'].empty or not data['database_curseforge'].empty:
             fig = go.Figure()
             
             # Modrinth
-            if data['database_modrinth']:
-                df_m = pd.DataFrame(data['database_modrinth'])
-                df_m['date'] = pd.to_datetime(df_m['date'])
-                df_m = df_m.sort_values('date').tail(days)
+            if not data['database_modrinth'].empty:
+                df_m = data['database_modrinth'].sort_values('date').tail(days)
                 
                 fig.add_trace(go.Scatter(
                     x=df_m['date'],
@@ -375,16 +392,14 @@ def main():
                     name='Modrinth',
                     mode='lines',
                     line=dict(color='#0ef', width=3),
-                    fill='tonexty' if not data['database_curseforge'] else 'tozeroy',
+                    fill='tonexty' if data['database_curseforge'].empty else 'tozeroy',
                     fillcolor='rgba(14, 255, 255, 0.2)',
                     hovertemplate='<b>Modrinth</b><br>%{x|%d/%m}<br>%{y:,}<extra></extra>'
                 ))
             
             # CurseForge
-            if data['database_curseforge']:
-                df_c = pd.DataFrame(data['database_curseforge'])
-                df_c['date'] = pd.to_datetime(df_c['date'])
-                df_c = df_c.sort_values('date').tail(days)
+            if not data['database_curseforge'].empty:
+                df_c = data['database_curseforge'].sort_values('date').tail(days)
                 
                 fig.add_trace(go.Scatter(
                     x=df_c['date'],
@@ -20,8 +20,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.core.api_clients import ModrinthClient, CurseForgeClient
 from src.core.modpack_manager import ModpackManager
-from src.core.database import StatsDatabase
-from src.config import DATABASE_URL, CACHE_TTL, LOGO_PATH, BANNER_PATH
+from src.core.database import open_database
+from src.config import DATABASE_URL, DB_POOL_SIZE, DB_CACHE_MAX_MB, CACHE_TTL, LOGO_PATH, BANNER_PATH
 
 
 # === PAGE CONFIG ===
@@ -524,9 +524,12 @@ def get_modpack_manager():
 
 @st.cache_resource
 def get_database():
-    """Singleton Database connection"""
+    """Singleton Database (connection pool and read cache shared by all sessions)"""
     try:
-        return StatsDatabase(DATABASE_URL)
+        db = open_database(DATABASE_URL, pool_size=DB_POOL_SIZE, cache_bytes=DB_CACHE_MAX_MB * 1024 * 1024)
+        # Invalidation du cache à la fin de chaque collecte (LISTEN/NOTIFY)
+        db.start_listener()
+        return db
     except Exception as e:
         st.error(f"❌ Database connection error: {e}")
         return None
@@ -556,17 +559,15 @@ def load_curseforge_stats():
         return None
 
 
-@st.cache_data(ttl=CACHE_TTL)
 def load_modpacks():
-    """Charge les modpacks avec cache"""
+    """Charge les modpacks (rechargés seulement si le fichier a changé)"""
     try:
         manager = get_modpack_manager()
-        modpacks = manager.load()
-        stats = manager.get_stats()
-        return modpacks, stats
+        manager.refresh()
+        return manager, manager.get_stats()
     except Exception as e:
         st.error(f"❌ Modpacks loading error: {e}")
-        return [], {}
+        return None, {}
 
 
 # === COMPONENTS ===
@@ -894,9 +895,9 @@ def render_modpacks_section():
     st.markdown("## 📦 Modpacks Ecosystem")
     st.caption("Modpacks featuring Create Nuclear")
     
-    modpacks, modpack_stats = load_modpacks()
+    manager, modpack_stats = load_modpacks()
     
-    if not modpacks:
+    if not manager or not modpack_stats.get('total'):
         st.warning("⚠️ No modpacks data available")
         st.info("💡 Run `python collect_stats.py` to generate modpacks data")
         return
@@ -941,38 +942,50 @@ def render_modpacks_section():
     with col3:
         show_stats_only = st.checkbox("📊 Only with stats", value=False, key="stats_filter")
     
-    # Filtrage
-    manager = get_modpack_manager()
-    manager._modpacks = modpacks
+    # Pagination
+    col1, col2 = st.columns([2, 6])
+    
+    with col1:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="modpack_page_size")
     
-    filtered = manager.filter_by_name(search) if search else modpacks
+    # Requête paginée : seule la page affichée est extraite et formatée
+    query_filter = {'name': search, 'with_downloads': show_stats_only}
+    sort = sort_options[sort_selection]
+    _, total_found = manager.query(query_filter, sort, offset=0, limit=0)
+    page_count = max(1, -(-total_found // page_size))
     
-    if show_stats_only:
-        filtered = [m for m in filtered if m.get('downloads', 0) > 0]
+    # Retour à la page 1 quand la recherche, le tri ou la taille de page change
+    # (et jamais au-delà de la dernière page)
+    view = (search, sort_selection, show_stats_only, page_size)
+    if st.session_state.get("modpack_view") != view or st.session_state.get("modpack_page", 1) > page_count:
+        st.session_state["modpack_view"] = view
+        st.session_state["modpack_page"] = 1
     
-    # Tri
-    sort_key, reverse = sort_options[sort_selection]
-    if sort_key == "downloads":
-        filtered = sorted(filtered, key=lambda x: x.get('downloads', 0), reverse=reverse)
-    else:
-        filtered = sorted(filtered, key=lambda x: x.get('name', '').lower(), reverse=reverse)
+    with col2:
+        page_number = st.number_input(
+            f"Page (1-{page_count})", min_value=1, max_value=page_count, step=1, key="modpack_page"
+        )
+    
+    page, _ = manager.query(query_filter, sort, offset=(page_number - 1) * page_size, limit=page_size)
     
-    st.success(f"✅ {len(filtered)} modpack(s) found")
+    st.success(f"✅ {total_found} modpack(s) found")
     
     # Tableau
-    if filtered:
-        # Charger les données historiques pour le calcul "Since Added"
+    if page:
+        # Charger les données historiques pour le calcul "Since Added" (page courante uniquement)
         db = get_database()
         initial_downloads = {}
         if db:
             try:
-                initial_downloads = db.get_modpacks_initial_downloads("curseforge")
+                initial_downloads = db.get_modpacks_initial_downloads(
+                    "curseforge", slugs=[m['slug'] for m in page if m.get('slug')]
+                )
             except Exception as e:
                 # Silencieux si erreur, on affichera juste le total
                 pass
-
-        modpacks_data = []
-        for m in filtered:
+        
+        rows = []
+        for m in page:
             current = m.get('downloads', 0)
             slug = m.get('slug')
             since_added = current
@@ -982,23 +995,16 @@ def render_modpacks_section():
                 initial = initial_downloads[slug]['downloads']
                 since_added = max(0, current - initial)
             
-            modpacks_data.append({
+            rows.append({
                 'Name': m['name'],
                 'ID': m.get('id', 'N/A'),
-                'Downloads': current,
-                'Since Added': since_added,
+                'Downloads': f"{current:,}" if current > 0 else "N/A",
+                'Since Added': f"+{since_added:,}" if since_added > 0 else "0",
                 'Link': m.get('link', 'N/A')
             })
         
-        df = pd.DataFrame(modpacks_data)
-        
-        # Format
-        display_df = df.copy()
-        display_df['Downloads'] = display_df['Downloads'].apply(lambda x: f"{x:,}" if x > 0 else "N/A")
-        display_df['Since Added'] = display_df['Since Added'].apply(lambda x: f"+{x:,}" if x > 0 else "0")
-        
         st.dataframe(
-            display_df,
+            pd.DataFrame(rows),
             use_container_width=True,
             hide_index=True,
             height=500,
@@ -1011,14 +1017,129 @@ def render_modpacks_section():
             }
         )
         
-        # Export
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download CSV",
-            data=csv,
-            file_name=f"modpacks_filtered_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        # Export (construit uniquement à la demande)
+        if st.checkbox("📦 Prepare CSV export of all results", value=False, key="modpack_export"):
+            matches, _ = manager.query(query_filter, sort, offset=0, limit=total_found)
+            initial_downloads = {}
+            if db:
+                try:
+                    initial_downloads = db.get_modpacks_initial_downloads("curseforge")
+                except Exception:
+                    pass
+            
+            export_df = pd.DataFrame([{
+                'Name': m['name'],
+                'ID': m.get('id', 'N/A'),
+                'Downloads': m.get('downloads', 0),
+                'Since Added': max(0, m.get('downloads', 0) - initial_downloads[m['slug']]['downloads'])
+                if m.get('slug') in initial_downloads else m.get('downloads', 0),
+                'Link': m.get('link', 'N/A')
+            } for m in matches])
+            
+            st.download_button(
+                label="📥 Download CSV",
+                data=export_df.to_csv(index=False),
+                file_name=f"modpacks_filtered_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv"
+            )
+
+
+def render_top_movers(db, platform, source, days):
+    """Classement des plus fortes progressions (get_top_movers) sur la période choisie"""
+    window = days or 30
+    movers = db.get_top_movers(platform, window_days=window, limit=10, source=source)
+    if not movers:
+        return
+    
+    st.markdown(f"#### 🚀 Top Movers ({window} days)")
+    movers_df = pd.DataFrame(movers, columns=['Key', 'Name', 'Start', 'Downloads', 'Growth', 'Growth %'])
+    if source == 'modpack':
+        movers_df = movers_df.drop(columns=['Key'])
+    else:
+        movers_df = movers_df.rename(columns={'Key': 'Version', 'Name': 'Number'})
+    movers_df['Start'] = movers_df['Start'].apply(lambda x: f"{x:,}")
+    movers_df['Downloads'] = movers_df['Downloads'].apply(lambda x: f"{x:,}")
+    movers_df['Growth'] = movers_df['Growth'].apply(lambda x: f"{x:+,}")
+    movers_df['Growth %'] = movers_df['Growth %'].apply(lambda x: "—" if pd.isna(x) else f"{x:+.1f}%")
+    st.dataframe(movers_df, use_container_width=True, hide_index=True)
+
+
+def render_history_pages(db, platform, source, key_value, page_size=100):
+    """Historique journalier complet d'une version/d'un modpack, chargé page par page à la demande"""
+    state_key = f"history_pages_{source}_{platform}_{key_value}"
+    pages = st.session_state.setdefault(state_key, {'rows': [], 'token': None, 'done': False})
+    getter = db.get_version_stats_history_page if source == 'version' else db.get_modpack_stats_history_page
+    
+    with st.expander("📜 Full History"):
+        label = "⬇️ Load more" if pages['rows'] else "⬇️ Load history"
+        if not pages['done'] and st.button(label, key=f"{state_key}_more"):
+            # Le jeton reprend après la dernière ligne chargée : chaque page coûte le même prix
+            rows, pages['token'] = getter(platform, key_value, limit=page_size, page_token=pages['token'])
+            pages['rows'].extend(rows)
+            pages['done'] = pages['token'] is None
+        
+        if pages['rows']:
+            history_df = pd.DataFrame(pages['rows'], columns=['Date', 'Name', 'Downloads'])
+            history_df['Downloads'] = history_df['Downloads'].apply(lambda x: f"{x:,}")
+            st.dataframe(history_df, use_container_width=True, hide_index=True, height=400)
+            st.caption(f"{len(history_df):,} days loaded" + (" (complete)" if pages['done'] else ""))
+
+
+def render_query_diagnostics(db):
+    """Latences par méthode de la base et journal des requêtes lentes"""
+    query_stats = db.query_stats
+    
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.markdown("### 🩺 Query Diagnostics")
+        st.caption(f"Since {query_stats.since:%Y-%m-%d %H:%M:%S} (this dashboard process)")
+    with col2:
+        st.write("")  # Spacing
+        if st.button("♻️ Reset", key="reset_query_stats"):
+            query_stats.reset()
+            st.rerun()
+    
+    summary = query_stats.summary()
+    if not summary:
+        st.info("No queries recorded yet")
+        return
+    
+    stats_df = pd.DataFrame(summary).drop(columns=['histogram'])
+    stats_df['bytes'] = stats_df['bytes'] / 1024
+    stats_df = stats_df.rename(columns={
+        'method': 'Method', 'calls': 'Calls', 'errors': 'Errors', 'total_ms': 'Total (ms)',
+        'mean_ms': 'Mean (ms)', 'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)', 'p99_ms': 'p99 (ms)',
+        'max_ms': 'Max (ms)', 'rows': 'Rows', 'bytes': 'KiB'
+    })
+    st.dataframe(stats_df.round(1), use_container_width=True, hide_index=True)
+    
+    # Histogramme des latences de la méthode choisie
+    method = st.selectbox("Latency histogram", [row['method'] for row in summary], key="db_stats_method")
+    histogram = next(row['histogram'] for row in summary if row['method'] == method)
+    fig = go.Figure(go.Bar(
+        x=[f"≤ {bound} ms" if bound != 'inf' else "> 10000 ms" for bound in histogram],
+        y=list(histogram.values()),
+        marker_color='#48ff91'
+    ))
+    fig.update_layout(
+        template='plotly_dark',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        height=300,
+        margin=dict(l=0, r=0, t=20, b=0)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    slow = query_stats.slow_queries()
+    threshold = f"> {query_stats.slow_ms:.0f} ms" if query_stats.slow_ms else "disabled"
+    st.markdown(f"#### 🐢 Slow Queries ({threshold})")
+    if not slow:
+        st.caption("No slow query logged")
+    for entry in slow:
+        with st.expander(f"{entry['at']:%H:%M:%S} · {entry['method']} · {entry['duration_ms']:,.0f} ms"):
+            st.code(entry['query'].strip(), language='sql')
+            if entry['plan']:
+                st.code(entry['plan'], language='text')
 
 
 def render_database_analysis():
@@ -1060,33 +1181,36 @@ def render_database_analysis():
     with col3:
         st.write("")  # Spacing
         if st.button("🔄 Refresh Data", key="refresh_db"):
-            st.cache_data.clear()
+            # Le cache de la base suit déjà les versions des tables : on ne vide que lui
+            db.clear_cache()
             st.rerun()
             
     st.divider()
     
     # Tabs pour les différentes vues
-    tab_global, tab_versions, tab_modpacks = st.tabs(["🌍 Global Stats", "📦 Versions Analytics", "📚 Modpacks Analytics"])
+    tab_global, tab_versions, tab_modpacks, tab_diagnostics = st.tabs(
+        ["🌍 Global Stats", "📦 Versions Analytics", "📚 Modpacks Analytics", "🩺 Diagnostics"]
+    )
     
     # === TAB 1: GLOBAL STATS ===
     with tab_global:
         # Charger données
         with st.spinner("Loading historical data..."):
-            history = db.get_daily_stats_history(platform, days=days)
+            df = db.get_daily_stats_history_frame(platform, days=days, resolution='auto')
         
-        if not history or len(history) == 0:
+        if df.empty:
             st.warning("⚠️ No historical data available for this period")
         else:
-            # Préparer DataFrame
-            df = pd.DataFrame(history, columns=['date', 'total_downloads', 'followers', 'versions_count'])
-            df['date'] = pd.to_datetime(df['date'])
+            # DataFrame déjà typé (dates en datetime64)
             df = df.sort_values('date')
             
             # Calculer métriques
             total_current = df['total_downloads'].iloc[-1] if len(df) > 0 else 0
             total_start = df['total_downloads'].iloc[0] if len(df) > 0 else 0
             growth = total_current - total_start
-            avg_daily = growth / len(df) if len(df) > 1 else 0
+            # Les longues périodes sont agrégées par semaine/mois : raisonner en jours calendaires
+            days_count = (df['date'].iloc[-1] - df['date'].iloc[0]).days + 1 if len(df) > 0 else 0
+            avg_daily = growth / days_count if len(df) > 1 else 0
             
             # Métriques summary
             col1, col2, col3, col4 = st.columns(4)
@@ -1101,7 +1225,6 @@ def render_database_analysis():
                 render_stat_card("📅", "Avg Daily", f"+{avg_daily:,.0f}")
             
             with col4:
-                days_count = len(df)
                 render_stat_card("🗓️", "Days Tracked", str(days_count))
             
             st.markdown("### 📈 Downloads Evolution")
@@ -1158,9 +1281,9 @@ def render_database_analysis():
             display_df['date'] = display_df['date'].dt.strftime('%Y-%m-%d')
             display_df['daily_growth'] = df['total_downloads'].diff().fillna(0).astype(int)
             
-            display_df.columns = ['Date', 'Total Downloads', 'Followers', 'Versions', 'Daily Growth']
+            display_df.columns = ['Date', 'Total Downloads', 'Followers', 'Versions', 'Growth']
             display_df['Total Downloads'] = display_df['Total Downloads'].apply(lambda x: f"{x:,}")
-            display_df['Daily Growth'] = display_df['Daily Growth'].apply(lambda x: f"+{x:,}" if x > 0 else str(x))
+            display_df['Growth'] = display_df['Growth'].apply(lambda x: f"+{x:,}" if x > 0 else str(x))
             
             st.dataframe(display_df.iloc[::-1], use_container_width=True, hide_index=True, height=400)
 
@@ -1175,13 +1298,19 @@ def render_database_analysis():
         else:
             version_names = [v[0] for v in versions_list]
             selected_version = st.selectbox("Select Version", version_names, key="db_version_select")
+            compared_versions = st.multiselect(
+                "Compare with",
+                [name for name in version_names if name != selected_version],
+                key="db_version_compare"
+            )
             
-            # Charger historique version
-            v_history = db.get_version_stats_history(platform, selected_version, days=days)
+            # Charger l'historique de la version et des versions comparées (une seule requête)
+            v_frames = db.get_version_stats_history_frames(
+                platform, [selected_version] + compared_versions, days=days, resolution='auto'
+            )
+            v_df = v_frames[selected_version]
             
-            if v_history:
-                v_df = pd.DataFrame(v_history, columns=['date', 'version_name', 'downloads'])
-                v_df['date'] = pd.to_datetime(v_df['date'])
+            if not v_df.empty:
                 v_df = v_df.sort_values('date')
                 
                 # Métriques version
@@ -1206,6 +1335,10 @@ def render_database_analysis():
                     fillcolor='rgba(183, 148, 246, 0.1)'
                 ))
                 
+                for name in compared_versions:
+                    c_df = v_frames[name].sort_values('date')
+                    fig_v.add_trace(go.Scatter(x=c_df['date'], y=c_df['downloads'], mode='lines', name=name))
+                
                 fig_v.update_layout(
                     template='plotly_dark',
                     paper_bgcolor='rgba(0,0,0,0)',
@@ -1218,6 +1351,10 @@ def render_database_analysis():
                 
                 # Tableau Version
                 st.dataframe(v_df.sort_values('date', ascending=False), use_container_width=True, hide_index=True)
+                
+                render_history_pages(db, platform, 'version', selected_version)
+            
+            render_top_movers(db, platform, 'version', days)
 
     # === TAB 3: MODPACKS ANALYTICS ===
     with tab_modpacks:
@@ -1234,13 +1371,20 @@ def render_database_analysis():
             
             selected_modpack_label = st.selectbox("Select Modpack", list(modpack_options.keys()), key="db_modpack_select")
             selected_slug = modpack_options[selected_modpack_label]
+            compared_labels = st.multiselect(
+                "Compare with",
+                [label for label in modpack_options if label != selected_modpack_label],
+                key="db_modpack_compare"
+            )
+            compared_slugs = [modpack_options[label] for label in compared_labels]
             
-            # Charger historique modpack
-            m_history = db.get_modpack_stats_history(platform, selected_slug, days=days)
+            # Charger l'historique du modpack et des modpacks comparés (une seule requête)
+            m_frames = db.get_modpack_stats_history_frames(
+                platform, [selected_slug] + compared_slugs, days=days, resolution='auto'
+            )
+            m_df = m_frames[selected_slug]
             
-            if m_history:
-                m_df = pd.DataFrame(m_history, columns=['date', 'modpack_name', 'downloads'])
-                m_df['date'] = pd.to_datetime(m_df['date'])
+            if not m_df.empty:
                 m_df = m_df.sort_values('date')
                 
                 # Métriques modpack
@@ -1265,6 +1409,13 @@ def render_database_analysis():
                     fillcolor='rgba(72, 255, 145, 0.1)'
                 ))
                 
+                for slug in compared_slugs:
+                    c_df = m_frames[slug].sort_values('date')
+                    if not c_df.empty:
+                        fig_m.add_trace(go.Scatter(
+                            x=c_df['date'], y=c_df['downloads'], mode='lines', name=c_df['modpack_name'].iloc[-1]
+                        ))
+                
                 fig_m.update_layout(
                     template='plotly_dark',
                     paper_bgcolor='rgba(0,0,0,0)',
@@ -1277,6 +1428,14 @@ def render_database_analysis():
                 
                 # Tableau Modpack
                 st.dataframe(m_df.sort_values('date', ascending=False), use_container_width=True, hide_index=True)
+                
+                render_history_pages(db, platform, 'modpack', selected_slug)
+            
+            render_top_movers(db, platform, 'modpack', days)
+    
+    # === TAB 4: DIAGNOSTICS ===
+    with tab_diagnostics:
+        render_query_diagnostics(db)
     
 
 
@@ -0,0 +1,65 @@
+"""
+Fixtures communes des tests de la base de stats
+
+SQLite en mémoire toujours ; PostgreSQL seulement si TEST_DATABASE_URL pointe vers
+une base jetable (son schéma public est recréé à chaque test).
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.database import open_database
+
+
+def _postgres_url():
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip("TEST_DATABASE_URL non défini")
+    import psycopg2
+    conn = psycopg2.connect(url)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA public CASCADE")
+        cur.execute("CREATE SCHEMA public")
+    conn.close()
+    return url
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def db(request):
+    """Base vide, SQLite puis PostgreSQL"""
+    if request.param == 'sqlite':
+        return open_database('sqlite://')
+    return open_database(_postgres_url())
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def open_db(request):
+    """Ouvre une base vide avec des options du constructeur, SQLite puis PostgreSQL"""
+    url = 'sqlite://' if request.param == 'sqlite' else _postgres_url()
+    return lambda **kwargs: open_database(url, **kwargs)
+
+
+@pytest.fixture
+def pg_url():
+    """URL d'une base PostgreSQL vide (pour l'ouvrir avec d'autres options)"""
+    return _postgres_url()
+
+
+@pytest.fixture
+def pg_db(pg_url):
+    """Base PostgreSQL vide"""
+    return open_database(pg_url)
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def db_url(request, tmp_path):
+    """URL d'une base vide que plusieurs instances peuvent ouvrir (fichier SQLite, puis PostgreSQL)"""
+    if request.param == 'sqlite':
+        return f"sqlite:///{tmp_path / 'stats.db'}"
+    return _postgres_url()
@@ -0,0 +1,140 @@
+"""AsyncStatsDatabase : mêmes résultats que StatsDatabase, écritures jamais rejouées"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+import pytest
+from pandas.testing import assert_frame_equal
+
+from src.core.async_database import AsyncStatsDatabase
+from src.core.database import open_database
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+def _run(coroutine_function, url):
+    """Exécute coroutine_function(db) sur une AsyncStatsDatabase ouverte le temps de l'appel"""
+    async def main():
+        async with AsyncStatsDatabase(url) as db:
+            return await coroutine_function(db)
+    return asyncio.run(main())
+
+
+async def _save(db):
+    await db.save_daily_stats('modrinth', 1000, 5, 3)
+    await db.save_version_stats('modrinth', [
+        {'name': 'v0', 'version_number': '1.0', 'downloads': 500, 'date_published': '2024-01-01T12:00:00Z'},
+        {'name': 'v1', 'version_number': '1.1', 'downloads': 50, 'date_published': 'invalide'},
+    ])
+    await db.save_modpack_stats('modrinth', [
+        {'title': 'Pack 0', 'slug': 'pack-0', 'downloads': 90, 'follows': 2},
+        {'name': 'Pack 1', 'slug': 'pack-1', 'downloads': 9},
+    ])
+    return await db.bump_data_versions()
+
+
+async def _getters(db):
+    results = {}
+    for resolution in ('day', 'week'):
+        results['daily', resolution] = await db.get_daily_stats_history('modrinth', resolution=resolution)
+        results['versions', resolution] = await db.get_version_stats_history('modrinth', resolution=resolution)
+        results['modpack', resolution] = await db.get_modpack_stats_history(
+            'modrinth', 'pack-0', resolution=resolution)
+        results['frames', resolution] = await db.get_modpack_stats_history_frames(
+            'modrinth', ['pack-0', 'pack-1', 'missing'], resolution=resolution)
+    results['growth'] = await db.get_download_growth('modrinth')
+    results['versions_latest'] = await db.get_all_versions_latest('modrinth')
+    results['modpacks_latest'] = await db.get_all_modpacks_latest('modrinth')
+    results['initial'] = await db.get_modpacks_initial_downloads('modrinth')
+    results['initial_some'] = await db.get_modpacks_initial_downloads('modrinth', ['pack-1', 'missing'])
+    results['movers'] = await db.get_top_movers('modrinth', 7)
+    return results
+
+
+def test_async_getters_match_sync(pg_url):
+    sync = open_database(pg_url)
+    rows = [(TODAY - timedelta(offset), 'modrinth', 'Pack 0', 'pack-0', 50 - offset, 1) for offset in (9, 4)]
+    for row in rows:
+        sync._run(lambda cur: sync._upsert_modpack_rows(cur, [row]))
+    _run(_save, pg_url)
+    
+    results = _run(_getters, pg_url)
+    expected = {
+        ('daily', resolution): sync.get_daily_stats_history('modrinth', resolution=resolution)
+        for resolution in ('day', 'week')
+    }
+    for resolution in ('day', 'week'):
+        expected['versions', resolution] = sync.get_version_stats_history('modrinth', resolution=resolution)
+        expected['modpack', resolution] = sync.get_modpack_stats_history('modrinth', 'pack-0', resolution=resolution)
+        expected['frames', resolution] = sync.get_modpack_stats_history_frames(
+            'modrinth', ['pack-0', 'pack-1', 'missing'], resolution=resolution)
+    expected['growth'] = sync.get_download_growth('modrinth')
+    expected['versions_latest'] = sync.get_all_versions_latest('modrinth')
+    expected['modpacks_latest'] = sync.get_all_modpacks_latest('modrinth')
+    expected['initial'] = sync.get_modpacks_initial_downloads('modrinth')
+    expected['initial_some'] = sync.get_modpacks_initial_downloads('modrinth', ['pack-1', 'missing'])
+    expected['movers'] = sync.get_top_movers('modrinth', 7)
+    
+    for label, value in expected.items():
+        if label[0] == 'frames':
+            assert list(results[label]) == list(value), label
+            for key, frame in value.items():
+                assert_frame_equal(results[label][key], frame, obj=str(label))
+        elif isinstance(value, list):
+            assert [tuple(row) for row in results[label]] == [tuple(row) for row in value], label
+        else:
+            assert results[label] == value, label
+    assert results['initial']['pack-0']['downloads'] == 41
+    assert sync.get_all_versions_latest('modrinth')[1][3] is None
+    sync.close()
+
+
+def test_bump_publishes_each_table_once(pg_url):
+    before = open_database(pg_url).get_data_versions()
+    bumped = _run(_save, pg_url)
+    assert {'daily_stats', 'version_stats', 'modpack_stats', 'modpack_first_seen'} <= set(bumped)
+    assert all(version == before.get(table, 0) + 1 for table, version in bumped.items())
+    assert _run(lambda db: db.get_data_versions(), pg_url) == {**before, **bumped}
+
+
+@pytest.mark.parametrize('read', [True, False])
+def test_only_reads_are_retried(pg_url, read):
+    calls = []
+    
+    async def operation(conn):
+        calls.append(conn)
+        if len(calls) == 1:
+            raise ConnectionError("connexion perdue après le commit")
+        return await conn.fetchval("SELECT 1")
+    
+    if read:
+        assert _run(lambda db: db._run(operation, read=True), pg_url) == 1
+        assert len(calls) == 2
+    else:
+        with pytest.raises(ConnectionError):
+            _run(lambda db: db._run(operation), pg_url)
+        assert len(calls) == 1
+
+
+@pytest.mark.parametrize('read', [True, False])
+def test_sync_only_reads_are_retried(pg_url, read):
+    db = open_database(pg_url)
+    calls = []
+    
+    def operation(cur):
+        calls.append(cur)
+        if len(calls) == 1:
+            raise psycopg2.OperationalError("connexion perdue après le commit")
+        cur.execute("SELECT 1")
+        return cur.fetchone()[0]
+    
+    if read:
+        assert db._run(operation, read=True) == 1
+        assert len(calls) == 2
+    else:
+        with pytest.raises(psycopg2.OperationalError):
+            db._run(operation)
+        assert len(calls) == 1
+    db.close()
@@ -0,0 +1,120 @@
+"""Mêmes appels sur SQLite et PostgreSQL : mêmes résultats"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from src.core.database import open_database
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+def _load(db, generator, days=50):
+    """Même historique (graine commune) chargé par les savers de chaque backend"""
+    for offset in range(days, 0, -1):
+        day = TODAY - timedelta(offset)
+        versions = [(day, platform, f"v{number}", f"1.{number}", 100 * number + days - offset + generator.randrange(3),
+                     datetime(2024, 1, number + 1, 12)) for platform in ('modrinth', 'curseforge')
+                    for number in range(3) if generator.random() > 0.2]
+        modpacks = [(day, platform, f"Pack {number} ({offset // 20})", f"pack-{number}",
+                     10 * number + (days - offset) // 3, number) for platform in ('modrinth', 'curseforge')
+                    for number in range(4) if generator.random() > 0.2]
+        db._run(lambda cur: db._upsert_version_rows(cur, versions))
+        db._run(lambda cur: db._upsert_modpack_rows(cur, modpacks))
+    for platform, downloads in (('modrinth', 1000), ('curseforge', 2000)):
+        db.save_daily_stats(platform, downloads, 5, 3)
+    db.save_version_stats('modrinth', [{'name': 'v0', 'version_number': '1.0', 'downloads': 500,
+                                        'date_published': '2024-01-01T12:00:00Z'}])
+    db.save_modpack_stats('curseforge', [{'title': 'Pack 1 (0)', 'slug': 'pack-1', 'downloads': 999}])
+    db.bulk_load_modpack_stats([(TODAY - timedelta(2), None, 'Pack 9', 'pack-9', 7, 0)], 'modrinth')
+    db.refresh_all_rollups()
+
+
+def _calls(db):
+    """Résultat de chaque getter, sous une forme comparable entre backends"""
+    results = {}
+    for days in (None, 3, 20):
+        for resolution in ('day', 'week', 'month'):
+            for platform in ('modrinth', 'curseforge'):
+                args = (platform, days, resolution)
+                results['daily', args] = db.get_daily_stats_history(platform, days=days, resolution=resolution)
+                results['daily_frame', args] = db.get_daily_stats_history_frame(
+                    platform, days=days, resolution=resolution)
+                results['versions', args] = db.get_version_stats_history(platform, days=days, resolution=resolution)
+                results['version', args] = db.get_version_stats_history(
+                    platform, 'v1', days=days, resolution=resolution)
+                results['modpack', args] = db.get_modpack_stats_history(
+                    platform, 'pack-2', days=days, resolution=resolution)
+                results['modpack_frames', args] = db.get_modpack_stats_history_frames(
+                    platform, ['pack-0', 'pack-3', 'missing'], days=days, resolution=resolution)
+            results['daily_frames', days, resolution] = db.get_daily_stats_history_frames(
+                ['modrinth', 'curseforge'], days=days, resolution=resolution)
+    for platform in ('modrinth', 'curseforge'):
+        results['growth', platform] = db.get_download_growth(platform, days=5)
+        results['versions_latest', platform] = db.get_all_versions_latest(platform)
+        results['modpacks_latest', platform] = db.get_all_modpacks_latest(platform)
+        results['initial', platform] = db.get_modpacks_initial_downloads(platform)
+        results['initial_some', platform] = db.get_modpacks_initial_downloads(platform, ['pack-1', 'missing'])
+        for source in ('modpack', 'version'):
+            results['movers', platform, source] = db.get_top_movers(platform, 10, 5, source)
+        for limit in (1, 7):
+            results['pages', platform, limit] = _pages(
+                lambda token: db.get_modpack_stats_history_page(platform, limit=limit, page_token=token))
+            results['daily_pages', platform, limit] = _pages(
+                lambda token: db.get_daily_stats_history_page(platform, limit=limit, page_token=token))
+            results['latest_pages', platform, limit] = _pages(
+                lambda token: db.get_versions_latest_page(platform, limit=limit, page_token=token))
+    return results
+
+
+def _pages(fetch):
+    """Toutes les pages d'un getter à curseur, mises bout à bout"""
+    rows, token = fetch(None)
+    while token is not None:
+        page, token = fetch(token)
+        rows += page
+    return rows
+
+
+def _rounded(row):
+    # growth_pct : REAL SQLite contre float8 PostgreSQL
+    return tuple(round(item, 9) if isinstance(item, float) else item for item in row)
+
+
+def _assert_same(expected, value, label):
+    if isinstance(expected, pd.DataFrame):
+        assert_frame_equal(value, expected, obj=str(label))
+    elif isinstance(expected, dict) and expected and isinstance(next(iter(expected.values())), pd.DataFrame):
+        assert list(value) == list(expected), label
+        for key, frame in expected.items():
+            assert_frame_equal(value[key], frame, obj=str(label))
+    elif isinstance(expected, list) and label[0] == 'versions':
+        # Tri par date (ou période) seule : l'ordre des versions d'un même jour est libre
+        assert sorted(map(_rounded, value)) == sorted(map(_rounded, expected)), label
+    elif isinstance(expected, list):
+        assert [_rounded(row) for row in value] == [_rounded(row) for row in expected], label
+    else:
+        assert value == expected, label
+
+
+def test_backends_return_the_same_results(pg_url):
+    sqlite, postgres = open_database('sqlite://'), open_database(pg_url, sparse=False)
+    for db in (sqlite, postgres):
+        _load(db, random.Random(42))
+    
+    expected = _calls(postgres)
+    results = _calls(sqlite)
+    assert results.keys() == expected.keys()
+    for label, value in expected.items():
+        _assert_same(value, results[label], label)
+    assert sqlite.bump_data_versions() == postgres.bump_data_versions()
+
+
+def test_sqlite_refuses_sparse_history():
+    with pytest.raises(ValueError):
+        open_database('sqlite://', sparse=True)
+    assert open_database('sqlite://', sparse=False).sparse is False
@@ -0,0 +1,100 @@
+"""Getters d'historique groupés (plusieurs plateformes / entités en une requête)"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pandas.testing import assert_frame_equal
+
+from src.core.database import open_database
+from src.core.sqlite_database import SQLiteStatsDatabase
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+PLATFORMS = ['curseforge', 'modrinth', 'ftb']
+
+
+def _load(db, generator, days=60):
+    """Historique avec trous : 3 plateformes, 4 versions et 4 modpacks par plateforme"""
+    mark = '?' if isinstance(db, SQLiteStatsDatabase) else '%s'
+    for offset in range(days, -1, -1):
+        day = TODAY - timedelta(offset)
+        for index, platform in enumerate(PLATFORMS):
+            # ftb s'arrête 20 jours avant les autres
+            if platform == 'ftb' and offset < 20:
+                continue
+            if generator.random() > 0.2:
+                db._run(lambda cur: cur.execute(
+                    f"INSERT INTO daily_stats (date, platform, total_downloads, followers, versions_count) "
+                    f"VALUES ({mark}, {mark}, {mark}, {mark}, {mark})",
+                    (day, platform, 1000 * index + 10 * (days - offset), offset, 4)
+                ))
+            versions = [(day, platform, f"v{number}", f"1.{number}",
+                         100 * number + days - offset + generator.randrange(3), None)
+                        for number in range(4) if generator.random() > 0.3]
+            modpacks = [(day, platform, f"Pack {number}", f"pack-{number}", 50 * number + (days - offset) // 7, 0)
+                        for number in range(4) if generator.random() > 0.3]
+            db._run(lambda cur: db._upsert_version_rows(cur, versions))
+            db._run(lambda cur: db._upsert_modpack_rows(cur, modpacks))
+    db.refresh_all_rollups()
+
+
+def _assert_frames(frames, expected):
+    assert list(frames) == list(expected)
+    for key, frame in expected.items():
+        assert_frame_equal(frames[key], frame)
+
+
+@pytest.mark.parametrize('resolution', ['day', 'week', 'month'])
+@pytest.mark.parametrize('days', [None, 5, 40])
+def test_daily_frames_match_single_platform_frames(db, resolution, days):
+    _load(db, random.Random(45))
+    platforms = PLATFORMS + ['missing']
+    
+    frames = db.get_daily_stats_history_frames(platforms, days=days, resolution=resolution)
+    _assert_frames(frames, {platform: db.get_daily_stats_history_frame(platform, days=days, resolution=resolution)
+                            for platform in platforms})
+    assert frames['missing'].empty
+
+
+@pytest.mark.parametrize('resolution', ['day', 'week', 'month'])
+@pytest.mark.parametrize('days', [None, 5, 40])
+def test_entity_frames_match_single_entity_frames(db, resolution, days):
+    _load(db, random.Random(46))
+    versions = ['v3', 'v0', 'missing', 'v2']
+    slugs = ['pack-1', 'missing', 'pack-0', 'pack-3']
+    
+    for platform in PLATFORMS:
+        frames = db.get_version_stats_history_frames(platform, versions, days=days, resolution=resolution)
+        _assert_frames(frames, {
+            name: db.get_version_stats_history_frame(platform, name, days=days, resolution=resolution)
+            for name in versions
+        })
+        frames = db.get_modpack_stats_history_frames(platform, slugs, days=days, resolution=resolution)
+        _assert_frames(frames, {
+            slug: db.get_modpack_stats_history_frame(platform, slug, days=days, resolution=resolution)
+            for slug in slugs
+        })
+        assert frames['missing'].empty
+
+
+def test_batched_getters_with_no_keys(db):
+    _load(db, random.Random(47), days=5)
+    assert db.get_daily_stats_history_frames([]) == {}
+    assert db.get_version_stats_history_frames('curseforge', []) == {}
+    assert db.get_modpack_stats_history_frames('curseforge', iter([])) == {}
+
+
+def test_sparse_entity_frames_match_single_entity_frames(pg_url):
+    db = open_database(pg_url, sparse=True)
+    _load(db, random.Random(48))
+    slugs = ['pack-0', 'pack-2', 'missing']
+    
+    for days in (40, 5, None):
+        frames = db.get_modpack_stats_history_frames('modrinth', slugs, days=days)
+        _assert_frames(frames, {slug: db.get_modpack_stats_history_frame('modrinth', slug, days=days)
+                                for slug in slugs})
+    # Plateaux d'une semaine : moins de lignes stockées que de jours relus
+    stored = db._fetchall("SELECT COUNT(*) FROM modpack_stats WHERE platform = 'modrinth' AND modpack_slug = 'pack-0'")
+    assert stored[0][0] < len(frames['pack-0'])
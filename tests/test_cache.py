@@ -0,0 +1,62 @@
+"""Cache des getters, invalidé par les versions de données (data_versions)"""
+
+import pytest
+
+import src.core.database
+from src.core.database import open_database
+
+
+MODPACKS = [{'title': f"Pack {index}", 'slug': f"pack-{index}", 'downloads': index} for index in range(3)]
+VERSIONS = [{'name': 'v1', 'version_number': '1', 'downloads': 5}]
+
+
+def _hits(db):
+    return db.cache.stats()['hits']
+
+
+def test_bump_invalidates_only_the_written_tables(open_db):
+    db = open_db(cache_bytes=1 << 20)
+    db.save_modpack_stats('curseforge', MODPACKS)
+    db.save_version_stats('curseforge', VERSIONS)
+    db.bump_data_versions()
+    
+    modpacks = db.get_all_modpacks_latest('curseforge')
+    versions = db.get_all_versions_latest('curseforge')
+    hits = _hits(db)
+    assert db.get_all_modpacks_latest('curseforge') == modpacks
+    assert db.get_all_versions_latest('curseforge') == versions
+    assert _hits(db) == hits + 2
+    
+    # Écriture non publiée : le cache sert encore l'ancien résultat
+    db.save_modpack_stats('curseforge', [dict(MODPACKS[0], downloads=100)])
+    assert db.get_all_modpacks_latest('curseforge') == modpacks
+    
+    assert set(db.bump_data_versions()) == {'modpack_stats', 'modpack_latest', 'modpack_first_seen'}
+    hits = _hits(db)
+    assert ('Pack 0', 'pack-0', 100) in db.get_all_modpacks_latest('curseforge')
+    assert _hits(db) == hits
+    assert db.get_all_versions_latest('curseforge') == versions
+    assert _hits(db) == hits + 1
+
+
+def test_bump_by_another_instance_reaches_the_cache(db_url, monkeypatch):
+    # Relecture des versions à chaque getter (pas d'attente de DB_CACHE_VERSION_CHECK)
+    monkeypatch.setattr(src.core.database, 'DB_CACHE_VERSION_CHECK', 0)
+    reader = open_database(db_url, cache_bytes=1 << 20)
+    writer = open_database(db_url)
+    
+    assert reader.get_all_modpacks_latest('curseforge') == []
+    assert reader.get_all_modpacks_latest('curseforge') == []
+    assert _hits(reader) == 1
+    
+    writer.save_modpack_stats('curseforge', MODPACKS)
+    assert reader.get_all_modpacks_latest('curseforge') == []
+    writer.bump_data_versions()
+    assert len(reader.get_all_modpacks_latest('curseforge')) == 3
+    assert _hits(reader) == 2
+
+
+@pytest.mark.parametrize('tables', [None, []])
+def test_bump_without_writes_changes_nothing(db, tables):
+    assert db.bump_data_versions(tables) == {}
+    assert db.get_data_versions() == {}
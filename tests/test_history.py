@@ -0,0 +1,110 @@
+"""Sémantique de `days` dans les getters d'historique"""
+
+from datetime import date, timedelta
+
+from src.core.database import open_database
+
+
+TODAY = date.today()
+
+
+def _load_versions(db, rows):
+    # un lot par jour, comme la collecte (un lot ne garde qu'une ligne par version)
+    for day in sorted({row[0] for row in rows}):
+        batch = [row for row in rows if row[0] == day]
+        db._run(lambda cur: db._upsert_version_rows(cur, batch))
+
+
+def test_days_is_a_row_count_for_stale_versions(db):
+    # v1 n'est plus collectée depuis 100 jours : days=5 rend tout de même ses 5 dernières lignes
+    rows = [(TODAY - timedelta(100 + offset), 'modrinth', 'v1', '1.0', 1000 - offset, None)
+            for offset in range(20)]
+    _load_versions(db, rows)
+    
+    history = db.get_version_stats_history('modrinth', 'v1', days=5, resolution='day')
+    assert [tuple(row)[0] for row in history] == [TODAY - timedelta(100 + offset) for offset in range(5)]
+    
+    frames = db.get_version_stats_history_frames('modrinth', ['v1'], days=5, resolution='day')
+    assert len(frames['v1']) == 5
+
+
+def test_days_limits_each_series_of_a_batch(db):
+    rows = [(TODAY - timedelta(offset), 'modrinth', name, '1.0', 10 * offset, None)
+            for name, first in (('v1', 0), ('v2', 50)) for offset in range(first, first + 10)]
+    _load_versions(db, rows)
+    
+    frames = db.get_version_stats_history_frames('modrinth', ['v1', 'v2'], days=3, resolution='day')
+    assert {name: len(frame) for name, frame in frames.items()} == {'v1': 3, 'v2': 3}
+    assert len(db.get_version_stats_history('modrinth', days=3, resolution='day')) == 3
+    assert len(db.get_version_stats_history('modrinth', days=None, resolution='day')) == 20
+
+
+def test_sparse_history_reads_like_dense(pg_db):
+    # plateaux de 10 jours : une ligne stockée par plateau en mode creux
+    rows = [(TODAY - timedelta(offset), 'modrinth', name, '1.0', 1000 * index + (40 - offset) // 10, None)
+            for index, name in enumerate(('v1', 'v2')) for offset in range(40)]
+    _load_versions(pg_db, rows)
+    pg_db.refresh_all_rollups()
+    expected = {days: sorted(tuple(row) for row in pg_db.get_version_stats_history('modrinth', 'v1', days=days, resolution='day'))
+                for days in (None, 5, 25)}
+    rollups = pg_db._fetchall("SELECT * FROM version_stats_rollup ORDER BY 1, 2, 3, 4")
+    
+    pg_db.sparse = True
+    pg_db.compact_history()
+    pg_db._run(lambda cur: cur.execute("TRUNCATE version_stats_rollup"))
+    pg_db.refresh_all_rollups()
+    assert len(pg_db._fetchall("SELECT 1 FROM version_stats")) == 10
+    for days, history in expected.items():
+        assert sorted(tuple(row) for row in pg_db.get_version_stats_history('modrinth', 'v1', days=days, resolution='day')) == history
+    assert pg_db._fetchall("SELECT * FROM version_stats_rollup ORDER BY 1, 2, 3, 4") == rollups
+
+
+def _modpack_days(db, slug):
+    """{date: downloads} jour par jour de l'historique d'un modpack"""
+    return {row[0]: row[2] for row in db.get_modpack_stats_history('curseforge', slug, days=None)}
+
+
+def test_bulk_load_into_an_interval_keeps_its_other_days(pg_url):
+    db = open_database(pg_url, sparse=True)
+    # d0..d10 à 100 : une seule ligne stockée (intervalle d0..d10)
+    first = TODAY - timedelta(20)
+    for offset in range(11):
+        row = (first + timedelta(offset), 'curseforge', 'Pack', 'pack', 100, 0)
+        db._run(lambda cur: db._upsert_modpack_rows(cur, [row]))
+    assert db._fetchall("SELECT date, valid_to FROM modpack_stats") == [(first, first + timedelta(10))]
+    expected = {first + timedelta(offset): 100 for offset in range(11)}
+    
+    # Jour chargé au milieu, au début de l'intervalle, et deux jours consécutifs
+    loads = [[(first + timedelta(5), None, 'Pack', 'pack', 150, 0)],
+             [(first, None, 'Pack', 'pack', 90, 0)],
+             [(first + timedelta(7), None, 'Pack', 'pack', 170, 0),
+              (first + timedelta(8), None, 'Pack', 'pack', 170, 0)],
+             [(first + timedelta(11), None, 'Pack', 'pack', 100, 0)]]
+    for rows in loads:
+        db.bulk_load_modpack_stats(rows, 'curseforge')
+        expected.update({row[0]: row[4] for row in rows})
+        assert _modpack_days(db, 'pack') == expected
+    
+    # Intervalles : d0, d1-d4, d5, d6, d7-d8, d9-d11
+    assert len(db._fetchall("SELECT 1 FROM modpack_stats")) == 6
+
+
+def test_compaction_splits_overlapped_intervals(pg_url):
+    db = open_database(pg_url, sparse=True)
+    first = TODAY - timedelta(20)
+    db._run(lambda cur: cur.execute("""
+        INSERT INTO version_stats (date, platform, version_name, version_number, downloads, valid_to)
+        VALUES (%(first)s, 'modrinth', 'v1', '1.0', 10, %(first)s::date + 10),
+               (%(first)s::date + 5, 'modrinth', 'v1', '1.0', 15, NULL),
+               (%(first)s::date + 11, 'modrinth', 'v1', '1.0', 10, NULL),
+               (%(first)s::date + 3, 'modrinth', 'v2', '1.0', 7, %(first)s::date + 4),
+               (%(first)s::date + 5, 'modrinth', 'v2', '1.0', 7, NULL)
+    """, {'first': first}))
+    
+    assert db.compact_history(['version']) == 1
+    assert sorted(db._fetchall("SELECT version_name, date, valid_to, downloads FROM version_stats")) == [
+        ('v1', first, first + timedelta(4), 10),
+        ('v1', first + timedelta(5), None, 15),
+        ('v1', first + timedelta(6), first + timedelta(11), 10),
+        ('v2', first + timedelta(3), first + timedelta(5), 7),
+    ]
@@ -0,0 +1,67 @@
+"""Import des modpacks : le mode --bulk (COPY) donne les mêmes lignes que les upserts"""
+
+import csv
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from import_to_postgres import DataImporter
+
+
+TABLES = {
+    'modpack_stats': "SELECT date, platform, modpack_name, modpack_slug, downloads, followers FROM modpack_stats",
+    'modpack_latest': "SELECT date, platform, modpack_name, modpack_slug, downloads, followers FROM modpack_latest",
+    'modpack_first_seen': "SELECT first_date, platform, modpack_slug, first_downloads FROM modpack_first_seen",
+}
+
+MODPACKS = [
+    {'id': 1, 'name': 'Alpha', 'slug': 'alpha', 'downloads': 120, 'link': ''},
+    {'id': 2, 'name': 'Beta', 'slug': 'beta', 'downloads': '', 'link': ''},
+    {'id': 3, 'name': 'Gamma', 'slug': 'gamma', 'downloads': 7, 'link': ''},
+    {'id': 1, 'name': 'Alpha (renamed)', 'slug': 'alpha', 'downloads': 150, 'link': ''},
+]
+
+
+def _snapshot(db):
+    return {table: sorted(db._fetchall(query)) for table, query in TABLES.items()}
+
+
+def _import(db, bulk, path):
+    importer = DataImporter(bulk=bulk)
+    importer.db = db
+    if path.suffix == '.csv':
+        return importer.import_modpacks_from_csv(str(path))
+    return importer.import_modpacks_from_json(str(path))
+
+
+@pytest.fixture(params=['csv', 'json'])
+def source(request, tmp_path):
+    path = tmp_path / f"modpacks.{request.param}"
+    if request.param == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['id', 'name', 'slug', 'downloads', 'link'])
+            writer.writeheader()
+            writer.writerows(MODPACKS)
+    else:
+        records = [dict(m, downloads=m['downloads'] or 0, follows=m['id'] * 10) for m in MODPACKS]
+        path.write_text(json.dumps(records), encoding='utf-8')
+    return path
+
+
+def test_bulk_import_matches_row_import(db, source):
+    assert _import(db, False, source)
+    rows = _snapshot(db)
+    assert len(rows['modpack_stats']) == 3
+    
+    for table in TABLES:
+        db._run(lambda cur: cur.execute(f"DELETE FROM {table}"))
+    assert _import(db, True, source)
+    assert _snapshot(db) == rows
+    
+    # Rejouer le mode ligne à ligne par-dessus l'import en masse ne change rien
+    assert _import(db, False, source)
+    assert _snapshot(db) == rows
@@ -0,0 +1,154 @@
+"""Vues maintenues de ModpackManager (agrégats, classement, pages)"""
+
+import os
+import random
+
+import pytest
+
+from src.core.modpack_manager import ModpackManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """Gestionnaire sans fichier source (load() ne lit jamais les vrais modpacks)"""
+    manager = ModpackManager()
+    manager.csv_path = tmp_path / 'modpacks.csv'
+    manager.json_path = tmp_path / 'modpacks.json'
+    return manager
+
+
+def _modpack(generator, slug):
+    # Peu de valeurs distinctes : beaucoup d'ex aequo, et des modpacks sans téléchargements
+    return {
+        'id': generator.choice([None, generator.randrange(1, 10**6)]),
+        'name': f"Pack {slug}",
+        'slug': slug,
+        'downloads': generator.choice([0, 0, 5, 10, 10, 20, 50, None]),
+        'link': '',
+    }
+
+
+def _ranking(reference):
+    """Classement attendu : sorted() par (-downloads, rang d'arrivée du slug)"""
+    return sorted(reference.values(), key=lambda item: (-(item[1]['downloads'] or 0), item[0]))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_upserts_and_removals_keep_ranking(manager, seed):
+    generator = random.Random(seed)
+    slugs = [f"pack-{index}" for index in range(12)]
+    initial = [_modpack(generator, slug) for slug in generator.sample(slugs, 6)]
+    manager.set_modpacks(list(initial))
+    reference = {modpack['slug']: (rank, modpack) for rank, modpack in enumerate(initial)}
+    next_rank = len(initial)
+    
+    for _ in range(200):
+        slug = generator.choice(slugs)
+        if generator.random() < 0.3:
+            assert manager.remove_modpack(slug) == (slug in reference)
+            reference.pop(slug, None)
+        else:
+            modpack = _modpack(generator, slug)
+            manager.upsert_modpack(modpack)
+            if slug in reference:
+                # Un slug déjà présent garde son rang entre ex aequo
+                reference[slug] = (reference[slug][0], modpack)
+            else:
+                reference[slug] = (next_rank, modpack)
+                next_rank += 1
+        
+        expected = [modpack for _, modpack in _ranking(reference)]
+        assert manager._ranked == expected
+        assert manager.top_k(5) == expected[:5]
+        assert manager._modpacks == [modpack for _, modpack in sorted(reference.values(), key=lambda item: item[0])]
+        assert manager.get_stats() == {
+            'total': len(expected),
+            'with_downloads': sum(1 for m in expected if (m['downloads'] or 0) > 0),
+            'total_downloads': sum(m['downloads'] or 0 for m in expected),
+            'with_ids': sum(1 for m in expected if m['id']),
+        }
+        if expected:
+            assert manager.sort_by_downloads(reverse=False) == sorted(
+                manager._modpacks, key=lambda m: m['downloads'] or 0)
+
+
+def test_reupsert_keeps_tie_order(manager):
+    manager.set_modpacks([
+        {'slug': 'a', 'name': 'A', 'downloads': 10},
+        {'slug': 'b', 'name': 'B', 'downloads': 10},
+        {'slug': 'c', 'name': 'C', 'downloads': 10},
+    ])
+    manager.upsert_modpack({'slug': 'a', 'name': 'A', 'downloads': 10})
+    assert [m['slug'] for m in manager.top_k(3)] == ['a', 'b', 'c']
+    manager.upsert_modpack({'slug': 'b', 'name': 'B', 'downloads': 30})
+    manager.upsert_modpack({'slug': 'b', 'name': 'B', 'downloads': 10})
+    assert [m['slug'] for m in manager.top_k(3)] == ['a', 'b', 'c']
+    manager.remove_modpack('a')
+    manager.upsert_modpack({'slug': 'a', 'name': 'A', 'downloads': 10})
+    assert [m['slug'] for m in manager.top_k(3)] == ['b', 'c', 'a']
+
+
+def _reference_query(modpacks, name='', with_downloads=False, sort=('downloads', True)):
+    """query() recalculé naïvement sur la liste"""
+    matches = [
+        m for m in modpacks
+        if name.lower() in m['name'].lower() and (not with_downloads or (m['downloads'] or 0) > 0)
+    ]
+    if sort[0] == 'downloads':
+        return sorted(matches, key=lambda m: m['downloads'] or 0, reverse=sort[1])
+    return sorted(matches, key=lambda m: m['name'].lower(), reverse=sort[1])
+
+
+@pytest.mark.parametrize('sort', [('downloads', True), ('downloads', False), ('name', False), ('name', True)])
+@pytest.mark.parametrize('name', ['', '1', 'pack 2'])
+@pytest.mark.parametrize('with_downloads', [False, True])
+def test_query_pages_match_reference_slices(manager, sort, name, with_downloads):
+    generator = random.Random(3)
+    modpacks = [_modpack(generator, f"p{index}") for index in range(40)]
+    manager.set_modpacks(list(modpacks))
+    expected = _reference_query(modpacks, name, with_downloads, sort)
+    
+    for offset in (0, 1, 7, len(expected) - 1, len(expected), len(expected) + 5, -3):
+        for limit in (0, 1, 5, 50):
+            page, total = manager.query({'name': name, 'with_downloads': with_downloads}, sort, offset, limit)
+            assert total == len(expected)
+            assert page == expected[max(0, offset):max(0, offset) + limit]
+
+
+def test_get_page_matches_reference_slices(manager):
+    generator = random.Random(5)
+    modpacks = [_modpack(generator, f"p{index}") for index in range(30)]
+    manager.set_modpacks(list(modpacks))
+    
+    for reverse in (True, False):
+        expected = sorted(modpacks, key=lambda m: m['downloads'] or 0, reverse=reverse)
+        for offset in range(0, 35, 3):
+            for limit in (1, 4, 30):
+                assert manager.get_page(offset, limit, reverse) == expected[offset:offset + limit]
+
+
+def test_query_memo_invalidated_by_upsert(manager):
+    manager.set_modpacks([{'slug': 'a', 'name': 'Alpha', 'downloads': 1},
+                          {'slug': 'b', 'name': 'Beta', 'downloads': 2}])
+    assert manager.query({'name': 'a'}, ('name', False))[0] == manager._modpacks
+    
+    manager.upsert_modpack({'slug': 'c', 'name': 'Gamma', 'downloads': 3})
+    assert [m['slug'] for m in manager.query({'name': 'a'}, ('name', False))[0]] == ['a', 'b', 'c']
+    manager.remove_modpack('a')
+    assert [m['slug'] for m in manager.query({'name': 'a'}, ('name', False))[0]] == ['b', 'c']
+
+
+def test_query_memo_invalidated_by_refresh(manager):
+    manager.save_to_csv([{'id': 1, 'slug': 'a', 'name': 'Alpha', 'downloads': 1, 'link': ''}])
+    manager.refresh()
+    assert [m['slug'] for m in manager.query({'name': 'a'}, ('name', False))[0]] == ['a']
+    
+    # Le fichier change sous le gestionnaire (autre processus) : nouvel mtime
+    other = ModpackManager()
+    other.csv_path = manager.csv_path
+    other.save_to_csv([{'id': 2, 'slug': 'b', 'name': 'Beta', 'downloads': 2, 'link': ''}])
+    stat = manager.csv_path.stat()
+    os.utime(manager.csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    
+    manager.refresh()
+    assert [m['slug'] for m in manager.query({'name': 'a'}, ('name', False))[0]] == ['b']
@@ -0,0 +1,55 @@
+"""Invalidation du cache par LISTEN/NOTIFY (PostgreSQL)"""
+
+import time
+
+import pytest
+
+from src.core.database import open_database
+
+
+MODPACKS = [{'title': 'Pack', 'slug': 'pack', 'downloads': 1}]
+
+
+def _wait(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "délai dépassé"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def reader(pg_url):
+    reader = open_database(pg_url, cache_bytes=1 << 20)
+    reader.start_listener()
+    _wait(reader._listening.is_set)
+    yield reader
+    reader.stop_listener()
+
+
+def test_notification_invalidates_the_listener_cache(pg_url, reader):
+    writer = open_database(pg_url)
+    assert reader.get_all_modpacks_latest('curseforge') == []
+    
+    writer.save_modpack_stats('curseforge', MODPACKS)
+    writer.bump_data_versions(run_id='run-1')
+    _wait(lambda: (reader.last_notification or {}).get('run_id') == 'run-1')
+    
+    assert reader.last_notification['tables'] == ['modpack_first_seen', 'modpack_latest', 'modpack_stats']
+    # Versions tenues à jour par les NOTIFY : le cache est vidé sans relire data_versions
+    assert reader._versions == writer.get_data_versions()
+    assert reader.get_all_modpacks_latest('curseforge') == [('Pack', 'pack', 1)]
+
+
+def test_rolled_back_run_sends_nothing(pg_url, reader):
+    writer = open_database(pg_url)
+    with pytest.raises(RuntimeError):
+        with writer.transaction():
+            writer.save_modpack_stats('curseforge', MODPACKS)
+            writer.bump_data_versions(run_id='rolled-back')
+            raise RuntimeError("collecte interrompue")
+    
+    writer.save_version_stats('curseforge', [{'name': 'v1', 'downloads': 1}])
+    writer.bump_data_versions(run_id='committed')
+    _wait(lambda: (reader.last_notification or {}).get('run_id') == 'committed')
+    assert reader.get_all_modpacks_latest('curseforge') == []
+    assert 'modpack_latest' not in reader._versions
@@ -0,0 +1,55 @@
+"""Pages à curseur de l'historique (get_*_history_page)"""
+
+import random
+from datetime import date, timedelta
+
+import pytest
+
+
+TODAY = date.today()
+
+
+def _load_modpacks(db):
+    """5 modpacks, 40 jours avec trous et plateaux ; renvoie les lignes (date, nom, downloads, slug)"""
+    generator = random.Random(7)
+    expected = []
+    for offset in range(40, -1, -1):
+        day = TODAY - timedelta(offset)
+        rows = [(day, 'curseforge', f"Pack {index}", f"pack-{index}", 100 * index + (40 - offset) // 4, index)
+                for index in range(5) if generator.random() > 0.2]
+        db._run(lambda cur: db._upsert_modpack_rows(cur, rows))
+        expected += [(row[0], row[2], row[4], row[3]) for row in rows]
+    return sorted(expected, key=lambda row: (row[0], row[3]), reverse=True)
+
+
+def _all_pages(db, limit, slug=None):
+    pages, token = [], None
+    while True:
+        rows, token = db.get_modpack_stats_history_page('curseforge', slug, limit=limit, page_token=token)
+        pages.append(rows)
+        if token is None:
+            return pages
+
+
+def _check_pages(db, expected):
+    for limit in (1, 7, 50):
+        pages = _all_pages(db, limit)
+        assert all(len(page) == limit for page in pages[:-1])
+        assert [row for page in pages for row in page] == [row[:3] for row in expected]
+    
+    pages = _all_pages(db, 6, 'pack-3')
+    assert [row for page in pages for row in page] == [row[:3] for row in expected if row[3] == 'pack-3']
+
+
+def test_pages_follow_date_then_entity_across_boundaries(db):
+    _check_pages(db, _load_modpacks(db))
+
+
+def test_sparse_pages_match_dense_ones(pg_db):
+    expected = _load_modpacks(pg_db)
+    pg_db.sparse = True
+    pg_db.compact_history()
+    _check_pages(pg_db, expected)
+    
+    with pytest.raises(ValueError):
+        pg_db.get_modpack_stats_history_page('curseforge', limit=5, page_token='not-a-token')
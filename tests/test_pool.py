@@ -0,0 +1,40 @@
+"""Mode pool (pool_size) : curseurs par requête partagés entre threads"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import pytest
+
+from src.core.database import open_database
+
+
+def test_threads_save_and_read_concurrently(open_db):
+    db = open_db(pool_size=3)
+    
+    def collect(index):
+        platform = f"platform-{index}"
+        modpacks = [{'title': f"Pack {n}", 'slug': f"pack-{n}", 'downloads': index * 100 + n} for n in range(20)]
+        db.save_modpack_stats(platform, modpacks)
+        return sorted(row[2] for row in db.get_all_modpacks_latest(platform))
+    
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(collect, range(16)))
+    
+    assert results == [[index * 100 + n for n in range(20)] for index in range(16)]
+
+
+def test_failed_queries_give_their_connection_back(pg_url):
+    db = open_database(pg_url, pool_size=2)
+    assert db.conn is None
+    
+    for _ in range(5):
+        with pytest.raises(psycopg2.Error):
+            db._fetchall("SELECT * FROM missing_table")
+    
+    # Les 2 connexions sont revenues dans le pool, sans transaction ouverte
+    for _ in range(2):
+        assert db._pool_slots.acquire(timeout=1)
+    for _ in range(2):
+        db._pool_slots.release()
+    assert db.health_check()
+    assert db._fetchall("SELECT 1") == [(1,)]
@@ -0,0 +1,48 @@
+"""Paramètres des requêtes préparées (PREPARE / EXECUTE)"""
+
+from datetime import date, datetime
+
+from src.core.database import open_database
+
+
+def test_prepared_upsert_casts_array_parameters(pg_url):
+    db = open_database(pg_url, prepare=True)
+    # date_published entièrement NULL, puis en texte ISO : EXECUTE ne convertit pas text[] seul
+    batches = [
+        [(date(2026, 1, 1), 'modrinth', name, '1.0', 10, None) for name in ('v1', 'v2')],
+        [(date(2026, 1, 2), 'modrinth', 'v1', '1.0', 11, '2024-01-01 10:00:00'),
+         (date(2026, 1, 2), 'modrinth', 'v2', '1.0', 12, None)],
+    ]
+    for rows in batches:
+        assert db._run(lambda cur: db._upsert_version_rows(cur, rows)) == {'written': 2, 'unchanged': 0}
+    
+    assert db.conn.prepared
+    assert db._fetchall("""
+        SELECT version_name, downloads, date_published FROM version_latest ORDER BY version_name
+    """) == [('v1', 11, datetime(2024, 1, 1, 10)), ('v2', 12, None)]
+
+
+def test_key_lists_reuse_the_same_statements(pg_url):
+    db = open_database(pg_url, prepare=True, cache_bytes=0)
+    slugs = [f"pack-{number}" for number in range(6)]
+    counts = []
+    for length in (1, 2, 6):
+        db.get_modpacks_initial_downloads('modrinth', slugs[:length])
+        db.get_daily_stats_history('modrinth')
+        server = db._fetchall("SELECT count(*) FROM pg_prepared_statements")[0][0]
+        counts.append((server, len(db.conn.prepared)))
+    assert counts[0] == counts[1] == counts[2]
+    db.close()
+
+
+def test_in_lists_and_extra_texts_are_not_prepared(pg_url, monkeypatch):
+    db = open_database(pg_url, prepare=True)
+    known = list(db.conn.prepared)
+    monkeypatch.setattr('src.core.database.MAX_PREPARED_STATEMENTS', len(known) + 1)
+    
+    assert db._fetchall("SELECT %s IN (%s, %s)", (1, 2, 1)) == [(True,)]
+    assert db._fetchall("SELECT %s + 1", (1,)) == [(2,)]
+    assert db._fetchall("SELECT %s + 2", (1,)) == [(3,)]
+    assert db._fetchall("SELECT %s + 1", (2,)) == [(3,)]
+    assert list(db.conn.prepared) == known + ["SELECT %s + 1"]
+    db.close()
@@ -0,0 +1,87 @@
+"""Lectures routées vers un réplica, et repli sur le primaire quand il est en retard"""
+
+import time
+
+import pytest
+
+from src.core.database import open_database
+
+
+# Un serveur hors recovery est à jour par construction : le « réplica » est le primaire
+# lui-même, reconnaissable à son application_name
+WHERE = "SELECT current_setting('application_name')"
+
+
+@pytest.fixture
+def routed(pg_url):
+    separator = '&' if '?' in pg_url else '?'
+    db = open_database(pg_url, read_urls=[f"{pg_url}{separator}application_name=stats_replica"])
+    yield db
+    db.close()
+
+
+def _server(db):
+    return 'replica' if db._fetchall(WHERE)[0][0] == 'stats_replica' else 'primary'
+
+
+def _replayed(db, lsn):
+    """Position rejouée par le réplica lue à l'instant : pas de relecture avant DB_REPLICA_LSN_CHECK"""
+    replica, = db.replicas
+    replica.replay_lsn = lsn
+    replica.checked = time.monotonic()
+    return replica
+
+
+def test_reads_go_to_an_up_to_date_replica(routed):
+    assert _server(routed) == 'replica'
+    with routed.read_from_primary():
+        assert _server(routed) == 'primary'
+        with routed.read_from_primary():
+            assert _server(routed) == 'primary'
+        assert _server(routed) == 'primary'
+    with routed.transaction():
+        assert _server(routed) == 'primary'
+    assert _server(routed) == 'replica'
+
+
+def test_lagging_replica_falls_back_to_primary(routed):
+    assert _server(routed) == 'replica'
+    replica = _replayed(routed, routed._min_lsn - 1)
+    assert _server(routed) == 'primary'
+    # Réplica arrêté juste à la dernière écriture connue (la création du schéma)
+    _replayed(routed, routed._min_lsn)
+    assert _server(routed) == 'replica'
+    
+    routed.save_daily_stats('curseforge', 10, 1, 1)
+    assert _server(routed) == 'primary'
+    assert routed.get_daily_stats_history('curseforge')[0][1] == 10
+    
+    # Position relue une fois le délai passé : le réplica a rejoué l'écriture
+    replica.checked = None
+    assert _server(routed) == 'replica'
+    assert replica.replay_lsn >= routed._min_lsn
+    assert routed.get_daily_stats_history('curseforge')[0][1] == 10
+
+
+def test_versions_bumped_elsewhere_raise_the_required_position(pg_url, routed):
+    # Première lecture des versions : la position requise est relue au passage
+    routed.get_data_versions()
+    _server(routed)
+    _replayed(routed, routed._min_lsn)
+    assert _server(routed) == 'replica'
+    
+    writer = open_database(pg_url)
+    writer.save_daily_stats('modrinth', 20, 1, 1)
+    writer.bump_data_versions()
+    writer.close()
+    routed._versions_checked = None
+    routed.get_data_versions()
+    assert _server(routed) == 'primary'
+
+
+def test_unreachable_replica_falls_back_to_primary(pg_url):
+    db = open_database(pg_url, read_urls=['postgresql://postgres@127.0.0.1:1/none?connect_timeout=1'])
+    db.save_daily_stats('curseforge', 30, 1, 1)
+    assert db.get_daily_stats_history('curseforge')[0][1] == 30
+    assert db.replicas[0].replay_lsn is None
+    db.close()
@@ -0,0 +1,119 @@
+"""Agrégats hebdomadaires/mensuels (rollups) de l'historique"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.core.sqlite_database import SQLiteStatsDatabase
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+PERIOD_START = {
+    'week': lambda day: day - timedelta(day.weekday()),
+    'month': lambda day: day.replace(day=1),
+}
+
+ROLLUP_COLUMNS = {
+    'daily_stats_rollup': "resolution, platform, period_start, last_date, total_downloads, followers, "
+                          "versions_count, min_value, max_value, delta",
+    'modpack_stats_rollup': "resolution, platform, modpack_slug, period_start, last_date, downloads, "
+                            "modpack_name, min_value, max_value, delta",
+}
+
+
+def _load_history(db, generator, days=80):
+    """Historique journalier avec trous ; renvoie {slug: [(date, nom, downloads)]}"""
+    mark = '?' if isinstance(db, SQLiteStatsDatabase) else '%s'
+    history = {}
+    for offset in range(days, -1, -1):
+        day = TODAY - timedelta(offset)
+        rows = [(day, 'curseforge', f"Pack {index} ({offset // 30})", f"pack-{index}",
+                 1000 * index + generator.randrange(500), 0) for index in range(3) if generator.random() > 0.25]
+        db._run(lambda cur: db._upsert_modpack_rows(cur, rows))
+        db._run(lambda cur: cur.execute(
+            f"INSERT INTO daily_stats (date, platform, total_downloads, followers, versions_count) "
+            f"VALUES ({mark}, {mark}, {mark}, {mark}, {mark})",
+            (day, 'curseforge', 10 * (days - offset), offset, 3)
+        ))
+        for row in rows:
+            history.setdefault(row[3], []).append((row[0], row[2], row[4]))
+    return history
+
+
+def _expected_periods(rows, resolution):
+    """(last_date, nom, downloads) de chaque période, la plus récente d'abord"""
+    periods = {}
+    for day, name, downloads in rows:
+        periods[PERIOD_START[resolution](day)] = (day, name, downloads)
+    return [periods[start] for start in sorted(periods, reverse=True)]
+
+
+def _rollups(db):
+    return {table: sorted(db._fetchall(f"SELECT {columns} FROM {table}")) for table, columns in ROLLUP_COLUMNS.items()}
+
+
+@pytest.mark.parametrize('resolution', ['week', 'month'])
+def test_rollups_keep_the_last_values_of_each_period(db, resolution):
+    history = _load_history(db, random.Random(21))
+    db.refresh_all_rollups()
+    
+    for slug, rows in history.items():
+        expected = _expected_periods(rows, resolution)
+        assert db.get_modpack_stats_history('curseforge', slug, days=None, resolution=resolution) == expected
+        # Plage limitée : les périodes qui se terminent dans les 40 derniers jours
+        assert db.get_modpack_stats_history('curseforge', slug, days=40, resolution=resolution) == [
+            row for row in expected if row[0] > TODAY - timedelta(40)
+        ]
+    
+    rollup = [row for row in _rollups(db)['modpack_stats_rollup'] if row[0] == resolution and row[2] == 'pack-1']
+    for (_, _, _, start, last_date, downloads, _, low, high, delta) in rollup:
+        values = [row[2] for row in history['pack-1'] if PERIOD_START[resolution](row[0]) == start]
+        assert (low, high, delta, downloads) == (min(values), max(values), values[-1] - values[0], values[-1])
+    
+    days = [(TODAY - timedelta(offset), None, None) for offset in range(80, -1, -1)]
+    assert [row[0] for row in db.get_daily_stats_history('curseforge', days=None, resolution=resolution)] == [
+        row[0] for row in _expected_periods(days, resolution)
+    ]
+
+
+def test_incremental_refresh_matches_full_rebuild_and_is_idempotent(db):
+    generator = random.Random(22)
+    _load_history(db, generator)
+    db.refresh_all_rollups()
+    
+    rows = [(TODAY, 'curseforge', 'Pack 0 (0)', 'pack-0', 999_999, 0),
+            (TODAY - timedelta(1), 'curseforge', 'Pack 5', 'pack-5', 7, 0)]
+    db._run(lambda cur: db._upsert_modpack_rows(cur, rows))
+    db.refresh_rollups(since=TODAY - timedelta(1))
+    incremental = _rollups(db)
+    
+    db._touched = set()
+    db.refresh_rollups(since=TODAY - timedelta(1))
+    assert _rollups(db) == incremental
+    assert db._touched == set()
+    
+    db.refresh_all_rollups()
+    assert _rollups(db) == incremental
+    assert db._touched == set()
+
+
+def test_day_resolution_is_the_default(db):
+    history = _load_history(db, random.Random(23), days=200)
+    rows = sorted(history['pack-2'], reverse=True)
+    
+    assert db.get_modpack_stats_history('curseforge', 'pack-2', days=150) == rows[:150]
+    assert db.get_modpack_stats_history_frame('curseforge', 'pack-2', days=150)['downloads'].tolist() == [
+        row[2] for row in rows[:150]
+    ]
+    
+    db.refresh_all_rollups()
+    assert db.get_modpack_stats_history('curseforge', 'pack-2', days=150, resolution='auto') == (
+        db.get_modpack_stats_history('curseforge', 'pack-2', days=150, resolution='week')
+    )
+    assert db.get_modpack_stats_history('curseforge', 'pack-2', days=None, resolution='auto') == (
+        db.get_modpack_stats_history('curseforge', 'pack-2', days=None, resolution='week')
+    )
+    with pytest.raises(ValueError):
+        db.get_modpack_stats_history('curseforge', 'pack-2', days=150, resolution='year')
@@ -0,0 +1,151 @@
+"""Écritures de save_version_stats / save_modpack_stats"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from src.core.database import open_database
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+def _modpacks(count, downloads=0):
+    return [{'title': f"Pack {index}", 'slug': f"pack-{index}", 'downloads': downloads + index, 'follows': index}
+            for index in range(count)]
+
+
+def test_saves_span_several_batches(open_db):
+    db = open_db(batch_size=7)
+    
+    assert db.save_modpack_stats('curseforge', _modpacks(30)) == {'written': 30, 'unchanged': 0}
+    latest = db.get_all_modpacks_latest('curseforge')
+    assert sorted(latest) == sorted((f"Pack {index}", f"pack-{index}", index) for index in range(30))
+    assert len(db.get_modpack_stats_history('curseforge')) == 30
+    
+    versions = [{'name': f"v{index}", 'version_number': str(index), 'downloads': index,
+                 'date_published': '2024-01-02T03:04:05Z'} for index in range(16)]
+    assert db.save_version_stats('modrinth', versions) == {'written': 16, 'unchanged': 0}
+    assert len(db.get_all_versions_latest('modrinth')) == 16
+
+
+def test_last_duplicate_in_a_save_wins(open_db):
+    db = open_db(batch_size=2)
+    modpacks = _modpacks(3) + [{'title': 'Pack 1 bis', 'slug': 'pack-1', 'downloads': 99}]
+    
+    assert db.save_modpack_stats('curseforge', modpacks) == {'written': 3, 'unchanged': 0}
+    assert sorted(db.get_all_modpacks_latest('curseforge')) == [
+        ('Pack 0', 'pack-0', 0), ('Pack 1 bis', 'pack-1', 99), ('Pack 2', 'pack-2', 2)
+    ]
+    assert sorted(db.get_modpack_stats_history('curseforge'), key=lambda row: row[1]) == [
+        (TODAY, 'Pack 0', 0), (TODAY, 'Pack 1 bis', 99), (TODAY, 'Pack 2', 2)
+    ]
+
+
+def _load_days(db, generator, days=12):
+    """Jours chargés dans le désordre (rattrapages d'historique), valeurs tirées au hasard"""
+    offsets = list(range(days))
+    generator.shuffle(offsets)
+    for offset in offsets + offsets[:3]:
+        day = TODAY - timedelta(offset)
+        versions = [(day, platform, f"v{index}", f"{index}.{offset}", generator.randrange(50),
+                     datetime(2024, 1, 1 + index)) for platform in ('modrinth', 'curseforge')
+                    for index in range(4) if generator.random() > 0.3]
+        modpacks = [(day, platform, f"Pack {index} ({offset})", f"pack-{index}", generator.randrange(50),
+                     generator.randrange(5)) for platform in ('modrinth', 'curseforge')
+                    for index in range(4) if generator.random() > 0.3]
+        db._run(lambda cur: db._upsert_version_rows(cur, versions))
+        db._run(lambda cur: db._upsert_modpack_rows(cur, modpacks))
+
+
+def _last_rows(db, table, key, columns, order='MAX'):
+    """Ligne la plus récente (ou la plus ancienne) de chaque entité, lue dans l'historique"""
+    return sorted(db._fetchall(f"""
+        SELECT platform, {key}, {columns} FROM {table} h
+        WHERE date = (SELECT {order}(date) FROM {table} o WHERE o.platform = h.platform AND o.{key} = h.{key})
+    """))
+
+
+def test_latest_tables_follow_history(db):
+    _load_days(db, random.Random(11))
+    
+    assert sorted(db._fetchall(
+        "SELECT platform, version_name, version_number, downloads, date_published, date FROM version_latest"
+    )) == _last_rows(db, 'version_stats', 'version_name', 'version_number, downloads, date_published, date')
+    modpacks = _last_rows(db, 'modpack_stats', 'modpack_slug', 'modpack_name, downloads, followers, date')
+    assert sorted(db._fetchall(
+        "SELECT platform, modpack_slug, modpack_name, downloads, followers, date FROM modpack_latest"
+    )) == modpacks
+    assert sorted(db.get_all_modpacks_latest('curseforge'), key=lambda row: row[1]) == [
+        (name, slug, downloads) for platform, slug, name, downloads, _, _ in modpacks if platform == 'curseforge'
+    ]
+    
+    # La reconstruction depuis l'historique (migration) donne les mêmes tables
+    snapshot = sorted(db._fetchall("SELECT * FROM modpack_latest")), sorted(db._fetchall("SELECT * FROM version_latest"))
+    db._run(lambda cur: cur.execute("DELETE FROM modpack_latest"))
+    db._run(lambda cur: cur.execute("DELETE FROM version_latest"))
+    db.backfill_latest_tables()
+    assert (sorted(db._fetchall("SELECT * FROM modpack_latest")),
+            sorted(db._fetchall("SELECT * FROM version_latest"))) == snapshot
+
+
+def test_first_seen_follows_history(db):
+    _load_days(db, random.Random(13))
+    rows = [(TODAY - timedelta(30), 'curseforge', 'Old', 'pack-0', 1, 0),
+            (TODAY - timedelta(30), 'curseforge', 'Old bis', 'pack-0', 2, 0)]
+    db.bulk_load_modpack_stats(rows, 'curseforge')
+    
+    first = _last_rows(db, 'modpack_stats', 'modpack_slug', 'date, downloads', order='MIN')
+    assert sorted(db._fetchall(
+        "SELECT platform, modpack_slug, first_date, first_downloads FROM modpack_first_seen"
+    )) == first
+    assert db.get_modpacks_initial_downloads('curseforge') == {
+        slug: {'downloads': downloads, 'date': day} for platform, slug, day, downloads in first
+        if platform == 'curseforge'
+    }
+    assert db.get_modpacks_initial_downloads('curseforge', slugs=['pack-0', 'missing']) == {
+        'pack-0': {'downloads': 2, 'date': TODAY - timedelta(30)}
+    }
+    
+    db._run(lambda cur: cur.execute("DELETE FROM modpack_first_seen"))
+    db.backfill_first_seen()
+    assert sorted(db._fetchall(
+        "SELECT platform, modpack_slug, first_date, first_downloads FROM modpack_first_seen"
+    )) == first
+
+
+def _counts(db, versions, modpacks):
+    return (db.save_daily_stats('modrinth', 1000, 10, len(versions)),
+            db.save_version_stats('modrinth', versions),
+            db.save_modpack_stats('modrinth', modpacks))
+
+
+def _noop_reruns(db):
+    versions = [{'name': f"v{index}", 'version_number': str(index), 'downloads': index} for index in range(5)]
+    modpacks = _modpacks(6)
+    
+    assert _counts(db, versions, modpacks) == (
+        {'written': 1, 'unchanged': 0}, {'written': 5, 'unchanged': 0}, {'written': 6, 'unchanged': 0}
+    )
+    db._touched = set()
+    assert _counts(db, versions, modpacks) == (
+        {'written': 0, 'unchanged': 1}, {'written': 0, 'unchanged': 5}, {'written': 0, 'unchanged': 6}
+    )
+    # Rien d'écrit : aucune table à publier par bump_data_versions
+    assert db._touched == set()
+    
+    versions[2] = dict(versions[2], downloads=99)
+    modpacks[4] = dict(modpacks[4], follows=42)
+    assert _counts(db, versions, modpacks)[1:] == ({'written': 1, 'unchanged': 4}, {'written': 1, 'unchanged': 5})
+    assert db._touched == {'version_stats', 'version_latest', 'modpack_stats', 'modpack_latest', 'modpack_first_seen'}
+    
+    rows = [(None, None, f"Pack {index}", f"pack-{index}", index, index) for index in range(6)]
+    assert db.bulk_load_modpack_stats(rows, 'modrinth') == {'written': 1, 'unchanged': 5}
+    assert db.bulk_load_modpack_stats(rows, 'modrinth') == {'written': 0, 'unchanged': 6}
+
+
+def test_reruns_skip_unchanged_rows(db):
+    _noop_reruns(db)
+
+
+def test_sparse_reruns_skip_unchanged_rows(pg_url):
+    _noop_reruns(open_database(pg_url, sparse=True))
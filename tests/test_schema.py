@@ -0,0 +1,51 @@
+"""Schéma créé une seule fois, puis vérifié par sa version (schema_version)"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.core.database import SCHEMA_VERSION, StatsDatabase, open_database
+from src.core.sqlite_database import SQLiteStatsDatabase
+
+
+def _ddl(db):
+    """Méthode qui exécute le DDL du backend de db"""
+    return 'create_tables' if isinstance(db, SQLiteStatsDatabase) else '_create_tables'
+
+
+def _set_version(db, version):
+    if isinstance(db, SQLiteStatsDatabase):
+        db._run(lambda cur: cur.execute(f"PRAGMA user_version = {version}"))
+    else:
+        db._run(lambda cur: cur.execute("UPDATE schema_version SET version = %s", (version,)))
+
+
+def test_second_connect_skips_the_ddl(db_url, monkeypatch):
+    first = open_database(db_url)
+    assert first.get_schema_version() == SCHEMA_VERSION
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("DDL exécuté sur un schéma à jour")
+    
+    monkeypatch.setattr(type(first), _ddl(first), fail)
+    second = open_database(db_url)
+    assert second.ensure_schema() is False
+    assert second.get_all_modpacks_latest('curseforge') == []
+
+
+def test_outdated_schema_is_upgraded(db_url, monkeypatch):
+    first = open_database(db_url)
+    _set_version(first, SCHEMA_VERSION - 1)
+    
+    calls = []
+    ddl = getattr(type(first), _ddl(first))
+    monkeypatch.setattr(type(first), _ddl(first), lambda self, *args: calls.append(1) or ddl(self, *args))
+    second = open_database(db_url)
+    assert calls == [1]
+    assert second.get_schema_version() == SCHEMA_VERSION
+    assert second.ensure_schema() is False
+
+
+def test_concurrent_first_connects(pg_url):
+    # Verrou consultatif : un seul process crée le schéma, les autres l'attendent
+    with ThreadPoolExecutor(4) as executor:
+        databases = list(executor.map(lambda _: StatsDatabase(pg_url), range(4)))
+    assert {db.get_schema_version() for db in databases} == {SCHEMA_VERSION}
@@ -0,0 +1,65 @@
+"""Lecture en flux (iter_*_history) par curseur serveur"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.core.database import open_database
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+def _load(db, days=45):
+    for offset in range(days, -1, -1):
+        day = TODAY - timedelta(offset)
+        versions = [(day, 'modrinth', f"v{index}", '1.0', 10 * offset + index, None) for index in range(3)]
+        modpacks = [(day, 'modrinth', f"Pack {index}", f"pack-{index}", 10 * offset + index, 0) for index in range(4)]
+        db._run(lambda cur: db._upsert_version_rows(cur, versions))
+        db._run(lambda cur: db._upsert_modpack_rows(cur, modpacks))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_streams_yield_the_getter_rows_in_chunks(db, chunk_size):
+    _load(db)
+    calls = [
+        ('version_stats_history', ('modrinth',), {'days': None}),
+        ('version_stats_history', ('modrinth', 'v1'), {'days': 30}),
+        ('modpack_stats_history', ('modrinth',), {'days': 100}),  # 25 jours entiers
+        ('modpack_stats_history', ('modrinth', 'pack-2'), {'days': None}),
+        ('daily_stats_history', ('modrinth',), {'days': None}),
+    ]
+    for name, args, kwargs in calls:
+        chunks = list(getattr(db, f"iter_{name}")(*args, chunk_size=chunk_size, **kwargs))
+        assert all(len(chunk) <= chunk_size for chunk in chunks)
+        assert all(chunks)
+        streamed = [tuple(row) for chunk in chunks for row in chunk]
+        # Mêmes lignes, du plus récent au plus ancien (ordre libre entre lignes d'un même jour)
+        assert [row[0] for row in streamed] == sorted((row[0] for row in streamed), reverse=True)
+        assert sorted(streamed) == sorted(tuple(row) for row in getattr(db, f"get_{name}")(*args, **kwargs))
+
+
+def test_abandoned_stream_releases_its_connection(db):
+    _load(db, days=20)
+    stream = db.iter_modpack_stats_history('modrinth', days=None, chunk_size=5)
+    assert len(next(stream)) == 5
+    stream.close()
+    
+    # Un autre thread lit sans attendre la fin du flux abandonné
+    with ThreadPoolExecutor(1) as executor:
+        rows = executor.submit(db.get_all_modpacks_latest, 'modrinth').result(timeout=5)
+    assert len(rows) == 4
+
+
+def test_abandoned_stream_returns_its_pooled_connection(pg_url):
+    db = open_database(pg_url, pool_size=1)
+    _load(db, days=20)
+    for _ in range(3):
+        stream = db.iter_modpack_stats_history('modrinth', days=None, chunk_size=5)
+        next(stream)
+        stream.close()
+    
+    assert db._pool_slots.acquire(timeout=1)
+    db._pool_slots.release()
+    assert len(db.get_all_modpacks_latest('modrinth')) == 4
@@ -0,0 +1,73 @@
+"""Classement get_top_movers comparé à un calcul Python sur un jeu de données tiré au hasard"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+TODAY = datetime.now(timezone.utc).date()
+
+
+def _load(db, source, generator, days=40):
+    """Historique de 12 entités (apparues/disparues à des dates variées) ; renvoie {key: [(date, label, downloads)]}"""
+    history = {}
+    spans = {}
+    for index in range(12):
+        first = generator.randrange(days + 1)
+        spans[f"e{index:02d}"] = (first, generator.randrange(first + 1) if generator.random() < 0.3 else 0)
+    for offset in range(days, -1, -1):
+        day = TODAY - timedelta(offset)
+        rows = []
+        for key, (first, last) in spans.items():
+            if not last <= offset <= first or generator.random() < 0.2:
+                continue
+            previous = history[key][-1][2] if key in history else generator.choice([0, 0, 10, 500])
+            # Croissances souvent égales : le départage par clé compte
+            downloads = previous + generator.choice([0, 5, 5, 20])
+            label = f"{key} ({offset // 10})"
+            rows.append((day, 'modrinth', key, label, downloads, None) if source == 'version'
+                        else (day, 'modrinth', label, key, downloads, 0))
+            history.setdefault(key, []).append((day, label, downloads))
+        if source == 'version':
+            db._run(lambda cur: db._upsert_version_rows(cur, rows))
+        else:
+            db._run(lambda cur: db._upsert_modpack_rows(cur, rows))
+    return history
+
+
+def _expected(history, window_days, limit):
+    cutoff = TODAY - timedelta(window_days)
+    movers = []
+    for key, rows in history.items():
+        day, label, downloads = rows[-1]
+        if day <= cutoff:
+            continue
+        before = [row for row in rows if row[0] <= cutoff]
+        start = (before[-1] if before else rows[0])[2]
+        growth = downloads - start
+        movers.append((key, label, start, downloads, growth, growth * 100 / start if start else None))
+    return sorted(movers, key=lambda mover: (-mover[4], mover[0]))[:limit]
+
+
+@pytest.mark.parametrize('source', ['modpack', 'version'])
+@pytest.mark.parametrize('seed', range(3))
+def test_top_movers_match_reference(db, source, seed):
+    history = _load(db, source, random.Random(seed))
+    
+    for window_days in (1, 7, 30, 60):
+        for limit in (3, 100):
+            movers = [tuple(row) for row in db.get_top_movers('modrinth', window_days, limit, source)]
+            expected = _expected(history, window_days, limit)
+            assert [mover[:5] for mover in movers] == [mover[:5] for mover in expected]
+            assert [mover[5] for mover in movers] == pytest.approx([mover[5] for mover in expected])
+
+
+def test_top_movers_without_baseline_growth(db):
+    rows = [(TODAY - timedelta(offset), 'modrinth', 'Pack', 'pack', downloads, 0)
+            for offset, downloads in ((3, 0), (1, 40))]
+    for row in rows:
+        db._run(lambda cur: db._upsert_modpack_rows(cur, [row]))
+    
+    assert [tuple(row) for row in db.get_top_movers('modrinth', 7)] == [('pack', 'Pack', 0, 40, 40, None)]
+    assert db.get_top_movers('curseforge', 7) == []
@@ -0,0 +1,54 @@
+"""Unité de travail d'une collecte (db.transaction())"""
+
+import pytest
+
+from src.collectors.collect_stats import StatsCollector
+from src.core.database import open_database
+
+
+def test_failed_write_rolls_back_the_whole_run(db, monkeypatch):
+    collector = StatsCollector()
+    
+    def connect():
+        collector.db = db
+        return True
+    
+    def failing_save():
+        raise RuntimeError("save failed")
+    
+    monkeypatch.setattr(collector, 'connect_database', connect)
+    monkeypatch.setattr(collector, 'collect_modrinth_stats', lambda: collector._stage(
+        'modrinth', 'Modrinth daily stats', lambda: db.save_daily_stats('modrinth', 100, 5, 3)) or True)
+    monkeypatch.setattr(collector, 'collect_curseforge_stats', lambda: collector._stage(
+        'curseforge', 'CurseForge files', failing_save) or True)
+    monkeypatch.setattr(collector, 'update_modpacks', lambda: False)
+    monkeypatch.setattr(db, 'close', lambda: None)
+    
+    assert collector.run() == 1
+    assert db.get_daily_stats_history('modrinth', days=None, resolution='day') == []
+    assert collector.row_counts == {'written': 0, 'unchanged': 0}
+
+
+@pytest.mark.parametrize('url', ['sqlite://', 'postgres'])
+def test_cache_is_invalidated_after_commit(url, request):
+    if url == 'postgres':
+        url = request.getfixturevalue('pg_url')
+    db = open_database(url, cache_bytes=1 << 20)
+    forgotten = []
+    forget = db._forget_versions
+    db._forget_versions = lambda tables: (forgotten.append(tables), forget(tables))
+    
+    assert db.get_daily_stats_history('modrinth', days=None, resolution='day') == []
+    with db.transaction():
+        db.save_daily_stats('modrinth', 100, 5, 3)
+        db.bump_data_versions()
+        assert forgotten == []
+    assert forgotten == [['daily_stats']]
+    assert len(db.get_daily_stats_history('modrinth', days=None, resolution='day')) == 1
+    
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.save_daily_stats('modrinth', 200, 5, 3)
+            db.bump_data_versions()
+            raise RuntimeError
+    assert forgotten == [['daily_stats']]